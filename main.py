@@ -1,33 +1,123 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import os
 from contextlib import asynccontextmanager
+from typing import Dict
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 
+from src.api.admin_api import router as admin_router
 from src.api.amoCRM_API import router as amocrm_router
+from src.api.broadcast_api import router as broadcast_router
 from src.api.meta_api import router as webhook_router
 from src.api.rmq_api import router as rmq_router
-from src.settings.conf import log
+from src.settings.conf import (
+    amosettings,
+    appsettings,
+    chatsettings,
+    dbsettings,
+    log,
+    metasettings,
+    redissettings,
+    rmqsetting,
+)
+from src.settings.engine import conn
+from src.settings.lazy import initialize
+from src.settings.logger_config import setup_main_logger, stop_logging
+from src.utils.admission import admission
+from src.utils.archive import archiver
+from src.utils.deals_index import deals_index
+from src.utils.journal import webhook_journal
+from src.utils.lifecycle import lifecycle
+from src.utils.loop_monitor import loop_monitor
+from src.utils.meta.broadcast import broadcast_engine
+from src.utils.meta.media import media_downloader
+from src.utils.meta.operators import operator_registry
+from src.utils.meta.previews import preview_service
+from src.utils.partitions import partition_manager
+from src.utils.reconcile import reconciler
 from src.utils.redis_conn import redis_client
 from src.utils.rmq.RabbitModel import get_rmq_instance, callback_wrapper, cleanup_rmq
+from src.utils.rmq.shards import chat_shards
+
+IMPORT_MS = (time.perf_counter() - _IMPORT_STARTED) * 1000
+
+
+async def _timed(report: Dict[str, float], name: str, awaitable) -> None:
+    start = time.perf_counter()
+    await awaitable
+    report[name] = (time.perf_counter() - start) * 1000
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # startup
+    # startup: настройки, подключения и клиенты создаются здесь, в каждом воркере
+    started = time.perf_counter()
+    setup_main_logger()
+    report: Dict[str, float] = {}
+    initialize(
+        report,
+        appsettings=appsettings,
+        dbsettings=dbsettings,
+        metasettings=metasettings,
+        amosettings=amosettings,
+        chatsettings=chatsettings,
+        redissettings=redissettings,
+        rmqsetting=rmqsetting,
+        db=conn,
+        redis=redis_client,
+        operator_registry=operator_registry,
+    )
     log.info("🔌 Connecting to Redis...")
     rmq = get_rmq_instance()
-    await rmq.connect()
+    await _timed(report, "rmq", rmq.connect())
     await rmq.create_queue("webhook_messages")
+    await _timed(report, "operators", operator_registry.load())
+    if dbsettings.DEALS_INDEX_ENABLED:
+        await _timed(report, "deals_index", deals_index.load())
+    await redis_client.start_client_cache()
+    media_downloader.start()
+    preview_service.start()
+    webhook_journal.start()
+    report["total"] = (time.perf_counter() - started) * 1000
+    log.info(
+        f"[STARTUP] pid={os.getpid()} import={IMPORT_MS:.0f}ms "
+        + " ".join(f"{name}={ms:.0f}ms" for name, ms in report.items())
+    )
 
-    asyncio.create_task(rmq.consume_messages("queue_name", callback_wrapper))
+    if chat_shards.enabled:
+        lifecycle.spawn("chat_shards", chat_shards.run_forever(), stop=chat_shards.stop)
+    else:
+        await rmq.consume_messages("queue_name", callback_wrapper)
+    lifecycle.spawn("loop_monitor", loop_monitor.run_forever())
+    lifecycle.spawn("admission", admission.run_forever())
+    lifecycle.spawn("partitions", partition_manager.run_forever())
+    if dbsettings.DEALS_INDEX_ENABLED:
+        lifecycle.spawn("deals_index", deals_index.listen_forever())
+    lifecycle.spawn("broadcast", broadcast_engine.run_forever(), stop=broadcast_engine.stop)
+    if archiver.enabled:
+        lifecycle.spawn("archive", archiver.run_forever())
+    if appsettings.RECONCILE_INTERVAL > 0:
+        lifecycle.spawn("reconcile", reconciler.run_forever())
     yield
-    # shutdown
+    # shutdown: прекращаем приём, дожидаемся текущей работы, затем закрываем соединения
+    lifecycle.begin_shutdown(appsettings.SHUTDOWN_TIMEOUT)
+    await rmq.stop_consuming()
+    await rmq.drain(lifecycle.remaining())
+    await lifecycle.stop_tasks()
+    await media_downloader.stop(lifecycle.remaining())
+    await preview_service.stop(lifecycle.remaining())
+    await asyncio.to_thread(webhook_journal.stop)
     log.info("🛑 Closing Redis connection...")
     await redis_client.close()
     await cleanup_rmq()
-
+    await operator_registry.close()
+    await conn.dispose()
+    stop_logging()
 
 app = FastAPI(
     title="WhatsApp Business Webhook",
@@ -42,16 +132,33 @@ async def root():
     return {"message": "APP is working"}
 
 
+@app.middleware("http")
+async def count_inflight(request: Request, call_next):
+    async with admission.requests:
+        return await call_next(request)
+
+
+@app.get("/health")
+async def health():
+    """Состояние воркера: нагрузка и пороги контроля перегрузки."""
+    return {"pid": os.getpid(), **admission.stats()}
+
+
 app.include_router(router=webhook_router)
 app.include_router(router=amocrm_router)
 app.include_router(router=rmq_router)
+app.include_router(router=broadcast_router)
+app.include_router(router=admin_router)
 
 
 if __name__ == "__main__":
+    reload = bool(os.getenv("DEV", False))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=bool(os.getenv("DEV", False)),
+        reload=reload,
+        workers=1 if reload else appsettings.WORKERS,
+        timeout_graceful_shutdown=int(appsettings.SHUTDOWN_TIMEOUT),
         log_level="info",
     )
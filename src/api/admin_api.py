@@ -0,0 +1,131 @@
+import asyncio
+import os
+import secrets
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, responses, status
+
+from src.settings.conf import appsettings, log
+from src.settings.engine import conn
+from src.utils.deals_index import deals_index
+from src.utils.loop_monitor import loop_monitor
+from src.utils.profiler import SamplingProfiler
+from src.utils.reconcile import Reconciler
+from src.utils.redis_conn import redis_client
+from src.utils.rmq.shards import chat_shards
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Проверяет заголовок X-Admin-Token; без ADMIN_TOKEN в настройках доступ закрыт."""
+    expected = appsettings.ADMIN_TOKEN
+    if not expected or not x_admin_token or not secrets.compare_digest(
+        x_admin_token, expected
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Доступ запрещён")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+_profile_lock = asyncio.Lock()
+
+
+@router.get(
+    "/loop",
+    status_code=status.HTTP_200_OK,
+    summary="Задержка event loop и блокирующие вызовы",
+    description="Задержка event loop воркера (текущая, p50/p99/max) и последние блокировки "
+    "дольше SLOW_CALLBACK_MS со стеком кода, который держал loop",
+)
+async def loop_stats() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **loop_monitor.stats()}
+
+
+@router.get(
+    "/db/pool",
+    status_code=status.HTTP_200_OK,
+    summary="Пул соединений БД",
+    description="Размер пула primary и реплики и время выдачи соединений (среднее, максимум, "
+    "число медленных выдач и таймаутов)",
+)
+async def db_pool_stats() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **conn.pool_stats()}
+
+
+@router.get(
+    "/redis",
+    status_code=status.HTTP_200_OK,
+    summary="Локальный кэш Redis",
+    description="Размер и hit rate локального кэша хэшей диалогов conv:*",
+)
+async def redis_cache_stats() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **redis_client.cache.stats()}
+
+
+@router.get(
+    "/deals",
+    status_code=status.HTTP_200_OK,
+    summary="Индекс сделок в памяти",
+    description="Размер, оценка занимаемой памяти и hit rate индекса (клиент, оператор) → сделка",
+)
+async def deals_index_stats() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **deals_index.stats()}
+
+
+@router.get(
+    "/reconcile",
+    status_code=status.HTTP_200_OK,
+    summary="Отчёт сверки сделок",
+    description="Счётчики расхождений Postgres ↔ Redis ↔ amoCRM последнего прохода сверки "
+    "и контрольная точка, если проход ещё идёт или был прерван",
+)
+async def reconcile_report() -> Dict[str, Any]:
+    report = await Reconciler.load_report()
+    if report is None:
+        raise HTTPException(status_code=404, detail="Сверка ещё не выполнялась")
+    return report
+
+
+@router.get(
+    "/shards",
+    status_code=status.HTTP_200_OK,
+    summary="Секции событий чатов",
+    description="Какие очереди-секции chat_shard.{i} обрабатывает этот экземпляр "
+    "и какие экземпляры сейчас живы",
+)
+async def shard_stats() -> Dict[str, Any]:
+    return {"pid": os.getpid(), **chat_shards.stats()}
+
+
+@router.get(
+    "/profile",
+    status_code=status.HTTP_200_OK,
+    summary="Профилирование воркера",
+    description="Снимает стеки всех потоков и asyncio-задач воркера в течение seconds секунд "
+    "и возвращает collapsed stacks для flamegraph.pl или speedscope",
+    response_class=responses.PlainTextResponse,
+)
+async def profile(
+    seconds: float = Query(10, gt=0, description="Длительность профилирования"),
+    hz: int = Query(100, ge=1, le=1000, description="Частота снятия стеков"),
+) -> responses.PlainTextResponse:
+    if seconds > appsettings.PROFILE_MAX_SECONDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Не больше {appsettings.PROFILE_MAX_SECONDS} секунд",
+        )
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Профилирование уже запущено")
+
+    async with _profile_lock:
+        log.info(f"[ADMIN] Профилирование pid={os.getpid()} на {seconds} с, {hz} Гц")
+        profiler = SamplingProfiler(asyncio.get_running_loop(), hz)
+        collapsed = await profiler.profile(seconds)
+
+    filename = f"profile-{os.getpid()}-{datetime.now():%Y%m%dT%H%M%S}.folded"
+    return responses.PlainTextResponse(
+        collapsed,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(profiler.sample_count),
+        },
+    )
@@ -1,15 +1,19 @@
 import json
+from typing import Optional, Tuple
 from urllib.parse import parse_qs, unquote_plus
 
 from fastapi import APIRouter, HTTPException, Request, Response, status, Depends
 
 from src.database.DAO.crud import DealsDAO, MessagesDAO
+from src.database.models.Models import Deals
 from src.settings.conf import log, metasettings
+from src.utils.admission import shed_load
 from src.utils.amo.chat import AmoCRMClient, incoming_message, send_message
+from src.utils.journal import webhook_journal
 from src.utils.meta.utils_message import MetaClient
 from src.utils.rmq.RabbitModel import get_rmq_dependency, callback_wrapper, AsyncRabbitMQRepository
 from src.schemas.AmoSchemas import TemplateSchemas
-from src.utils.redis_conn import redis_client
+from src.utils.redis_conn import chat_field, redis_client
 
 router = APIRouter(prefix="/amo", tags=["amoCRM"])
 amo = AmoCRMClient()
@@ -18,6 +22,27 @@ messagesDAO = MessagesDAO()
 dealsDAO = DealsDAO()
 
 
+async def resolve_lead(lead_id: int) -> Tuple[Optional[str], Optional[Deals]]:
+    """
+    Телефон клиента и сделка по лиду: индексированный запрос к deals,
+    при промахе — запрос в amoCRM и привязка лида к сделке с текущим оператором
+    клиента из Redis (или к сделкам клиента без лида).
+    :return: (телефон клиента, сделка); сделки нет, если лид ещё не был привязан.
+    """
+    deal = await dealsDAO.find_by_lead(lead_id)
+    if deal:
+        return deal.client_phone, deal
+
+    contact = await amo.get_lead_contact(lead_id)
+    if not contact:
+        return None, None
+    contact_id, phone = contact
+    operator_phone = await redis_client.get_operator(phone)
+    if await dealsDAO.link_lead(phone, lead_id, contact_id, operator_phone):
+        log.info(f"[AMO] Лид {lead_id} привязан к сделкам клиента {phone}")
+    return phone, None
+
+
 @router.post("/webhook")
 async def receive_amocrm_webhook(request: Request):
     content_type = request.headers.get("content-type", "")
@@ -43,6 +68,7 @@ async def receive_amocrm_webhook(request: Request):
 
 @router.post("/webhook/incoming-message/{scope_id}", status_code=status.HTTP_200_OK)
 async def incoming_message_webhook(scope_id: str, request: Request, rmq: AsyncRabbitMQRepository = Depends(get_rmq_dependency)):
+    await webhook_journal.record_request("amo", request)
     (
         message_data,
         message,
@@ -58,7 +84,7 @@ async def incoming_message_webhook(scope_id: str, request: Request, rmq: AsyncRa
     is_template = True if message.get("template") else False
     temp_id = message.get("template").get("external_id") if is_template else None
 
-    await rmq.send_message("queue_name", json.dumps({
+    await rmq.publish_chat_event(str(chat_id), json.dumps({
         "chat_id": chat_id,
         "text": text,
         "sender": sender,
@@ -72,7 +98,7 @@ async def incoming_message_webhook(scope_id: str, request: Request, rmq: AsyncRa
         try:
             await send_message(temp_id, chat_id, text, receiver.get("phone"))
             log.info(f"[AMO ----]  {message_data}\n {message_id}")
-            await redis_client.rpush(f"{receiver.get("phone")}", json.dumps({"text": text}))
+            await redis_client.push_outbox(receiver.get("phone"), json.dumps({"text": text}))
 
         except Exception as e:
             log.exception(f"[AMO→Webhook] Ошибка обработки: {e}")
@@ -98,7 +124,7 @@ async def send_message_from_amo(request: Request) -> dict:
     log.info("[AMO] Send message amo %s", data)
     log.info("Ручка send_message AMO")
 
-    user_phone = amo.get_contact_phone_by_lead(int(lead_id))
+    user_phone, _ = await resolve_lead(int(lead_id))
     if not user_phone:
         raise HTTPException(400, "Телефон контакта не найден")
 
@@ -106,17 +132,17 @@ async def send_message_from_amo(request: Request) -> dict:
     return {"status": "sent"}
 
 
-@router.get("/get_templates")
+@router.get("/get_templates", dependencies=[Depends(shed_load)])
 async def get_templates():
     return await amo.get_templates()
 
 
-@router.get("/get_template/{template_id}")
+@router.get("/get_template/{template_id}", dependencies=[Depends(shed_load)])
 async def get_template(template_id: str):
     return await amo.get_template_by_id(template_id)
 
 
-@router.post("/add_template")
+@router.post("/add_template", dependencies=[Depends(shed_load)])
 async def add_template():
     meta_status, meta_templates = await metaservice.get_templates()
     for temp in meta_templates:
@@ -126,22 +152,30 @@ async def add_template():
 @router.get("/leads/{lead_id}/chat_id")
 async def get_chat_id_by_lead_id(lead_id: int):
     try:
-        phone = await amo.get_contact_phone_by_lead(lead_id)
+        phone, deal = await resolve_lead(lead_id)
         if not phone:
             raise HTTPException(status_code=404, detail="Контакт или телефон не найден")
 
-        operator_key = f"client_operator:{phone}"
-        operator_phone = await redis_client.get(operator_key)
+        if deal and deal.conversation_id:
+            return {
+                "lead_id": lead_id,
+                "phone": phone,
+                "operator": deal.operator_phone,
+                "chat_id": deal.conversation_id,
+            }
+
+        conversation = await redis_client.get_conversation(phone)
+        operator_phone = conversation.get("operator")
         if not operator_phone:
             raise HTTPException(status_code=404, detail="Оператор не найден в Redis")
-        if isinstance(operator_phone, bytes):
-            operator_phone = operator_phone.decode()
 
-        chat_id = await redis_client.get_chat_id(phone, operator_phone)
+        chat_id = conversation.get(chat_field(operator_phone))
         if not chat_id:
             raise HTTPException(status_code=404, detail="chat_id не найден")
 
         return {"lead_id": lead_id, "phone": phone, "operator": operator_phone, "chat_id": chat_id}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка сервера: {str(e)}")
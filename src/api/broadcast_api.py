@@ -0,0 +1,108 @@
+from typing import List, Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from src.database.DAO.crud import BroadcastDAO
+from src.database.models.Models import BroadcastStatusEnum, RecipientStatusEnum
+from src.schemas.BroadcastSchemas import (
+    BroadcastCreate,
+    BroadcastOut,
+    BroadcastRecipientOut,
+)
+from src.settings.conf import log
+from src.utils.admission import shed_load
+
+router = APIRouter(prefix="/broadcast", tags=["broadcast"])
+broadcastDAO = BroadcastDAO()
+
+
+async def _change_status(
+    job_id: UUID, new_status: BroadcastStatusEnum, allowed_from: List[BroadcastStatusEnum]
+) -> BroadcastOut:
+    job = await broadcastDAO.set_status(job_id, new_status, allowed_from)
+    if job is None:
+        if await broadcastDAO.find_item_by_id(job_id, use_primary=True) is None:
+            raise HTTPException(status_code=404, detail="Рассылка не найдена")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Рассылку нельзя перевести в статус {new_status.value}",
+        )
+    log.info(f"[BROADCAST] Рассылка {job_id} → {new_status.value}")
+    return BroadcastOut.model_validate(job)
+
+
+@router.post(
+    "",
+    status_code=status.HTTP_201_CREATED,
+    summary="Создать рассылку шаблона",
+    dependencies=[Depends(shed_load)],
+    description="Сохраняет рассылку и получателей; отправка идёт в фоне с ограничением темпа",
+    response_model=BroadcastOut,
+)
+async def create_broadcast(payload: BroadcastCreate) -> BroadcastOut:
+    job = await broadcastDAO.create(
+        template_name=payload.template_name,
+        language=payload.language_code,
+        operator_phone=payload.operator_phone,
+        phones=payload.recipients,
+        from_deals=payload.from_deals,
+    )
+    log.info(f"[BROADCAST] Создана рассылка {job.id} на {job.total} получателей")
+    return BroadcastOut.model_validate(job)
+
+
+@router.get(
+    "/{job_id}",
+    summary="Прогресс рассылки",
+    response_model=BroadcastOut,
+)
+async def get_broadcast(job_id: UUID) -> BroadcastOut:
+    job = await broadcastDAO.find_item_by_id(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Рассылка не найдена")
+    return BroadcastOut.model_validate(job)
+
+
+@router.get(
+    "/{job_id}/recipients",
+    summary="Результаты по получателям",
+    description="Постраничный список получателей рассылки, after_id — id последней строки",
+    response_model=List[BroadcastRecipientOut],
+)
+async def get_broadcast_recipients(
+    job_id: UUID,
+    recipient_status: Optional[RecipientStatusEnum] = Query(None, alias="status"),
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+) -> List[BroadcastRecipientOut]:
+    rows = await broadcastDAO.get_recipients(
+        job_id,
+        recipient_status,
+        after_id,
+        limit,
+    )
+    return [BroadcastRecipientOut.model_validate(row) for row in rows]
+
+
+@router.post("/{job_id}/pause", summary="Приостановить рассылку", response_model=BroadcastOut)
+async def pause_broadcast(job_id: UUID) -> BroadcastOut:
+    return await _change_status(
+        job_id, BroadcastStatusEnum.paused, [BroadcastStatusEnum.running]
+    )
+
+
+@router.post("/{job_id}/resume", summary="Возобновить рассылку", response_model=BroadcastOut)
+async def resume_broadcast(job_id: UUID) -> BroadcastOut:
+    return await _change_status(
+        job_id, BroadcastStatusEnum.running, [BroadcastStatusEnum.paused]
+    )
+
+
+@router.post("/{job_id}/cancel", summary="Отменить рассылку", response_model=BroadcastOut)
+async def cancel_broadcast(job_id: UUID) -> BroadcastOut:
+    return await _change_status(
+        job_id,
+        BroadcastStatusEnum.cancelled,
+        [BroadcastStatusEnum.running, BroadcastStatusEnum.paused],
+    )
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import base64
 import datetime
 import json
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+from uuid import UUID
 
 import httpx
 from fastapi import (
@@ -15,8 +17,10 @@ from fastapi import (
     responses,
     status,
 )
+from pydantic_core import to_json
 
-from src.database.DAO.crud import DealsDAO, MessagesDAO
+from src.database.DAO.crud import DealsDAO, DealSummaryDAO, MessagesDAO
+from src.database.models.Models import StatusEnum
 from src.schemas.MetaSchemas import (
     PhoneNumber,
     SendRequest,
@@ -25,18 +29,32 @@ from src.schemas.MetaSchemas import (
     TestR,
 )
 from src.settings.conf import log, metasettings
+from src.utils.admission import shed_load
 from src.utils.amo.chat import AmoCRMClient
+from src.utils.archive import archiver
+from src.utils.journal import webhook_journal
+from src.utils.meta.media import MEDIA_TYPES, MediaJob, media_downloader, media_store
+from src.utils.meta.operators import operator_registry
+from src.utils.meta.previews import preview_service
 from src.utils.meta.utils_message import MetaClient
 from src.utils.rmq.RabbitModel import get_rmq_dependency, AsyncRabbitMQRepository
 
 from src.utils.redis_conn import redis_client
 
-from src.schemas.MetaSchemas import MessageOut
+from src.schemas.MetaSchemas import (
+    ChatPage,
+    ChatSummaryOut,
+    MessageOut,
+    MessageRow,
+    SearchHit,
+    SearchPage,
+)
 
 db = MessagesDAO()
 service = MetaClient()
 messagesDAO = MessagesDAO()
 dealsDAO = DealsDAO()
+summaryDAO = DealSummaryDAO()
 router = APIRouter(prefix="/meta", tags=["meta"])
 
 
@@ -86,6 +104,7 @@ async def incoming(request: Request, rmq: AsyncRabbitMQRepository = Depends(get_
     Raises:
         HTTPException 400: неверный JSON.
     """
+    await webhook_journal.record_request("meta", request)
     try:
         payload: Dict[str, Any] = await request.json()
     except json.JSONDecodeError:
@@ -102,8 +121,16 @@ async def incoming(request: Request, rmq: AsyncRabbitMQRepository = Depends(get_
             operator_number = value.get("metadata").get("display_phone_number")
             date = value.get("messages")[0].get("timestamp")
             dt_obj = datetime.datetime.fromtimestamp(int(date))
-            if value.get("messages")[0].get("type") == "text":
-                text = value.get("messages")[0].get("text").get("body")
+            msg_type = value.get("messages")[0].get("type")
+            media = value.get("messages")[0].get(msg_type) or {}
+            if msg_type == "text":
+                text = media.get("body")
+            elif msg_type in MEDIA_TYPES:
+                text = media.get("caption") or media.get("filename") or f"[{msg_type}]"
+            else:
+                text = None
+
+            if text is not None:
                 log.info(
                     "New message %s from %s to %s: %s ",
                     dt_obj,
@@ -132,8 +159,20 @@ async def incoming(request: Request, rmq: AsyncRabbitMQRepository = Depends(get_
                     text=text,
                     timestamp=dt_obj,
                     deals_id=deal_id,
+                    inbound=True,
                 )
 
+                # Файл скачивается в фоне, путь появится в Messages.media
+                if msg_type in MEDIA_TYPES and media.get("id"):
+                    media_downloader.submit(
+                        MediaJob(
+                            message_id=value.get("messages")[0].get("id"),
+                            media_id=media["id"],
+                            operator_phone=operator_number,
+                            mime_type=media.get("mime_type"),
+                        )
+                    )
+
         # TODO Сообщение отправенное пользователю
         else:
             user_number = value.get("statuses")[0].get("recipient_id")
@@ -149,18 +188,27 @@ async def incoming(request: Request, rmq: AsyncRabbitMQRepository = Depends(get_
                 operator_phone=operator_number,
             )
 
-            raw_data = await redis_client.lpop(f"{user_number}")
+            raw_data = await redis_client.pop_outbox(user_number)
 
             await rmq.publish_to_chat(f'{user_number}-{operator_number}', json.dumps(value, ensure_ascii=False))
 
-            await messagesDAO.upsert(
-                id=value.get("statuses")[0].get("id"),
-                sender=user_number,
-                text=json.loads(raw_data),
+            try:
+                status_value = StatusEnum(message_status)
+            except ValueError:
+                log.warning(f"[META] Неизвестный статус сообщения: {message_status}")
+                return "ok"
+
+            applied = await messagesDAO.apply_status(
+                message_id=value.get("statuses")[0].get("id"),
+                status=status_value,
                 timestamp=dt_obj,
                 deals_id=deal_id,
-                status=message_status,
+                sender=user_number,
+                text=json.loads(raw_data).get("text") if raw_data else None,
             )
+            if not applied:
+                log.info(f"[META] Статус {message_status} устарел или повторный, пропущен")
+                return "ok"
 
             log.info(
                 "Meta message %s from %s to %s status %s ",
@@ -192,7 +240,8 @@ async def send(send_req: SendRequest = Depends()) -> str:
     :param send_req: валидированная модель `SendRequest` (Pydantic).
     :return: JSON-ответ, проброшенный от Cloud API.
     """
-    await service.send_message(wa_id=send_req.wa_id, text=send_req.text)
+    client = operator_registry.get_client(send_req.operator_phone)
+    await client.send_message(wa_id=send_req.wa_id, text=send_req.text)
     # TODO здесь можно из БД прокидывать
 
     return "ok"
@@ -203,6 +252,7 @@ async def send(send_req: SendRequest = Depends()) -> str:
     response_model=Any,
     status_code=status.HTTP_200_OK,
     summary="Получить номера телефонов из WABA",
+    dependencies=[Depends(shed_load)],
     description="Получает список номеров телефонов, привязанных к WhatsApp Business Account через Graph API Meta",
 )
 async def get_number() -> responses.JSONResponse:
@@ -270,6 +320,7 @@ async def get_number() -> responses.JSONResponse:
     response_model=Any,
     status_code=status.HTTP_200_OK,
     summary="Получить шаблоны сообщений",
+    dependencies=[Depends(shed_load)],
     description="Возвращает список одобренных шаблонов сообщений для текущего WhatsApp Business Account",
 )
 async def get_templates() -> responses.JSONResponse:
@@ -285,13 +336,25 @@ async def get_templates() -> responses.JSONResponse:
 async def send_template_message(
     payload: TemplateSendRequest = Depends(),
 ) -> responses.JSONResponse:
-    return await service.post_template(
+    client = operator_registry.get_client(payload.operator_phone)
+    return await client.post_template(
         wa_id=payload.to,
         temp_name=payload.template_name,
-        language_code=payload.language_code,
+        temp_lang=payload.language_code,
     )
 
 
+@router.post(
+    "/operators/reload",
+    status_code=status.HTTP_200_OK,
+    summary="Перезагрузить реестр номеров операторов",
+    description="Перечитывает таблицу OperatorsData и обновляет маршрутизацию исходящих сообщений",
+)
+async def reload_operators() -> Dict[str, Any]:
+    loaded = await operator_registry.load()
+    return {"loaded": loaded, "numbers": list(operator_registry.numbers)}
+
+
 @router.post(
     "/register_number",
     status_code=status.HTTP_200_OK,
@@ -307,7 +370,7 @@ async def register_number(
         "display_name": phone_data.display_name,
         "verified_name": phone_data.verified_name,
     }
-    return service.register_number(payload)
+    return await service.register_number(payload)
 
 
 @router.post(
@@ -320,28 +383,176 @@ async def register_number(
 async def success_number(
     phone_data: SuccessPhoneNumber = Depends(),
 ) -> responses.JSONResponse:
-    return service.confirm_phone_number(
+    return await service.confirm_phone_number(
         phone_number_id=phone_data.phone_number_id, confirm_code=phone_data.confirm_code
     )
 
 
+def _naive(value: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """
+    Переводит дату с часовым поясом в локальное время без пояса — так хранятся
+    timestamp сообщений и считается граница архива.
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    try:
+        return value.astimezone().replace(tzinfo=None)
+    except (OverflowError, ValueError):
+        raise HTTPException(status_code=422, detail=f"Некорректная дата: {value.isoformat()}")
+
+
 @router.get(
     "/history",
     status_code=status.HTTP_200_OK,
     summary="Получение истории сообщений",
+    dependencies=[Depends(shed_load)],
     description="Запрос на получение истории сообщений клиента по связке клиент-оператор",
     response_model=List[MessageOut]
 )
 async def get_history(
     client_phone: str = Query(..., description="Телефон клиента"),
     operator_phone: str = Query(..., description="Телефон оператора"),
+    date_from: Optional[datetime.datetime] = Query(None, description="Начало периода"),
+    date_to: Optional[datetime.datetime] = Query(None, description="Конец периода"),
 ):
-    deal = dealsDAO.find_by_phones(client_phone, operator_phone)
+    date_from, date_to = _naive(date_from), _naive(date_to)
+    deal = await dealsDAO.find_by_phones(client_phone, operator_phone)
 
     if not deal:
         raise HTTPException(
             status_code=404,
             detail="Связка клиент-оператор не найдена"
         )
-    messages = messagesDAO.get_message_by_deal(deal.id)
-    return messages
\ No newline at end of file
+    history = [
+        MessageRow(message_id, sender, text, media, timestamp, status.value)
+        for message_id, sender, text, media, timestamp, status in (
+            await messagesDAO.get_history_rows(deal.id, date_from, date_to)
+        )
+    ]
+
+    # Старые периоды лежат в архиве на диске
+    if archiver.enabled and date_from is not None and date_from < archiver.cutoff():
+        archived = await archiver.read(operator_phone, deal.id, date_from, date_to)
+        history = [
+            *(
+                MessageRow(
+                    record["id"],
+                    record["sender"],
+                    record["text"],
+                    record["media"],
+                    record["timestamp"],
+                    record["status"],
+                )
+                for record in archived
+            ),
+            *history,
+        ]
+
+    previews = await preview_service.existing(item.media for item in history if item.media)
+    for item in history:
+        if not item.media:
+            continue
+        item.preview = previews.get(item.media)
+        if item.preview is None:
+            preview_service.submit(item.media)
+    # Строки сериализуются напрямую в JSON; схема MessageOut остаётся для документации
+    return Response(content=to_json(history), media_type="application/json")
+
+
+@router.get(
+    "/media/{media_path:path}",
+    summary="Получить медиафайл или превью",
+    description="Отдаёт файл из хранилища медиа по пути из полей media/preview истории",
+)
+async def get_media_file(media_path: str) -> responses.FileResponse:
+    root = media_store.root.resolve()
+    path = (root / media_path).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return responses.FileResponse(path)
+
+
+def _encode_cursor(hit: SearchHit) -> str:
+    raw = json.dumps([hit.rank, hit.timestamp.isoformat(), hit.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[float, datetime.datetime, str]:
+    try:
+        rank, timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return float(rank), datetime.datetime.fromisoformat(timestamp), str(message_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+
+@router.get(
+    "/search",
+    status_code=status.HTTP_200_OK,
+    summary="Полнотекстовый поиск по истории сообщений",
+    dependencies=[Depends(shed_load)],
+    description="Ищет сообщения по тексту (русская и английская морфология), "
+    "результаты ранжированы и подсвечены, постраничная навигация по cursor",
+    response_model=SearchPage,
+)
+async def search_messages(
+    q: str = Query(..., min_length=2, description="Поисковый запрос"),
+    operator_phone: Optional[str] = Query(None, description="Телефон оператора"),
+    date_from: Optional[datetime.datetime] = Query(None, description="Начало периода"),
+    date_to: Optional[datetime.datetime] = Query(None, description="Конец периода"),
+    limit: int = Query(20, ge=1, le=100, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор из предыдущего ответа"),
+) -> SearchPage:
+    rows = await messagesDAO.search(
+        query_text=q,
+        operator_phone=operator_phone,
+        date_from=_naive(date_from),
+        date_to=_naive(date_to),
+        after=_decode_cursor(cursor) if cursor else None,
+        limit=limit,
+    )
+    items = [SearchHit.model_validate(row, from_attributes=True) for row in rows]
+    next_cursor = _encode_cursor(items[-1]) if len(items) == limit else None
+    return SearchPage(items=items, next_cursor=next_cursor)
+
+
+@router.get(
+    "/chats",
+    status_code=status.HTTP_200_OK,
+    summary="Список диалогов",
+    dependencies=[Depends(shed_load)],
+    description="Диалоги по убыванию последней активности: последнее сообщение, "
+    "непрочитанные, количество сообщений. Постраничная навигация по cursor",
+    response_model=ChatPage,
+)
+async def list_chats(
+    operator_phone: Optional[str] = Query(None, description="Телефон оператора"),
+    limit: int = Query(50, ge=1, le=200, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="Курсор из предыдущего ответа"),
+) -> ChatPage:
+    after = None
+    if cursor:
+        try:
+            last_at, deal_id = json.loads(base64.urlsafe_b64decode(cursor))
+            after = (datetime.datetime.fromisoformat(last_at), UUID(deal_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Некорректный cursor")
+
+    rows = await summaryDAO.list_recent(operator_phone, after, limit)
+    items = [ChatSummaryOut.model_validate(row) for row in rows]
+    next_cursor = None
+    if len(items) == limit:
+        raw = json.dumps([items[-1].last_message_at.isoformat(), str(items[-1].deal_id)])
+        next_cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+    return ChatPage(items=items, next_cursor=next_cursor)
+
+
+@router.post(
+    "/chats/{deal_id}/read",
+    status_code=status.HTTP_200_OK,
+    summary="Отметить диалог прочитанным",
+    description="Сбрасывает счётчик непрочитанных сообщений диалога",
+)
+async def mark_chat_read(deal_id: UUID) -> Dict[str, Any]:
+    if not await summaryDAO.mark_read(deal_id):
+        raise HTTPException(status_code=404, detail="Диалог не найден")
+    return {"deal_id": str(deal_id), "unread_count": 0}
@@ -1,37 +1,85 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-import aio_pika
+import re
+from typing import Optional, Set, Tuple
 
-from src.utils.rmq.RabbitModel import get_rmq_dependency, AsyncRabbitMQRepository
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect, status
 
-from src.settings.conf import log
+from src.utils.redis_conn import redis_client
+from src.utils.rmq.RabbitModel import CHAT_EVENT_ID_HEADER, get_rmq_dependency
+
+from src.settings.conf import log, redissettings
 
 router = APIRouter(prefix="/rmq", tags=["RabbitMQ"])
 
+STREAM_ID_RE = re.compile(r"^\d+-\d+$")
+
+
+def _stream_id(event_id: str) -> Tuple[int, int]:
+    ms, seq = event_id.split("-")
+    return int(ms), int(seq)
+
+
+def _envelope(event_id: Optional[str], body: str) -> str:
+    """Кадр режима повтора: id события (для since при переподключении) и само событие."""
+    event_id = f'"{event_id}"' if event_id else "null"
+    return f'{{"id":{event_id},"event":{body}}}'
+
 
 @router.websocket("/ws/chat/{chat_id}")
-async def websocket_endpoint(websocket: WebSocket, chat_id: str):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    chat_id: str,
+    last: int = Query(0, ge=0, description="Повторить последние last событий чата"),
+    since: Optional[str] = Query(None, description="Повторить события после этого id"),
+):
+    """
+    События чата в реальном времени. С last или since сначала повторяются события
+    из Redis stream чата, затем идут новые; каждое событие приходит кадром
+    {"id": ..., "event": ...}, id последнего кадра передаётся в since при переподключении.
+    Без параметров кадры — исходные события, как раньше.
+    """
+    if since is not None and not STREAM_ID_RE.match(since):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
     await websocket.accept()
     rmq = get_rmq_dependency()
+    replay = last > 0 or since is not None
 
     try:
         await rmq.connect()
         channel = rmq.channel
-
-        exchange = await channel.declare_exchange(
-            "chat_exchange",
-            aio_pika.ExchangeType.DIRECT,
-            durable=True,
-            auto_delete=False,
-        )
+        exchange = await rmq.chat_exchange()
 
         queue = await channel.declare_queue(exclusive=True, auto_delete=True)
 
+        # Очередь привязывается до чтения истории: события, пришедшие во время повтора,
+        # не теряются, а уже отправленные повтором отбрасываются по id
         await queue.bind(exchange, routing_key=chat_id)
 
+        replayed: Set[str] = set()
+        if replay:
+            events = await redis_client.read_chat_events(
+                chat_id, since=since, last=min(last, redissettings.REDIS_CHAT_STREAM_MAXLEN)
+            )
+            for event_id, body in events:
+                await websocket.send_text(_envelope(event_id, body))
+                replayed.add(event_id)
+
         async with queue.iterator() as queue_iter:
             async for message in queue_iter:
                 async with message.process():
-                    await websocket.send_text(message.body.decode())
+                    body = message.body.decode()
+                    if not replay:
+                        await websocket.send_text(body)
+                        continue
+                    event_id = (message.headers or {}).get(CHAT_EVENT_ID_HEADER)
+                    if isinstance(event_id, bytes):
+                        event_id = event_id.decode()
+                    if event_id in replayed:
+                        replayed.discard(event_id)
+                        continue
+                    if event_id and since and _stream_id(event_id) <= _stream_id(since):
+                        continue
+                    await websocket.send_text(_envelope(event_id, body))
 
     except WebSocketDisconnect:
         pass
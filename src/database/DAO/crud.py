@@ -1,27 +1,106 @@
-from typing import Any, Optional, Type,  Sequence, Union
-from uuid import UUID
+import time
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Hashable, Optional, Set, Type,  Sequence, Tuple, Union
+from uuid import UUID, uuid4
 
-from sqlalchemy import asc, desc, select, Row, RowMapping
+from sqlalchemy import asc, case, delete, desc, func, insert, literal, or_, select, tuple_, update, Row, RowMapping
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models.base import Base
 from src.database.models.Models import (
+    BroadcastJob,
+    BroadcastRecipient,
+    BroadcastStatusEnum,
     Deals,
+    DealSummary,
     MessageRecord,
     Messages,
     OperatorsData,
+    RecipientStatusEnum,
+    STATUS_RANK,
+    StatusEnum,
     Templates,
 )
-from src.settings.engine import async_session_maker
+from src.settings.conf import dbsettings
+from src.settings.engine import conn
+
+
+# Канал LISTEN/NOTIFY о новых сделках: payload "{id}:{client_phone}:{operator_phone}"
+DEALS_CHANNEL = "deals_changed"
+
+
+class ReadYourWrites:
+    """
+    Запоминает недавние записи по ключу (сделка, строка), чтобы в течение
+    короткого окна чтение шло в primary, а не в отстающую реплику.
+    """
+
+    def __init__(self, window: Optional[float] = None) -> None:
+        self._window = window
+        self._marks: Dict[Hashable, float] = {}
+
+    @property
+    def window(self) -> float:
+        if self._window is None:
+            self._window = dbsettings.DB_READ_YOUR_WRITES_SECONDS
+        return self._window
+
+    def mark(self, *keys: Hashable) -> None:
+        expires = time.monotonic() + self.window
+        for key in keys:
+            self._marks[key] = expires
+        if len(self._marks) > 10000:
+            self._prune()
+
+    def is_recent(self, key: Hashable) -> bool:
+        expires = self._marks.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            self._marks.pop(key, None)
+            return False
+        return True
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, exp in self._marks.items() if exp < now]:
+            del self._marks[key]
+
+
+recent_writes = ReadYourWrites()
 
 
 class BaseDAO:
     model: Type[Base]
-    _session_factory = async_session_maker
 
     @classmethod
     async def get_session(cls) -> AsyncSession:
-        return cls._session_factory()
+        return conn.session_maker()
+
+    @classmethod
+    async def get_read_session(cls, key: Optional[Hashable] = None) -> AsyncSession:
+        """
+        Сессия для чтения: реплика, если по ключу не было недавних записей,
+        иначе primary (read-your-writes).
+        """
+        if key is not None and recent_writes.is_recent(key):
+            return conn.session_maker()
+        return conn.replica_session_maker()
+
+    @classmethod
+    def _row_key(cls, item_id: Any) -> Hashable:
+        return cls.model.__tablename__, str(item_id)
+
+    @classmethod
+    def _mark_written(cls, values: Dict[str, Any]) -> None:
+        keys = []
+        if values.get("id") is not None:
+            keys.append(cls._row_key(values["id"]))
+        if values.get("deals_id") is not None:
+            keys.append(("deal", str(values["deals_id"])))
+        if keys:
+            recent_writes.mark(*keys)
 
     @classmethod
     async def get_all_items(
@@ -32,7 +111,7 @@ class BaseDAO:
         sort_by: str = None,
         sort_desc: bool = False,
     ):
-        async with await cls.get_session() as session:
+        async with await cls.get_read_session() as session:
             query = select(cls.model)
 
             if filters:
@@ -52,8 +131,14 @@ class BaseDAO:
             return result.scalars().all()
 
     @classmethod
-    async def find_item_by_id(cls, item_id: Union[int, UUID, str]) -> Optional[Base]:
-        async with await cls.get_session() as session:
+    async def find_item_by_id(
+        cls, item_id: Union[int, UUID, str], use_primary: bool = False
+    ) -> Optional[Base]:
+        if use_primary:
+            session = await cls.get_session()
+        else:
+            session = await cls.get_read_session(cls._row_key(item_id))
+        async with session:
             result = await session.execute(select(cls.model).filter_by(id=item_id))
             return result.scalar_one_or_none()
 
@@ -69,13 +154,14 @@ class BaseDAO:
 
                 new_instance = cls.model(**values)
                 session.add(new_instance)
+            cls._mark_written(values)
             return new_instance
 
     @classmethod
     async def update(cls, item_id: int, **values: Any) -> Optional[Base]:
         async with await cls.get_session() as session:
             async with session.begin():
-                item = await cls.find_item_by_id(item_id)
+                item = await cls.find_item_by_id(item_id, use_primary=True)
                 if item is None:
                     return None
                 for key, val in values.items():
@@ -84,6 +170,7 @@ class BaseDAO:
                 session.add(item)
                 await session.flush()
                 await session.refresh(item)
+            cls._mark_written({"id": item_id, **values})
             return item
 
 
@@ -91,23 +178,275 @@ class MessagesDAO(BaseDAO):
     model = Messages
 
     @classmethod
-    async def upsert(cls, **values: Any) -> Base:
-        item = await cls.find_item_by_id(values["id"])
-        if item:
-            return await cls.update(values["id"], **values)
-        return await cls.add(**values)
+    async def add(cls, inbound: bool = False, **values: Any) -> Messages:
+        """
+        Сохраняет сообщение и в той же транзакции обновляет сводку по сделке.
+        :param inbound: True — сообщение от клиента (увеличивает unread_count).
+        """
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(select(cls.model).filter_by(id=values["id"]))
+                existing = result.scalar_one_or_none()
+                if existing:
+                    return existing
+
+                message = cls.model(**values)
+                session.add(message)
+                await session.flush()
+                await DealSummaryDAO.record_message(session, message, inbound)
+            cls._mark_written(values)
+            return message
+
+    @classmethod
+    async def update(cls, item_id: str, **values: Any) -> Optional[Messages]:
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(select(cls.model).filter_by(id=item_id))
+                message = result.scalar_one_or_none()
+                if message is None:
+                    return None
+                for key, val in values.items():
+                    if hasattr(message, key):
+                        setattr(message, key, val)
+                await session.flush()
+                if "status" in values:
+                    await DealSummaryDAO.record_status(session, message)
+            cls._mark_written({"id": item_id, **values})
+            return message
 
     @classmethod
-    async def get_message_by_deal(cls, deal_id: UUID) -> Sequence[Row[Any] | RowMapping | Any]:
+    async def apply_status(
+        cls,
+        message_id: str,
+        status: StatusEnum,
+        timestamp: datetime,
+        deals_id: Optional[UUID],
+        sender: str,
+        text: Optional[str] = None,
+    ) -> bool:
+        """
+        Применяет статус Meta к исходящему сообщению. Статус только продвигается
+        (sent < delivered < read, failed), устаревшие и повторные статусы ничего не пишут.
+        Если сообщения ещё нет — создаёт его с временем первого статуса.
+        Статусы одного сообщения применяются по очереди под транзакционным
+        advisory-lock по его id, поэтому параллельные вебхуки не создают дубликат.
+        :return: True, если статус записан.
+        """
+        columns = cls.model.__table__.c
+        older = [member for member, rank in STATUS_RANK.items() if rank < STATUS_RANK[status]]
         async with await cls.get_session() as session:
-            result = await session.execute(
-                select(cls.model).filter_by(deals_id=deal_id).order_by(cls.model.timestamp)
-            )
+            async with session.begin():
+                await session.execute(select(func.pg_advisory_xact_lock(func.hashtext(message_id))))
+                result = await session.execute(
+                    update(cls.model)
+                    .where(cls.model.id == message_id, cls.model.status.in_(older))
+                    .values(status=status, text=func.coalesce(cls.model.text, text))
+                    .returning(cls.model.id, cls.model.deals_id, cls.model.status)
+                    .execution_options(synchronize_session=False)
+                )
+                updated = result.first()
+                if updated is not None:
+                    await DealSummaryDAO.record_status(session, updated)
+                elif deals_id is not None:
+                    source = select(
+                        literal(message_id, columns.id.type),
+                        literal(sender, columns.sender.type),
+                        literal(text, columns.text.type),
+                        literal(timestamp, columns.timestamp.type),
+                        literal(status, columns.status.type),
+                        literal(deals_id, columns.deals_id.type),
+                    ).where(
+                        ~select(cls.model.id)
+                        .where(cls.model.id == message_id)
+                        .correlate(None)
+                        .exists()
+                    )
+                    result = await session.execute(
+                        insert(cls.model)
+                        .from_select(
+                            ["id", "sender", "text", "timestamp", "status", "deals_id"], source
+                        )
+                        .returning(cls.model)
+                    )
+                    message = result.scalar_one_or_none()
+                    if message is None:
+                        return False
+                    await DealSummaryDAO.record_message(session, message, inbound=False)
+                else:
+                    return False
+        cls._mark_written({"id": message_id, "deals_id": deals_id})
+        return True
+
+    @classmethod
+    async def get_message_by_deal(
+        cls,
+        deal_id: UUID,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> Sequence[Row[Any] | RowMapping | Any]:
+        query = select(cls.model).filter_by(deals_id=deal_id)
+        if date_from is not None:
+            query = query.where(cls.model.timestamp >= date_from)
+        if date_to is not None:
+            query = query.where(cls.model.timestamp <= date_to)
+        async with await cls.get_read_session(("deal", str(deal_id))) as session:
+            result = await session.execute(query.order_by(cls.model.timestamp))
             return result.scalars().all()
 
+    @classmethod
+    async def get_history_rows(
+        cls,
+        deal_id: UUID,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> Sequence[Row]:
+        """
+        История сделки кортежами (id, sender, text, media, timestamp, status)
+        без создания ORM-объектов.
+        """
+        model = cls.model
+        query = select(
+            model.id, model.sender, model.text, model.media, model.timestamp, model.status
+        ).where(model.deals_id == deal_id)
+        if date_from is not None:
+            query = query.where(model.timestamp >= date_from)
+        if date_to is not None:
+            query = query.where(model.timestamp <= date_to)
+        async with await cls.get_read_session(("deal", str(deal_id))) as session:
+            result = await session.execute(query.order_by(model.timestamp))
+            return result.all()
+
+    @classmethod
+    async def search(
+        cls,
+        query_text: str,
+        operator_phone: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        after: Optional[Tuple[float, datetime, str]] = None,
+        limit: int = 20,
+    ) -> Sequence[Row[Any]]:
+        """
+        Полнотекстовый поиск по сообщениям (GIN-индекс по search_vector).
+        Результаты упорядочены по (rank, timestamp, id) по убыванию;
+        after — ключ последней строки предыдущей страницы (keyset-пагинация).
+        """
+        tsquery = func.websearch_to_tsquery("russian", query_text).op("||")(
+            func.websearch_to_tsquery("english", query_text)
+        )
+        rank = func.ts_rank_cd(cls.model.search_vector, tsquery).label("rank")
+
+        page = (
+            select(
+                cls.model.id,
+                cls.model.timestamp,
+                cls.model.deals_id,
+                cls.model.sender,
+                cls.model.text,
+                rank,
+            )
+            .where(cls.model.search_vector.op("@@")(tsquery))
+        )
+        if operator_phone:
+            page = page.join(Deals, Deals.id == cls.model.deals_id).where(
+                Deals.operator_phone == operator_phone
+            )
+        if date_from is not None:
+            page = page.where(cls.model.timestamp >= date_from)
+        if date_to is not None:
+            page = page.where(cls.model.timestamp <= date_to)
+        if after is not None:
+            page = page.where(
+                tuple_(rank, cls.model.timestamp, cls.model.id) < tuple_(*after)
+            )
+        page = (
+            page.order_by(desc(rank), desc(cls.model.timestamp), desc(cls.model.id))
+            .limit(limit)
+            .subquery()
+        )
+
+        # Подсветку считаем только для строк страницы
+        snippet = func.ts_headline(
+            "russian",
+            func.coalesce(page.c.text, ""),
+            tsquery,
+            "StartSel=<b>, StopSel=</b>, MaxFragments=2, MaxWords=20, MinWords=5",
+        ).label("snippet")
+        query = (
+            select(
+                page.c.id,
+                page.c.timestamp,
+                page.c.deals_id,
+                page.c.sender,
+                page.c.rank,
+                snippet,
+                Deals.client_phone,
+                Deals.operator_phone,
+            )
+            .join(Deals, Deals.id == page.c.deals_id)
+            .order_by(desc(page.c.rank), desc(page.c.timestamp), desc(page.c.id))
+        )
+        async with await cls.get_read_session() as session:
+            result = await session.execute(query)
+            return result.all()
+
+    @classmethod
+    async def stream_older_than(
+        cls, cutoff: datetime, batch_size: int = 1000
+    ) -> AsyncIterator[Sequence[Row[Any]]]:
+        """
+        Потоково читает сообщения старше cutoff через серверный курсор primary —
+        реплика может отставать, и выгруженная с неё строка разошлась бы с удаляемой.
+        Строки содержат колонки сообщения и телефоны сделки.
+        """
+        query = (
+            select(
+                cls.model.id,
+                cls.model.sender,
+                cls.model.text,
+                cls.model.media,
+                cls.model.timestamp,
+                cls.model.status,
+                cls.model.template_id,
+                cls.model.deals_id,
+                Deals.client_phone,
+                Deals.operator_phone,
+            )
+            .join(Deals, Deals.id == cls.model.deals_id)
+            .where(cls.model.timestamp < cutoff)
+            .order_by(cls.model.timestamp)
+            .execution_options(yield_per=batch_size)
+        )
+        async with await cls.get_session() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions(batch_size):
+                yield rows
+
+    @classmethod
+    async def delete_archived(
+        cls, keys: Sequence[Tuple[str, datetime, StatusEnum]]
+    ) -> int:
+        """
+        Удаляет выгруженные в архив сообщения по ключам (id, timestamp, status).
+        Строка, статус которой изменился после выгрузки, не удаляется и попадёт
+        в архив ещё раз со следующим проходом.
+        """
+        if not keys:
+            return 0
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(cls.model).where(
+                        tuple_(cls.model.id, cls.model.timestamp, cls.model.status).in_(keys)
+                    )
+                )
+            return result.rowcount
+
 
 class DealsDAO(BaseDAO):
     model = Deals
+    # Индекс сделок в памяти (src.utils.deals_index), подключается при старте
+    index: Optional[Any] = None
 
     @classmethod
     async def add(cls, **values: Any) -> Deals:
@@ -126,11 +465,34 @@ class DealsDAO(BaseDAO):
 
                 new_instance = cls.model(**values)
                 session.add(new_instance)
+                # Остальные воркеры и реплики приложения узнают о сделке после коммита
+                await session.execute(
+                    select(
+                        func.pg_notify(
+                            DEALS_CHANNEL,
+                            f"{values['id']}:{values['client_phone']}:{values['operator_phone']}",
+                        )
+                    )
+                )
+            cls._mark_written(values)
+            if cls.index is not None:
+                cls.index.put(values["client_phone"], values["operator_phone"], values["id"])
             return new_instance
 
+    @classmethod
+    def _mark_written(cls, values: Dict[str, Any]) -> None:
+        super()._mark_written(values)
+        if values.get("id") is not None:
+            recent_writes.mark(("deal", str(values["id"])))
+        if values.get("client_phone") and values.get("operator_phone"):
+            recent_writes.mark(
+                ("deal_phones", values["client_phone"], values["operator_phone"])
+            )
+
     @classmethod
     async def find_by_phones(cls, client_phone: str, operator_phone: str) -> Optional[Deals]:
-        async with await cls.get_session() as session:
+        key = ("deal_phones", client_phone, operator_phone)
+        async with await cls.get_read_session(key) as session:
             query = select(cls.model).where(
                 cls.model.client_phone == client_phone,
                 cls.model.operator_phone == operator_phone,
@@ -139,9 +501,265 @@ class DealsDAO(BaseDAO):
             return result.scalars().first()
         
     @classmethod
-    async def find_id(cls, client_phone: str, operator_phone: str) -> Optional[int]:
+    async def find_id(cls, client_phone: str, operator_phone: str) -> Optional[UUID]:
+        if cls.index is not None:
+            deal_id = cls.index.get(client_phone, operator_phone)
+            if deal_id is not None:
+                return deal_id
         deal = await cls.find_by_phones(client_phone, operator_phone)
-        return deal.id if deal else None
+        if deal is None:
+            return None
+        if cls.index is not None:
+            cls.index.put(deal.client_phone, deal.operator_phone, deal.id)
+        return deal.id
+
+    @classmethod
+    async def stream_keys(cls, batch_size: int) -> AsyncIterator[Sequence[Row]]:
+        """Потоково отдаёт (id, client_phone, operator_phone) всех сделок пачками."""
+        query = select(
+            cls.model.id, cls.model.client_phone, cls.model.operator_phone
+        ).execution_options(yield_per=batch_size)
+        async with await cls.get_session() as session:
+            result = await session.stream(query)
+            async for rows in result.partitions(batch_size):
+                yield rows
+
+    @classmethod
+    async def find_by_lead(cls, lead_id: int) -> Optional[Deals]:
+        """
+        Сделка лида amoCRM; если лид связан с несколькими операторами —
+        с самой свежей активностью.
+        """
+        query = (
+            select(cls.model)
+            .outerjoin(DealSummary, DealSummary.deal_id == cls.model.id)
+            .where(cls.model.lead_id == lead_id)
+            .order_by(
+                DealSummary.last_message_at.desc().nulls_last(),
+                cls.model.created_at.desc(),
+            )
+            .limit(1)
+        )
+        async with await cls.get_read_session(("lead", lead_id)) as session:
+            result = await session.execute(query)
+            return result.scalar_one_or_none()
+
+    @classmethod
+    async def link_lead(
+        cls,
+        client_phone: str,
+        lead_id: int,
+        contact_id: Optional[int],
+        operator_phone: Optional[str] = None,
+    ) -> int:
+        """
+        Привязывает лид и контакт amoCRM к сделке клиента с оператором operator_phone,
+        а если оператор неизвестен — к сделкам клиента, у которых лида ещё нет.
+        Лиды других сделок клиента не перезаписываются.
+        :return: количество изменённых сделок.
+        """
+        target = (
+            cls.model.operator_phone == operator_phone
+            if operator_phone
+            else cls.model.lead_id.is_(None)
+        )
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(cls.model)
+                    .where(
+                        cls.model.client_phone == client_phone,
+                        target,
+                        or_(
+                            cls.model.lead_id.is_distinct_from(lead_id),
+                            cls.model.contact_id.is_distinct_from(contact_id),
+                        ),
+                    )
+                    .values(lead_id=lead_id, contact_id=contact_id)
+                )
+        if result.rowcount:
+            recent_writes.mark(("lead", lead_id))
+        return result.rowcount
+
+    @classmethod
+    async def scan_after(cls, after_id: Optional[UUID], limit: int) -> Sequence[Deals]:
+        """Следующая пачка сделок по возрастанию id (keyset); читает primary."""
+        query = select(cls.model).order_by(cls.model.id).limit(limit)
+        if after_id is not None:
+            query = query.where(cls.model.id > after_id)
+        async with await cls.get_session() as session:
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    @classmethod
+    async def set_conversation_ids(cls, conversation_ids: Dict[UUID, str]) -> int:
+        """Массово проставляет conversation_id одним executemany UPDATE по первичному ключу."""
+        if not conversation_ids:
+            return 0
+        async with await cls.get_session() as session:
+            async with session.begin():
+                await session.execute(
+                    update(cls.model),
+                    [
+                        {"id": deal_id, "conversation_id": conversation_id}
+                        for deal_id, conversation_id in conversation_ids.items()
+                    ],
+                )
+        recent_writes.mark(*(("deal", str(deal_id)) for deal_id in conversation_ids))
+        return len(conversation_ids)
+
+
+class DealSummaryDAO(BaseDAO):
+    model = DealSummary
+
+    @classmethod
+    async def record_message(
+        cls, session: AsyncSession, message: Messages, inbound: bool
+    ) -> None:
+        """
+        Upsert сводки по сделке одним выражением INSERT ... SELECT ... ON CONFLICT.
+        Вызывается внутри транзакции записи сообщения.
+        """
+        columns = cls.model.__table__.c
+        status = message.status or StatusEnum.sent
+        source = select(
+            Deals.id,
+            Deals.client_phone,
+            Deals.operator_phone,
+            literal(message.id, columns.last_message_id.type),
+            literal(message.text, columns.last_message_text.type),
+            literal(message.timestamp, columns.last_message_at.type),
+            literal(status, columns.last_status.type),
+            literal(message.timestamp if inbound else None, columns.last_inbound_at.type),
+            literal(1 if inbound else 0),
+            literal(1),
+        ).where(Deals.id == message.deals_id)
+        stmt = pg_insert(cls.model).from_select(
+            [
+                "deal_id",
+                "client_phone",
+                "operator_phone",
+                "last_message_id",
+                "last_message_text",
+                "last_message_at",
+                "last_status",
+                "last_inbound_at",
+                "unread_count",
+                "message_count",
+            ],
+            source,
+        )
+        excluded = stmt.excluded
+        newer = or_(
+            cls.model.last_message_at.is_(None),
+            excluded.last_message_at >= cls.model.last_message_at,
+        )
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.model.deal_id],
+            set_={
+                "last_message_id": case(
+                    (newer, excluded.last_message_id), else_=cls.model.last_message_id
+                ),
+                "last_message_text": case(
+                    (newer, excluded.last_message_text), else_=cls.model.last_message_text
+                ),
+                "last_status": case(
+                    (newer, excluded.last_status), else_=cls.model.last_status
+                ),
+                "last_message_at": func.greatest(cls.model.last_message_at, excluded.last_message_at),
+                "last_inbound_at": func.greatest(cls.model.last_inbound_at, excluded.last_inbound_at),
+                "unread_count": cls.model.unread_count + 1 if inbound else 0,
+                "message_count": cls.model.message_count + 1,
+            },
+        )
+        await session.execute(stmt)
+
+    @classmethod
+    async def record_status(cls, session: AsyncSession, message: Any) -> None:
+        """Обновляет статус в сводке, если это последнее сообщение диалога."""
+        await session.execute(
+            update(cls.model)
+            .where(
+                cls.model.deal_id == message.deals_id,
+                cls.model.last_message_id == message.id,
+            )
+            .values(last_status=message.status)
+        )
+
+    @classmethod
+    async def list_recent(
+        cls,
+        operator_phone: Optional[str] = None,
+        after: Optional[Tuple[datetime, UUID]] = None,
+        limit: int = 50,
+    ) -> Sequence[DealSummary]:
+        """
+        Диалоги по убыванию последней активности (keyset по last_message_at, deal_id).
+        """
+        query = select(cls.model).where(cls.model.last_message_at.is_not(None))
+        if operator_phone:
+            query = query.where(cls.model.operator_phone == operator_phone)
+        if after is not None:
+            query = query.where(
+                tuple_(cls.model.last_message_at, cls.model.deal_id) < tuple_(*after)
+            )
+        query = query.order_by(
+            desc(cls.model.last_message_at), desc(cls.model.deal_id)
+        ).limit(limit)
+        async with await cls.get_read_session() as session:
+            result = await session.execute(query)
+            return result.scalars().all()
+
+    @classmethod
+    async def active_since(cls, deal_ids: Sequence[UUID], since: datetime) -> Set[UUID]:
+        """
+        :return: id сделок из deal_ids, в которых были сообщения после since.
+        """
+        if not deal_ids:
+            return set()
+        async with await cls.get_session() as session:
+            result = await session.execute(
+                select(cls.model.deal_id).where(
+                    cls.model.deal_id.in_(deal_ids), cls.model.last_message_at >= since
+                )
+            )
+            return set(result.scalars().all())
+
+    @classmethod
+    async def sync_last_status(cls, deal_ids: Sequence[UUID]) -> int:
+        """
+        Выравнивает last_status сводки по статусу последнего сообщения в messages
+        (если обновление сводки было потеряно).
+        :return: количество исправленных сводок.
+        """
+        if not deal_ids:
+            return 0
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(cls.model)
+                    .where(
+                        cls.model.deal_id.in_(deal_ids),
+                        Messages.id == cls.model.last_message_id,
+                        Messages.timestamp == cls.model.last_message_at,
+                        cls.model.last_status.is_distinct_from(Messages.status),
+                    )
+                    .values(last_status=Messages.status)
+                    .execution_options(synchronize_session=False)
+                )
+            return result.rowcount
+
+    @classmethod
+    async def mark_read(cls, deal_id: UUID) -> bool:
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(cls.model)
+                    .where(cls.model.deal_id == deal_id)
+                    .values(unread_count=0)
+                )
+            return result.rowcount > 0
 
 
 class TemplatesDAO(BaseDAO):
@@ -151,6 +769,241 @@ class TemplatesDAO(BaseDAO):
 class OperatorsDAO(BaseDAO):
     model = OperatorsData
 
+    @classmethod
+    async def get_all(cls) -> Sequence[OperatorsData]:
+        async with await cls.get_session() as session:
+            result = await session.execute(select(cls.model).order_by(cls.model.id))
+            return result.scalars().all()
+
+
+class BroadcastDAO(BaseDAO):
+    model = BroadcastJob
+
+    @classmethod
+    async def create(
+        cls,
+        template_name: str,
+        language: str,
+        operator_phone: Optional[str] = None,
+        phones: Optional[Sequence[str]] = None,
+        from_deals: bool = False,
+        chunk_size: int = 1000,
+    ) -> BroadcastJob:
+        """
+        Создаёт рассылку и её получателей в одной транзакции.
+        Получатели — явный список телефонов и/или клиенты из Deals оператора.
+        Повторяющиеся телефоны отбрасываются.
+        """
+        now = datetime.now()
+        job = cls.model(
+            id=uuid4(),
+            template_name=template_name,
+            language=language,
+            operator_phone=operator_phone,
+            status=BroadcastStatusEnum.running,
+            total=0,
+            sent=0,
+            failed=0,
+            created_at=now,
+            updated_at=now,
+        )
+        recipients = BroadcastRecipient.__table__
+        async with await cls.get_session() as session:
+            async with session.begin():
+                session.add(job)
+                await session.flush()
+
+                unique_phones = list(dict.fromkeys(phones or []))
+                for start in range(0, len(unique_phones), chunk_size):
+                    await session.execute(
+                        pg_insert(recipients)
+                        .values(
+                            [
+                                {"job_id": job.id, "phone": phone, "status": RecipientStatusEnum.pending}
+                                for phone in unique_phones[start:start + chunk_size]
+                            ]
+                        )
+                        .on_conflict_do_nothing()
+                    )
+
+                if from_deals:
+                    source = select(
+                        literal(job.id, recipients.c.job_id.type),
+                        Deals.client_phone,
+                        literal(RecipientStatusEnum.pending, recipients.c.status.type),
+                    ).distinct()
+                    if operator_phone:
+                        source = source.where(Deals.operator_phone == operator_phone)
+                    await session.execute(
+                        pg_insert(recipients)
+                        .from_select(["job_id", "phone", "status"], source)
+                        .on_conflict_do_nothing()
+                    )
+
+                total = await session.scalar(
+                    select(func.count()).where(recipients.c.job_id == job.id)
+                )
+                job.total = total
+            return job
+
+    @classmethod
+    async def get_running(cls) -> Sequence[BroadcastJob]:
+        async with await cls.get_session() as session:
+            result = await session.execute(
+                select(cls.model)
+                .where(cls.model.status == BroadcastStatusEnum.running)
+                .order_by(cls.model.created_at)
+            )
+            return result.scalars().all()
+
+    @classmethod
+    async def set_status(
+        cls,
+        job_id: UUID,
+        status: BroadcastStatusEnum,
+        allowed_from: Sequence[BroadcastStatusEnum],
+    ) -> Optional[BroadcastJob]:
+        """
+        Переводит рассылку в новый статус, если текущий статус входит в allowed_from.
+        При отмене все ещё не отправленные получатели помечаются cancelled.
+        """
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(cls.model)
+                    .where(cls.model.id == job_id, cls.model.status.in_(allowed_from))
+                    .values(status=status, updated_at=datetime.now())
+                    .returning(cls.model)
+                )
+                job = result.scalar_one_or_none()
+                if job is not None and status == BroadcastStatusEnum.cancelled:
+                    await session.execute(
+                        update(BroadcastRecipient)
+                        .where(
+                            BroadcastRecipient.job_id == job_id,
+                            BroadcastRecipient.status == RecipientStatusEnum.pending,
+                        )
+                        .values(status=RecipientStatusEnum.cancelled)
+                    )
+            return job
+
+    @classmethod
+    async def claim_batch(
+        cls, job_id: UUID, limit: int, stale_after: timedelta = timedelta(minutes=10)
+    ) -> Sequence[Row[Any]]:
+        """
+        Забирает пачку получателей на отправку (pending или зависшие sending).
+        FOR UPDATE SKIP LOCKED позволяет нескольким воркерам делить одну рассылку.
+        """
+        now = datetime.now()
+        candidates = (
+            select(BroadcastRecipient.id)
+            .where(
+                BroadcastRecipient.job_id == job_id,
+                or_(
+                    BroadcastRecipient.status == RecipientStatusEnum.pending,
+                    (BroadcastRecipient.status == RecipientStatusEnum.sending)
+                    & (BroadcastRecipient.claimed_at < now - stale_after),
+                ),
+            )
+            .order_by(BroadcastRecipient.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(BroadcastRecipient)
+                    .where(BroadcastRecipient.id.in_(candidates.scalar_subquery()))
+                    .values(status=RecipientStatusEnum.sending, claimed_at=now)
+                    .returning(BroadcastRecipient.id, BroadcastRecipient.phone)
+                )
+                return result.all()
+
+    @classmethod
+    async def save_results(cls, job_id: UUID, results: Sequence[Dict[str, Any]]) -> None:
+        """
+        Сохраняет результаты отправки пачки и обновляет счётчики рассылки.
+        :param results: словари id, status, message_id, error, sent_at.
+        """
+        if not results:
+            return
+        sent = sum(1 for item in results if item["status"] == RecipientStatusEnum.sent)
+        async with await cls.get_session() as session:
+            async with session.begin():
+                await session.execute(update(BroadcastRecipient), list(results))
+                await session.execute(
+                    update(cls.model)
+                    .where(cls.model.id == job_id)
+                    .values(
+                        sent=cls.model.sent + sent,
+                        failed=cls.model.failed + (len(results) - sent),
+                        updated_at=datetime.now(),
+                    )
+                )
+
+    @classmethod
+    async def complete_if_done(cls, job_id: UUID) -> bool:
+        """Помечает рассылку завершённой, если не осталось неотправленных получателей."""
+        unfinished = (
+            select(BroadcastRecipient.id)
+            .where(
+                BroadcastRecipient.job_id == job_id,
+                BroadcastRecipient.status.in_(
+                    [RecipientStatusEnum.pending, RecipientStatusEnum.sending]
+                ),
+            )
+            .exists()
+        )
+        async with await cls.get_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(cls.model)
+                    .where(
+                        cls.model.id == job_id,
+                        cls.model.status == BroadcastStatusEnum.running,
+                        ~unfinished,
+                    )
+                    .values(status=BroadcastStatusEnum.completed, updated_at=datetime.now())
+                )
+            return result.rowcount > 0
+
+    @classmethod
+    async def sent_since(cls, operator_phone: Optional[str], since: datetime) -> int:
+        """Количество отправленных рассылками сообщений с номера оператора после since."""
+        query = (
+            select(func.count())
+            .select_from(BroadcastRecipient)
+            .join(cls.model, cls.model.id == BroadcastRecipient.job_id)
+            .where(
+                BroadcastRecipient.status == RecipientStatusEnum.sent,
+                BroadcastRecipient.sent_at >= since,
+            )
+        )
+        if operator_phone:
+            query = query.where(cls.model.operator_phone == operator_phone)
+        else:
+            query = query.where(cls.model.operator_phone.is_(None))
+        async with await cls.get_session() as session:
+            return await session.scalar(query)
+
+    @classmethod
+    async def get_recipients(
+        cls,
+        job_id: UUID,
+        status: Optional[RecipientStatusEnum] = None,
+        after_id: int = 0,
+        limit: int = 100,
+    ) -> Sequence[BroadcastRecipient]:
+        query = select(BroadcastRecipient).where(
+            BroadcastRecipient.job_id == job_id, BroadcastRecipient.id > after_id
+        )
+        if status is not None:
+            query = query.where(BroadcastRecipient.status == status)
+        async with await cls.get_read_session(cls._row_key(job_id)) as session:
+            result = await session.execute(query.order_by(BroadcastRecipient.id).limit(limit))
+            return result.scalars().all()
+
 
 class MessageRecordDAO(BaseDAO):
     model = MessageRecord
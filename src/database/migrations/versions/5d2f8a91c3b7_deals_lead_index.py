@@ -0,0 +1,34 @@
+"""deals lead_id and contact_id
+
+Revision ID: 5d2f8a91c3b7
+Revises: 1c427461e4ba
+Create Date: 2026-10-18 23:40:05.318277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2f8a91c3b7'
+down_revision: Union[str, Sequence[str], None] = '1c427461e4ba'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("deals", sa.Column("lead_id", sa.BigInteger(), nullable=True))
+    op.add_column("deals", sa.Column("contact_id", sa.BigInteger(), nullable=True))
+    op.create_index(op.f("ix_deals_lead_id"), "deals", ["lead_id"], unique=False)
+    op.create_index(op.f("ix_deals_contact_id"), "deals", ["contact_id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_deals_contact_id"), table_name="deals")
+    op.drop_index(op.f("ix_deals_lead_id"), table_name="deals")
+    op.drop_column("deals", "contact_id")
+    op.drop_column("deals", "lead_id")
@@ -0,0 +1,111 @@
+"""partition messages by month
+
+Revision ID: 883501030dee
+Revises: 673e29c13c4a
+Create Date: 2026-10-18 12:10:04.215377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '883501030dee'
+down_revision: Union[str, Sequence[str], None] = '673e29c13c4a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MESSAGES_COLUMNS = 'id, sender, text, media, "timestamp", status, template_id, deals_id'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("ALTER TABLE messages RENAME TO messages_legacy")
+    op.execute("ALTER TABLE messages_legacy RENAME CONSTRAINT messages_pkey TO messages_legacy_pkey")
+    op.execute("ALTER INDEX ix_messages_sender RENAME TO ix_messages_legacy_sender")
+
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id VARCHAR NOT NULL,
+            sender VARCHAR NOT NULL,
+            text TEXT,
+            media TEXT,
+            "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            status statusenum NOT NULL,
+            template_id BIGINT REFERENCES templates (id),
+            deals_id UUID NOT NULL REFERENCES deals (id),
+            CONSTRAINT messages_pkey PRIMARY KEY (id, "timestamp")
+        ) PARTITION BY RANGE ("timestamp")
+        """
+    )
+    op.create_index(op.f("ix_messages_sender"), "messages", ["sender"], unique=False)
+    op.create_index(
+        "ix_messages_deals_id_timestamp", "messages", ["deals_id", "timestamp"], unique=False
+    )
+
+    # Месячные секции от самого старого сообщения до трёх месяцев вперёд
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            m date := date_trunc('month', COALESCE((SELECT min("timestamp") FROM messages_legacy), now()));
+            last_month date := date_trunc('month', now()) + interval '3 months';
+        BEGIN
+            WHILE m <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(m, 'YYYY') || 'm' || to_char(m, 'MM'),
+                    m,
+                    (m + interval '1 month')::date
+                );
+                m := (m + interval '1 month')::date;
+            END LOOP;
+        END $$;
+        """
+    )
+    op.execute("CREATE TABLE messages_default PARTITION OF messages DEFAULT")
+
+    op.execute(
+        f"INSERT INTO messages ({MESSAGES_COLUMNS}) "
+        f"SELECT {MESSAGES_COLUMNS} FROM messages_legacy"
+    )
+    op.drop_table("messages_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER INDEX ix_messages_sender RENAME TO ix_messages_partitioned_sender")
+    op.execute(
+        "ALTER TABLE messages_partitioned RENAME CONSTRAINT messages_pkey TO messages_partitioned_pkey"
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("sender", sa.String(), nullable=False),
+        sa.Column("text", sa.Text(), nullable=True),
+        sa.Column("media", sa.Text(), nullable=True),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column(
+            "status",
+            sa.Enum("sent", "delivered", "read", name="statusenum", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("template_id", sa.BigInteger(), nullable=True),
+        sa.Column("deals_id", sa.UUID(), nullable=False),
+        sa.ForeignKeyConstraint(["deals_id"], ["deals.id"]),
+        sa.ForeignKeyConstraint(["template_id"], ["templates.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_messages_sender"), "messages", ["sender"], unique=False)
+
+    op.execute(
+        f"INSERT INTO messages ({MESSAGES_COLUMNS}) "
+        f"SELECT DISTINCT ON (id) {MESSAGES_COLUMNS} FROM messages_partitioned "
+        f'ORDER BY id, "timestamp" DESC'
+    )
+    op.execute("DROP TABLE messages_partitioned CASCADE")
@@ -0,0 +1,43 @@
+"""messages full text search
+
+Revision ID: 894f0fb3600e
+Revises: 883501030dee
+Create Date: 2026-10-18 13:02:41.870112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '894f0fb3600e'
+down_revision: Union[str, Sequence[str], None] = '883501030dee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        """
+        ALTER TABLE messages ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian'::regconfig, coalesce(text, '')), 'A') ||
+            setweight(to_tsvector('english'::regconfig, coalesce(text, '')), 'B')
+        ) STORED
+        """
+    )
+    op.create_index(
+        "ix_messages_search_vector",
+        "messages",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_search_vector", table_name="messages")
+    op.drop_column("messages", "search_vector")
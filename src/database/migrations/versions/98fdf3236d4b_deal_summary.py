@@ -0,0 +1,85 @@
+"""deal summary
+
+Revision ID: 98fdf3236d4b
+Revises: 894f0fb3600e
+Create Date: 2026-10-18 13:40:12.553920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '98fdf3236d4b'
+down_revision: Union[str, Sequence[str], None] = '894f0fb3600e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "deal_summary",
+        sa.Column("deal_id", sa.UUID(), nullable=False),
+        sa.Column("client_phone", sa.String(), nullable=False),
+        sa.Column("operator_phone", sa.String(), nullable=False),
+        sa.Column("last_message_id", sa.String(), nullable=True),
+        sa.Column("last_message_text", sa.Text(), nullable=True),
+        sa.Column("last_message_at", sa.DateTime(), nullable=True),
+        sa.Column(
+            "last_status",
+            postgresql.ENUM("sent", "delivered", "read", name="statusenum", create_type=False),
+            nullable=True,
+        ),
+        sa.Column("last_inbound_at", sa.DateTime(), nullable=True),
+        sa.Column("unread_count", sa.Integer(), nullable=False),
+        sa.Column("message_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["deal_id"], ["deals.id"]),
+        sa.PrimaryKeyConstraint("deal_id"),
+    )
+    op.create_index(
+        "ix_deal_summary_last_message_at",
+        "deal_summary",
+        ["last_message_at", "deal_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_deal_summary_operator_last_message_at",
+        "deal_summary",
+        ["operator_phone", "last_message_at", "deal_id"],
+        unique=False,
+    )
+
+    # Начальное заполнение по существующей истории.
+    # Направление сообщений в messages не хранится, поэтому unread_count и
+    # last_inbound_at начинают считаться с момента миграции.
+    op.execute(
+        """
+        INSERT INTO deal_summary (
+            deal_id, client_phone, operator_phone, last_message_id, last_message_text,
+            last_message_at, last_status, last_inbound_at, unread_count, message_count
+        )
+        SELECT d.id, d.client_phone, d.operator_phone, last.id, last.text,
+               last."timestamp", last.status, NULL, 0, stats.cnt
+        FROM deals d
+        JOIN (
+            SELECT deals_id, count(*) AS cnt FROM messages GROUP BY deals_id
+        ) stats ON stats.deals_id = d.id
+        JOIN LATERAL (
+            SELECT m.id, m.text, m."timestamp", m.status FROM messages m
+            WHERE m.deals_id = d.id
+            ORDER BY m."timestamp" DESC, m.id DESC
+            LIMIT 1
+        ) last ON TRUE
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_deal_summary_operator_last_message_at", table_name="deal_summary")
+    op.drop_index("ix_deal_summary_last_message_at", table_name="deal_summary")
+    op.drop_table("deal_summary")
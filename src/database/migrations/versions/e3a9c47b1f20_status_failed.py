@@ -0,0 +1,30 @@
+"""add failed message status
+
+Revision ID: e3a9c47b1f20
+Revises: 5d2f8a91c3b7
+Create Date: 2026-10-19 00:12:41.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9c47b1f20'
+down_revision: Union[str, Sequence[str], None] = '5d2f8a91c3b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # ADD VALUE нельзя использовать в той же транзакции, где значение добавлено
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE statusenum ADD VALUE IF NOT EXISTS 'failed'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Postgres не удаляет значения enum; сообщения со статусом failed остаются
+    pass
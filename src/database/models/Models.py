@@ -1,26 +1,47 @@
 from datetime import datetime
 from enum import Enum as PyEnum
+from typing import Optional
 
 from sqlalchemy import (
     UUID,
     BigInteger,
+    Computed,
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database.models.base import Base
 
 
+# Полнотекстовый индекс по тексту сообщения: русская и английская морфология
+MESSAGES_SEARCH_VECTOR = (
+    "setweight(to_tsvector('russian'::regconfig, coalesce(text, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, coalesce(text, '')), 'B')"
+)
+
+
 class StatusEnum(PyEnum):
     sent = "sent"
     delivered = "delivered"
     read = "read"
+    failed = "failed"
+
+
+# Порядок статусов исходящего сообщения: статус меняется только вперёд
+STATUS_RANK = {
+    StatusEnum.sent: 0,
+    StatusEnum.delivered: 1,
+    StatusEnum.read: 2,
+    StatusEnum.failed: 3,
+}
 
 
 class Messages(Base):
@@ -28,7 +49,10 @@ class Messages(Base):
     sender: Mapped[str] = mapped_column(String, nullable=False, index=True)
     text: Mapped[str] = mapped_column(Text, nullable=True)
     media: Mapped[Text] = mapped_column(Text, nullable=True)
-    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Таблица секционирована по месяцам, поэтому timestamp входит в первичный ключ
+    timestamp: Mapped[datetime] = mapped_column(
+        DateTime, primary_key=True, nullable=False
+    )
     status: Mapped[StatusEnum] = mapped_column(
         Enum(StatusEnum), nullable=False, default=StatusEnum.sent
     )
@@ -37,6 +61,16 @@ class Messages(Base):
     deals_id: Mapped[UUID] = mapped_column(ForeignKey("deals.id"), nullable=False)
     deal = relationship("Deals", back_populates="messages")
 
+    search_vector = mapped_column(
+        TSVECTOR, Computed(MESSAGES_SEARCH_VECTOR, persisted=True), deferred=True
+    )
+
+    __table_args__ = (
+        Index("ix_messages_deals_id_timestamp", "deals_id", "timestamp"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
 
 class Deals(Base):
     id: Mapped[UUID] = mapped_column(UUID, primary_key=True)
@@ -44,6 +78,9 @@ class Deals(Base):
     client_phone: Mapped[str] = mapped_column(String, nullable=False)
     operator_phone: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    # Лид и контакт amoCRM; заполняются, когда становятся известны
+    lead_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
+    contact_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True, index=True)
 
     messages = relationship("Messages", back_populates="deal")
 
@@ -52,6 +89,33 @@ class Deals(Base):
     )
 
 
+class DealSummary(Base):
+    """Сводка по диалогу, обновляется вместе с каждой записью в messages."""
+
+    __tablename__ = "deal_summary"
+
+    deal_id: Mapped[UUID] = mapped_column(ForeignKey("deals.id"), primary_key=True)
+    client_phone: Mapped[str] = mapped_column(String, nullable=False)
+    operator_phone: Mapped[str] = mapped_column(String, nullable=False)
+    last_message_id: Mapped[str] = mapped_column(String, nullable=True)
+    last_message_text: Mapped[str] = mapped_column(Text, nullable=True)
+    last_message_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    last_status: Mapped[StatusEnum] = mapped_column(Enum(StatusEnum), nullable=True)
+    last_inbound_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    unread_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_deal_summary_last_message_at", "last_message_at", "deal_id"),
+        Index(
+            "ix_deal_summary_operator_last_message_at",
+            "operator_phone",
+            "last_message_at",
+            "deal_id",
+        ),
+    )
+
+
 class Templates(Base):
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
@@ -65,6 +129,59 @@ class OperatorsData(Base):
     number: Mapped[str] = mapped_column(String, nullable=False)
 
 
+class BroadcastStatusEnum(PyEnum):
+    running = "running"
+    paused = "paused"
+    cancelled = "cancelled"
+    completed = "completed"
+
+
+class RecipientStatusEnum(PyEnum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class BroadcastJob(Base):
+    __tablename__ = "broadcast_job"
+
+    id: Mapped[UUID] = mapped_column(UUID, primary_key=True)
+    template_name: Mapped[str] = mapped_column(String, nullable=False)
+    language: Mapped[str] = mapped_column(String, nullable=False)
+    operator_phone: Mapped[str] = mapped_column(String, nullable=True)
+    status: Mapped[BroadcastStatusEnum] = mapped_column(
+        Enum(BroadcastStatusEnum), nullable=False, default=BroadcastStatusEnum.running
+    )
+    total: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    sent: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class BroadcastRecipient(Base):
+    __tablename__ = "broadcast_recipient"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    job_id: Mapped[UUID] = mapped_column(ForeignKey("broadcast_job.id"), nullable=False)
+    phone: Mapped[str] = mapped_column(String, nullable=False)
+    status: Mapped[RecipientStatusEnum] = mapped_column(
+        Enum(RecipientStatusEnum), nullable=False, default=RecipientStatusEnum.pending
+    )
+    message_id: Mapped[str] = mapped_column(String, nullable=True)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    claimed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("job_id", "phone", name="uq_broadcast_recipient"),
+        Index("ix_broadcast_recipient_job_status", "job_id", "status", "id"),
+        Index("ix_broadcast_recipient_sent_at", "sent_at"),
+    )
+
+
 class MessageRecord(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     source: Mapped[str] = mapped_column(String)
@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field, model_validator
+
+from src.database.models.Models import BroadcastStatusEnum, RecipientStatusEnum
+
+
+class BroadcastCreate(BaseModel):
+    template_name: str = Field(..., description="Имя шаблона (name из Meta)")
+    language_code: str = Field(..., description="Язык шаблона, например 'en_US'")
+    operator_phone: Optional[str] = Field(
+        None, description="Номер оператора, с которого отправлять (display_phone_number)"
+    )
+    recipients: List[str] = Field(default_factory=list, description="Телефоны получателей")
+    from_deals: bool = Field(
+        False, description="Добавить всех клиентов из сделок оператора (Deals)"
+    )
+
+    @model_validator(mode="after")
+    def recipients_required(self) -> "BroadcastCreate":
+        if not self.recipients and not self.from_deals:
+            raise ValueError("Нужно указать recipients или from_deals=true")
+        return self
+
+
+class BroadcastOut(BaseModel):
+    id: UUID
+    template_name: str
+    language: str
+    operator_phone: Optional[str]
+    status: BroadcastStatusEnum
+    total: int
+    sent: int
+    failed: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class BroadcastRecipientOut(BaseModel):
+    id: int
+    phone: str
+    status: RecipientStatusEnum
+    message_id: Optional[str]
+    error: Optional[str]
+    sent_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,8 @@
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, Field, validator
 
@@ -9,6 +11,9 @@ class TemplateSendRequest(BaseModel):
     to: str = Field(..., description="Телефон получателя в формате E.164")
     template_name: str = Field(..., description="Имя шаблона (name из Meta)")
     language_code: str = Field(..., description="Язык шаблона, например 'en_US'")
+    operator_phone: Optional[str] = Field(
+        None, description="Номер оператора, с которого отправить (display_phone_number)"
+    )
 
 
 class SendRequest(BaseModel):
@@ -16,6 +21,9 @@ class SendRequest(BaseModel):
 
     wa_id: str = Field(..., description="Номер телефона получателя")
     text: str = Field(..., description="Текст сообщения")
+    operator_phone: Optional[str] = Field(
+        None, description="Номер оператора, с которого отправить (display_phone_number)"
+    )
 
 
 class TestR(BaseModel):
@@ -49,6 +57,7 @@ class StatusEnum(str, Enum):
     sent = "sent"
     delivered = "delivered"
     read = "read"
+    failed = "failed"
 
 
 class MessageOut(BaseModel):
@@ -58,6 +67,61 @@ class MessageOut(BaseModel):
     media: Optional[str]
     timestamp: datetime
     status: StatusEnum
+    preview: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+@dataclass(slots=True)
+class MessageRow:
+    """Строка истории для быстрого пути: те же поля, что у MessageOut, без валидации."""
+
+    id: str
+    sender: str
+    text: Optional[str]
+    media: Optional[str]
+    timestamp: datetime
+    status: str
+    preview: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    id: str
+    deals_id: UUID
+    client_phone: str
+    operator_phone: str
+    sender: str
+    timestamp: datetime
+    rank: float
+    snippet: str
+
+
+class SearchPage(BaseModel):
+    items: List[SearchHit]
+    next_cursor: Optional[str] = Field(
+        None, description="Курсор следующей страницы; None — результатов больше нет"
+    )
+
+
+class ChatSummaryOut(BaseModel):
+    deal_id: UUID
+    client_phone: str
+    operator_phone: str
+    last_message_id: Optional[str]
+    last_message_text: Optional[str]
+    last_message_at: Optional[datetime]
+    last_status: Optional[StatusEnum]
+    last_inbound_at: Optional[datetime]
+    unread_count: int
+    message_count: int
+
+    class Config:
+        from_attributes = True
+
+
+class ChatPage(BaseModel):
+    items: List[ChatSummaryOut]
+    next_cursor: Optional[str] = Field(
+        None, description="Курсор следующей страницы; None — диалогов больше нет"
+    )
@@ -1,16 +1,84 @@
 import logging
 import logging.handlers
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Literal, Optional, TypeVar
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from .logger_config import setup_main_logger
+from .lazy import LazyObject
+from .logger_config import MAIN_LOGGER_NAME
 
-log = setup_main_logger()
+# Обработчики логгера настраиваются при старте процесса (setup_main_logger в lifespan)
+log = logging.getLogger(MAIN_LOGGER_NAME)
 
-load_dotenv()
+SettingsT = TypeVar("SettingsT", bound=BaseSettings)
+
+
+@lru_cache(maxsize=1)
+def load_env() -> None:
+    """Загружает .env в окружение один раз на процесс, при первом чтении настроек."""
+    load_dotenv()
+
+
+def lazy_settings(settings_cls: Callable[[], SettingsT]) -> LazyObject[SettingsT]:
+    """Настройки читаются из .env-файлов при первом обращении, а не при импорте."""
+
+    def factory() -> SettingsT:
+        load_env()
+        return settings_cls()
+
+    return LazyObject(factory, name=settings_cls.__name__)
+
+
+class AppSettings(BaseSettings):
+    # Процессы uvicorn; каждый воркер сам поднимает подключения и консьюмеры
+    WORKERS: int = 1
+    # Сколько секунд при остановке ждать завершения текущей работы
+    SHUTDOWN_TIMEOUT: float = 30.0
+
+    # Контроль нагрузки: при превышении порогов второстепенные запросы получают 503
+    ADMISSION_MAX_LOOP_LAG_MS: float = 200.0
+    ADMISSION_MAX_INFLIGHT: int = 200
+    ADMISSION_MAX_QUEUE_DEPTH: int = 5000
+    ADMISSION_QUEUES: list[str] = ["queue_name", "webhook_messages"]
+    ADMISSION_QUEUE_POLL_INTERVAL: float = 5.0
+    ADMISSION_RETRY_AFTER: int = 5
+
+    # Монитор event loop: пульс, окно статистики и порог блокирующего вызова
+    LOOP_LAG_TICK_MS: float = 50.0
+    LOOP_LAG_WINDOW: int = 1200
+    SLOW_CALLBACK_MS: float = 100.0
+    SLOW_CALLBACK_HISTORY: int = 50
+
+    # Доступ к /admin (заголовок X-Admin-Token); если не задан — эндпоинты закрыты
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_MAX_SECONDS: int = 60
+
+    # Журнал сырых тел входящих webhook-ов (zstd-сегменты, запись в отдельном потоке)
+    JOURNAL_ENABLED: bool = True
+    JOURNAL_DIR: str = "data/journal"
+    JOURNAL_SEGMENT_BYTES: int = 64 * 1024 * 1024
+    JOURNAL_SEGMENT_SECONDS: int = 3600
+    JOURNAL_FLUSH_INTERVAL: float = 1.0
+    JOURNAL_QUEUE_SIZE: int = 10000
+
+    # Сверка сделок Postgres ↔ Redis ↔ amoCRM
+    RECONCILE_INTERVAL: int = 3600  # 0 — фоновая сверка выключена
+    RECONCILE_BATCH_SIZE: int = 500
+    RECONCILE_CONCURRENCY: int = 4
+    RECONCILE_AMO_RPS: float = 5.0  # лимит amoCRM — 7 запросов в секунду на интеграцию
+    # Создавать чаты в amoCRM для сделок, где chat_id расходится или его нет нигде;
+    # без флага такие сделки только попадают в отчёт
+    RECONCILE_CREATE_CHATS: bool = False
+
+    model_config = SettingsConfigDict(
+        env_file=Path(__file__).resolve().parents[2] / ".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True,
+        extra="ignore",
+    )
 
 
 class DBSettings(BaseSettings):
@@ -21,6 +89,38 @@ class DBSettings(BaseSettings):
     DB_HOST: str
     DB_URL: str
 
+    # Профиль пула соединений SQLAlchemy/asyncpg
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_PGBOUNCER: bool = False
+    DB_POOL_SLOW_CHECKOUT_MS: float = 100.0
+
+    # Реплика только для чтения (история, отчёты); если не задана — всё идёт в primary
+    DB_REPLICA_HOST: Optional[str] = None
+    DB_REPLICA_PORT: Optional[int] = None
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # Секционирование messages: сколько месяцев создавать заранее и сколько хранить
+    MESSAGES_PARTITIONS_AHEAD: int = 3
+    MESSAGES_RETENTION_MONTHS: int = 0  # 0 — хранить бессрочно
+    MESSAGES_RETENTION_MODE: Literal["detach", "drop"] = "detach"
+    MESSAGES_PARTITION_CHECK_INTERVAL: int = 3600
+
+    # Архив старых сообщений (zstd JSONL на локальном диске)
+    ARCHIVE_DIR: str = "data/archive"
+    ARCHIVE_AFTER_DAYS: int = 0  # 0 — архивация выключена
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_INTERVAL: int = 86400
+
+    # Индекс сделок (клиент, оператор) → id в памяти воркера, загружается при старте
+    DEALS_INDEX_ENABLED: bool = False
+    DEALS_INDEX_BATCH_SIZE: int = 10000
+
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parents[2] / ".env",
         env_file_encoding="utf-8",
@@ -38,6 +138,24 @@ class MetaSettings(BaseSettings):
     APP_ID: str
     BUS_ID: str
 
+    # Входящие медиафайлы: контентно-адресуемое хранилище и пул загрузок
+    MEDIA_DIR: str = "data/media"
+    MEDIA_WORKERS: int = 4
+    MEDIA_QUEUE_SIZE: int = 1000
+    MEDIA_CHUNK_SIZE: int = 65536
+    MEDIA_MAX_BYTES: int = 100 * 1024 * 1024
+    MEDIA_DOWNLOAD_TIMEOUT: float = 120.0
+    PREVIEW_WORKERS: int = 2
+    PREVIEW_QUEUE_SIZE: int = 100
+    PREVIEW_SIZE: int = 320
+
+    # Массовые рассылки шаблонов
+    BROADCAST_CONCURRENCY: int = 20
+    BROADCAST_RATE: float = 20.0  # сообщений в секунду на номер
+    BROADCAST_BATCH_SIZE: int = 200
+    BROADCAST_POLL_INTERVAL: float = 5.0
+    BROADCAST_DAILY_LIMIT: Optional[int] = None  # если tier номера не удалось получить
+
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parents[2] / ".env.meta",
         env_file_encoding="utf-8",
@@ -57,6 +175,20 @@ class RedisSettings(BaseSettings):
     REDIS_DB: int
     # REDIS_PASSWORD: str
 
+    # Локальный кэш ключей с инвалидацией сервером (CLIENT TRACKING BCAST)
+    REDIS_CLIENT_CACHE: bool = True
+    REDIS_CLIENT_CACHE_SIZE: int = 10000
+    REDIS_CLIENT_CACHE_PREFIXES: list[str] = ["conv:"]
+    # Страховочный срок жизни записи кэша (0 — без срока) и период проверки соединений подписки
+    REDIS_CLIENT_CACHE_TTL: float = 60.0
+    REDIS_CLIENT_CACHE_HEALTH_SECONDS: float = 5.0
+    # Состояние диалога (хэш conv:{телефон клиента}) и очередь исходящих текстов
+    REDIS_CONVERSATION_TTL: int = 30 * 86400
+    REDIS_DEDUP_SECONDS: int = 300
+    # Последние события каждого чата для повтора при подключении WebSocket
+    REDIS_CHAT_STREAM_MAXLEN: int = 1000
+    REDIS_CHAT_STREAM_TTL: int = 7 * 86400
+
     @property
     def redis_url(self) -> str:
         # if self.REDIS_PASSWORD:
@@ -115,6 +247,12 @@ class RabbitMQSettings(BaseSettings):
     RABBITMQ_USER: str
     RABBITMQ_PASSWORD: str
     RABBITMQ_PORT: int
+    # Сколько неподтверждённых сообщений консьюмер обрабатывает одновременно;
+    # при > 1 события одного чата в queue_name могут обрабатываться не по порядку
+    RABBITMQ_PREFETCH: int = 20
+    # Шардирование событий чатов: число очередей-секций (0 — одна очередь queue_name)
+    RABBITMQ_CHAT_PARTITIONS: int = 0
+    RABBITMQ_PARTITION_LEASE_SECONDS: float = 15.0
 
     model_config = SettingsConfigDict(
         env_file=Path(__file__).resolve().parents[2] / ".env.rmq",
@@ -123,9 +261,10 @@ class RabbitMQSettings(BaseSettings):
     )
 
 
-dbsettings = DBSettings()
-metasettings = MetaSettings()
-amosettings = AmoCRMSettings()
-chatsettings = AmoChatsSettings()
-redissettings = RedisSettings()
-rmqsetting = RabbitMQSettings()
+appsettings: AppSettings = lazy_settings(AppSettings)
+dbsettings: DBSettings = lazy_settings(DBSettings)
+metasettings: MetaSettings = lazy_settings(MetaSettings)
+amosettings: AmoCRMSettings = lazy_settings(AmoCRMSettings)
+chatsettings: AmoChatsSettings = lazy_settings(AmoChatsSettings)
+redissettings: RedisSettings = lazy_settings(RedisSettings)
+rmqsetting: RabbitMQSettings = lazy_settings(RabbitMQSettings)
@@ -1,3 +1,9 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from sqlalchemy import exc
 from sqlalchemy.engine import Engine, create_engine
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
@@ -5,9 +11,72 @@ from sqlalchemy.ext.asyncio import (
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.settings.conf import dbsettings, log
+from src.settings.lazy import LazyObject
+
+
+@dataclass
+class PoolMetrics:
+    """Счётчики выдачи соединений из пула."""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    slow_checkouts: int = 0
+    total_checkout: float = 0.0
+    max_checkout: float = 0.0
+
+    def observe(self, elapsed: float, slow_threshold: float) -> None:
+        self.checkouts += 1
+        self.total_checkout += elapsed
+        self.max_checkout = max(self.max_checkout, elapsed)
+        if elapsed >= slow_threshold:
+            self.slow_checkouts += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        avg = self.total_checkout / self.checkouts if self.checkouts else 0.0
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "slow_checkouts": self.slow_checkouts,
+            "avg_checkout_ms": round(avg * 1000, 3),
+            "max_checkout_ms": round(self.max_checkout * 1000, 3),
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, измеряющий время выдачи соединения: ожидание свободного
+    и, если пул не заполнен, открытие нового соединения с БД.
+    Медленные выдачи (дольше DB_POOL_SLOW_CHECKOUT_MS) пишутся в лог —
+    это сигнал, что пул мал для текущего числа воркеров.
+    """
 
-from src.settings.conf import dbsettings
+    metrics: PoolMetrics
+    slow_threshold: float
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        pool.slow_threshold = self.slow_threshold
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            log.error(f"[DB] Таймаут ожидания соединения из пула: {self.status()}")
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.observe(elapsed, self.slow_threshold)
+            if elapsed >= self.slow_threshold:
+                log.warning(
+                    f"[DB] Выдача соединения из пула {elapsed * 1000:.1f} мс: {self.status()}"
+                )
 
 
 class DBConnection:
@@ -17,18 +86,70 @@ class DBConnection:
         :param: Объект с конфигурацией базы данных.
         """
         self.settings = dbsettings
+        self.metrics = PoolMetrics()
         self.engine = self.init_async_engine()
+        self.replica_metrics = PoolMetrics()
+        self.replica_engine: Optional[AsyncEngine] = self.init_replica_engine()
+        self.session_maker = self.async_session_maker()
+        self.replica_session_maker = self.async_replica_session_maker()
+
+    def _engine_options(self) -> Dict[str, Any]:
+        """
+        Собирает параметры движка из профиля DBSettings.
+        В режиме PgBouncer (transaction pooling) отключается кэш подготовленных
+        выражений asyncpg и используются уникальные имена prepared statements.
+        """
+        connect_args: Dict[str, Any] = {}
+        if self.settings.DB_PGBOUNCER:
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = (
+                lambda: f"__asyncpg_{uuid4()}__"
+            )
+        return {
+            "echo": self.settings.DB_ECHO,
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": self.settings.DB_POOL_SIZE,
+            "max_overflow": self.settings.DB_MAX_OVERFLOW,
+            "pool_timeout": self.settings.DB_POOL_TIMEOUT,
+            "pool_recycle": self.settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": self.settings.DB_POOL_PRE_PING,
+            "connect_args": connect_args,
+        }
+
+    def _create_async_engine(self, host: str, port: int, metrics: PoolMetrics) -> AsyncEngine:
+        cache_size = 0 if self.settings.DB_PGBOUNCER else self.settings.DB_STATEMENT_CACHE_SIZE
+        link = (
+            f"postgresql+asyncpg://{self.settings.DB_USER}:{self.settings.DB_PASSWORD}"
+            f"@{host}:{port}/{self.settings.DB_NAME}"
+            f"?prepared_statement_cache_size={cache_size}"
+        )
+        engine = create_async_engine(link, **self._engine_options())
+        pool = engine.sync_engine.pool
+        pool.metrics = metrics
+        pool.slow_threshold = self.settings.DB_POOL_SLOW_CHECKOUT_MS / 1000
+        return engine
 
     def init_async_engine(self) -> AsyncEngine:
         """
         Создает асинхронный SQLAlchemy движок для подключения к PostgreSQL с использованием asyncpg.
         :return: Экземпляр AsyncEngine.
         """
-        link = (
-            f"postgresql+asyncpg://{self.settings.DB_USER}:{self.settings.DB_PASSWORD}"
-            f"@{self.settings.DB_HOST}:{self.settings.DB_PORT}/{self.settings.DB_NAME}"
+        return self._create_async_engine(
+            self.settings.DB_HOST, self.settings.DB_PORT, self.metrics
+        )
+
+    def init_replica_engine(self) -> Optional[AsyncEngine]:
+        """
+        Создает движок для реплики только для чтения, если она задана в DBSettings.
+        :return: Экземпляр AsyncEngine или None.
+        """
+        if not self.settings.DB_REPLICA_HOST:
+            return None
+        return self._create_async_engine(
+            self.settings.DB_REPLICA_HOST,
+            self.settings.DB_REPLICA_PORT or self.settings.DB_PORT,
+            self.replica_metrics,
         )
-        return create_async_engine(link, echo=False)
 
     def init_engine(self) -> Engine:
         """
@@ -44,10 +165,50 @@ class DBConnection:
     def async_session_maker(self) -> async_sessionmaker[AsyncSession]:
         """
         Создает фабрику асинхронных сессий для работы с базой данных.
-        :return: Объект sessionmaker для асинхронных сессий.
+        :return: Объект async_sessionmaker для асинхронных сессий.
         """
-        return sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        return async_sessionmaker(self.engine, expire_on_commit=False)
+
+    def async_replica_session_maker(self) -> async_sessionmaker[AsyncSession]:
+        """
+        Создает фабрику сессий для чтения с реплики.
+        Без реплики возвращает фабрику, работающую с основным движком.
+        :return: Объект async_sessionmaker для сессий только для чтения.
+        """
+        if self.replica_engine is None:
+            return self.async_session_maker()
+        return async_sessionmaker(self.replica_engine, expire_on_commit=False)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Возвращает состояние пула соединений и метрики выдачи соединений.
+        :return: Словарь с размерами пула и счётчиками выдачи.
+        """
+        stats = {
+            "pgbouncer": self.settings.DB_PGBOUNCER,
+            "primary": self._pool_stats(self.engine, self.metrics),
+        }
+        if self.replica_engine is not None:
+            stats["replica"] = self._pool_stats(self.replica_engine, self.replica_metrics)
+        return stats
+
+    @staticmethod
+    def _pool_stats(engine: AsyncEngine, metrics: PoolMetrics) -> Dict[str, Any]:
+        pool = engine.sync_engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            **metrics.as_dict(),
+        }
+
+    async def dispose(self) -> None:
+        """Закрывает пулы соединений движков."""
+        await self.engine.dispose()
+        if self.replica_engine is not None:
+            await self.replica_engine.dispose()
 
 
-conn = DBConnection()
-async_session_maker = conn.async_session_maker()
+# Движок создаётся при первом обращении в каждом процессе, а не при импорте
+conn: DBConnection = LazyObject(DBConnection)
@@ -0,0 +1,56 @@
+import time
+from typing import Any, Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+_empty = object()
+
+
+class LazyObject(Generic[T]):
+    """
+    Прокси, создающий объект при первом обращении к его атрибутам.
+    Позволяет держать настройки, подключения и клиенты модульными синглтонами,
+    не создавая их при импорте: каждый процесс (воркер) инициализирует их сам.
+    """
+
+    __slots__ = ("_factory", "_wrapped", "_name")
+
+    def __init__(self, factory: Callable[[], T], name: str = None) -> None:
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_wrapped", _empty)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", "object"))
+
+    def _setup(self) -> T:
+        wrapped = object.__getattribute__(self, "_wrapped")
+        if wrapped is _empty:
+            wrapped = object.__getattribute__(self, "_factory")()
+            object.__setattr__(self, "_wrapped", wrapped)
+        return wrapped
+
+    def _reset(self) -> None:
+        object.__setattr__(self, "_wrapped", _empty)
+
+    @property
+    def _initialized(self) -> bool:
+        return object.__getattribute__(self, "_wrapped") is not _empty
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._setup(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._setup(), name, value)
+
+    def __repr__(self) -> str:
+        if self._initialized:
+            return repr(object.__getattribute__(self, "_wrapped"))
+        return f"<lazy {object.__getattribute__(self, '_name')}>"
+
+
+def initialize(report: Dict[str, float], **objects: LazyObject) -> None:
+    """
+    Создаёт ленивые объекты и записывает время создания каждого в report (мс).
+    """
+    for name, obj in objects.items():
+        start = time.perf_counter()
+        obj._setup()
+        report[name] = (time.perf_counter() - start) * 1000
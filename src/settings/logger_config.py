@@ -1,7 +1,16 @@
 import logging
 import logging.handlers
+import queue
 from pathlib import Path
 
+MAIN_LOGGER_NAME = "uvicorn.error"
+
+# Логгеры, запрошенные через get_logger до настройки логирования процесса
+_deferred_loggers: set[str] = set()
+_configured = False
+# Запись в файлы и консоль идёт в отдельных потоках, чтобы не блокировать event loop
+_listeners: list[logging.handlers.QueueListener] = []
+
 
 def setup_logging_directory():
     """Создает директорию для логов если её нет."""
@@ -24,7 +33,8 @@ def create_file_handler(formatter: logging.Formatter) -> logging.Handler:
         "logs/api_log.log",
         maxBytes=10485760,  # 10MB
         backupCount=5,
-        encoding="utf-8"
+        encoding="utf-8",
+        delay=True,
     )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(formatter)
@@ -37,7 +47,8 @@ def create_error_handler(formatter: logging.Formatter) -> logging.Handler:
         "logs/error.log",
         maxBytes=10485760,  # 10MB
         backupCount=5,
-        encoding="utf-8"
+        encoding="utf-8",
+        delay=True,
     )
     error_handler.setLevel(logging.ERROR)
     error_handler.setFormatter(formatter)
@@ -52,9 +63,33 @@ def create_console_handler(formatter: logging.Formatter) -> logging.Handler:
     return console_handler
 
 
-def setup_main_logger(logger_name: str = "uvicorn.error") -> logging.Logger:
+def create_queue_handler(*handlers: logging.Handler) -> logging.Handler:
+    """
+    Оборачивает обработчики в QueueHandler: логгер только кладёт запись в очередь,
+    а форматирование и запись выполняет поток QueueListener.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+    _listeners.append(listener)
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(logging.DEBUG)
+    return queue_handler
+
+
+def stop_logging() -> None:
+    """Дописывает накопленные записи и останавливает потоки логирования."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def setup_main_logger(logger_name: str = MAIN_LOGGER_NAME) -> logging.Logger:
     """
     Настраивает основной логгер приложения.
+    Вызывается при старте процесса; заодно настраивает логгеры, запрошенные
+    через get_logger до этого момента.
     
     Args:
         logger_name: Имя логгера
@@ -81,9 +116,7 @@ def setup_main_logger(logger_name: str = "uvicorn.error") -> logging.Logger:
     error_handler = create_error_handler(formatter)
     console_handler = create_console_handler(formatter)
 
-    logger.addHandler(file_handler)
-    logger.addHandler(error_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(create_queue_handler(file_handler, error_handler, console_handler))
 
     # Предотвращаем дублирование логов
     logger.propagate = False
@@ -91,39 +124,52 @@ def setup_main_logger(logger_name: str = "uvicorn.error") -> logging.Logger:
     # Отключаем избыточные логи от других библиотек
     logging.getLogger('uvicorn.access').setLevel(logging.WARNING)
     logging.getLogger('httpx').setLevel(logging.WARNING)
-    
+
+    global _configured
+    _configured = True
+    for name in sorted(_deferred_loggers):
+        _configure_logger(logging.getLogger(name))
+    _deferred_loggers.clear()
+
     return logger
 
 
-def get_logger(name: str) -> logging.Logger:
-    """
-    Создает и настраивает логгер с правильными обработчиками и форматированием.
-    
-    Args:
-        name: Имя логгера (обычно __name__ модуля)
-    
-    Returns:
-        Настроенный логгер
-    """
-    logger = logging.getLogger(name)
-    
+def _configure_logger(logger: logging.Logger) -> logging.Logger:
     # Если логгер уже настроен, возвращаем его
     if logger.handlers:
         return logger
-    
+
     logger.setLevel(logging.DEBUG)
-    
+
     # Создаем форматтер с функцией и номером строки
     formatter = create_formatter()
-    
+
     # Обработчик для записи в файл
     file_handler = create_file_handler(formatter)
-    
+
     # Обработчик для консоли
     console_handler = create_console_handler(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+
+    logger.addHandler(create_queue_handler(file_handler, console_handler))
     logger.propagate = False
-    
+
     return logger
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Создает и настраивает логгер с правильными обработчиками и форматированием.
+    До вызова setup_main_logger обработчики не создаются: логгер настраивается
+    при старте процесса, чтобы импорт модулей не открывал файлы логов.
+    
+    Args:
+        name: Имя логгера (обычно __name__ модуля)
+    
+    Returns:
+        Настроенный логгер
+    """
+    logger = logging.getLogger(name)
+    if not _configured:
+        _deferred_loggers.add(name)
+        return logger
+    return _configure_logger(logger)
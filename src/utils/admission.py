@@ -0,0 +1,117 @@
+import asyncio
+import traceback
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from src.settings.conf import appsettings, log, rmqsetting
+from src.settings.lazy import LazyObject
+from src.utils.lifecycle import InflightTracker
+from src.utils.loop_monitor import loop_monitor
+from src.utils.rmq.RabbitModel import chat_shard_queue, get_rmq_instance
+
+
+class AdmissionController:
+    """
+    Следит за нагрузкой воркера: задержкой event loop (её меряет loop_monitor),
+    числом запросов в обработке и глубиной очередей RabbitMQ. При превышении порогов второстепенные запросы
+    (история, шаблоны, номера) отклоняются с 503 и Retry-After, а фоновые задачи
+    откладывают работу. Приём webhook-ов не ограничивается.
+    """
+
+    def __init__(self) -> None:
+        self.max_loop_lag_ms = appsettings.ADMISSION_MAX_LOOP_LAG_MS
+        self.max_inflight = appsettings.ADMISSION_MAX_INFLIGHT
+        self.max_queue_depth = appsettings.ADMISSION_MAX_QUEUE_DEPTH
+        self.queues = [
+            *appsettings.ADMISSION_QUEUES,
+            *(chat_shard_queue(index) for index in range(rmqsetting.RABBITMQ_CHAT_PARTITIONS)),
+        ]
+        self.queue_poll_interval = appsettings.ADMISSION_QUEUE_POLL_INTERVAL
+        self.retry_after = appsettings.ADMISSION_RETRY_AFTER
+
+        self.requests = InflightTracker()
+        self.queue_depth: Dict[str, int] = {}
+        self.rejected = 0
+        self._channel = None
+
+    @property
+    def loop_lag_ms(self) -> float:
+        return loop_monitor.lag_ms
+
+    @property
+    def overload_reason(self) -> Optional[str]:
+        """Причина перегрузки или None, если воркер справляется."""
+        if self.loop_lag_ms > self.max_loop_lag_ms:
+            return f"event loop lag {self.loop_lag_ms:.0f}ms"
+        if self.requests.count > self.max_inflight:
+            return f"in-flight requests {self.requests.count}"
+        depth = sum(self.queue_depth.values())
+        if depth > self.max_queue_depth:
+            return f"queue depth {depth}"
+        return None
+
+    @property
+    def overloaded(self) -> bool:
+        return self.overload_reason is not None
+
+    def check(self) -> None:
+        """
+        Отклоняет второстепенный запрос при перегрузке.
+        :raises HTTPException 503: с заголовком Retry-After.
+        """
+        reason = self.overload_reason
+        if reason is None:
+            return
+        self.rejected += 1
+        log.warning(f"[ADMISSION] Запрос отклонён: {reason}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Сервис перегружен ({reason}), повторите позже",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def _poll_queues(self) -> None:
+        """Читает число сообщений в очередях через пассивное объявление."""
+        rmq = get_rmq_instance()
+        if rmq.connection is None or rmq.connection.is_closed:
+            return
+        # Отдельный канал: ошибка пассивного объявления закрывает канал
+        if self._channel is None or self._channel.is_closed:
+            self._channel = await rmq.connection.channel()
+        for name in self.queues:
+            try:
+                queue = await self._channel.declare_queue(name, passive=True)
+                self.queue_depth[name] = queue.declaration_result.message_count
+            except Exception:
+                self.queue_depth.pop(name, None)
+                self._channel = await rmq.connection.channel()
+
+    async def run_forever(self) -> None:
+        """Фоновая задача: опрашивает глубину очередей (задержку loop меряет loop_monitor)."""
+        while True:
+            try:
+                await self._poll_queues()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[ADMISSION] Ошибка опроса очередей: {traceback.format_exc()}")
+            await asyncio.sleep(self.queue_poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "overloaded": self.overloaded,
+            "reason": self.overload_reason,
+            "loop_lag_ms": round(self.loop_lag_ms, 1),
+            "inflight_requests": self.requests.count,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+        }
+
+
+admission: AdmissionController = LazyObject(AdmissionController)
+
+
+async def shed_load() -> None:
+    """Зависимость FastAPI для второстепенных эндпоинтов: 503 при перегрузке."""
+    admission.check()
@@ -4,18 +4,17 @@ import json
 import uuid
 from datetime import datetime
 from email.utils import format_datetime
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import httpx
 
 from src.database.DAO.crud import DealsDAO, MessagesDAO, TemplatesDAO
 from src.settings.conf import amosettings, chatsettings, log
-from src.utils.meta.utils_message import MetaClient
-from src.utils.redis_conn import redis_client
+from src.utils.meta.operators import operator_registry
+from src.utils.redis_conn import chat_field, redis_client
 
 deals = DealsDAO()
 templatesDAO = TemplatesDAO()
-metaservice = MetaClient()
 
 
 async def get_client_phone(phone_client: str):
@@ -24,8 +23,23 @@ async def get_client_phone(phone_client: str):
     return phone_client
 
 
+async def get_operator_phone(chat_id: str | None, phone_client: str) -> Optional[str]:
+    """
+    Определяет номер оператора, на который писал клиент.
+    conversation_id чата имеет вид whatsapp:{client}:{operator}; если формат другой —
+    берём текущего оператора клиента из Redis.
+    """
+    if chat_id and chat_id.startswith("whatsapp:"):
+        parts = chat_id.split(":")
+        if len(parts) == 3 and parts[2]:
+            return parts[2]
+    return await redis_client.get_operator(phone_client)
+
+
 async def send_message(temp_id: str | None, chat_id: str, text: str, phone_client: str):
     log.info(f"[AMO→Client] Менеджер написал в чат {chat_id}: {text}")
+    operator_phone = await get_operator_phone(chat_id, phone_client)
+    metaservice = operator_registry.get_client(operator_phone)
     phone_client = await get_client_phone(phone_client)
     if temp_id is None:
         await metaservice.send_message(phone_client, text)
@@ -126,17 +140,39 @@ class AmoCRMClient:
 
     def __init__(self):
         """
-        Инициализация клиента AmoCRM с основными настройками.
+        Инициализация клиента AmoCRM.
+        Токены и идентификаторы читаются из настроек при первом запросе.
         """
-        self.access_token = amosettings.TOKEN
-        self.base_url = amosettings.BASE_URL
-        self.secret = chatsettings.AMO_CHATS_SECRET
-        self.channel_id = chatsettings.AMO_CHATS_CHANNEL_ID
-        self.account_id = chatsettings.AMO_CHATS_ACCOUNT_ID
-        self.scope_id = f"{self.channel_id}_{self.account_id}"
         self.chat_base_url = "https://amojo.amocrm.ru"
         self.real_conversation_id: Optional[str] = None
-        self.headers = {
+
+    @property
+    def access_token(self) -> str:
+        return amosettings.TOKEN
+
+    @property
+    def base_url(self) -> str:
+        return amosettings.BASE_URL
+
+    @property
+    def secret(self) -> str:
+        return chatsettings.AMO_CHATS_SECRET
+
+    @property
+    def channel_id(self) -> str:
+        return chatsettings.AMO_CHATS_CHANNEL_ID
+
+    @property
+    def account_id(self) -> str:
+        return chatsettings.AMO_CHATS_ACCOUNT_ID
+
+    @property
+    def scope_id(self) -> str:
+        return f"{self.channel_id}_{self.account_id}"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
             "Authorization": f"Bearer {self.access_token}",
             "Content-Type": "application/json",
         }
@@ -247,11 +283,11 @@ class AmoCRMClient:
             return data.json()[0]["id"]
         return None
 
-    async def get_contact_phone_by_lead(self, lead_id: int) -> Optional[str]:
+    async def get_lead_contact(self, lead_id: int) -> Optional[Tuple[int, str]]:
         """
-        Получение данных по лиду
+        Контакт лида и его телефон (два запроса в amoCRM: лид с контактами, затем контакт).
         :param lead_id: id существующего лида
-        :return: в случае успешного запроса возвращает даннные по лиду
+        :return: (id контакта, телефон) или None, если контакт или телефон не найден
         """
         lead_url = f"{self.base_url}/api/v4/leads/{lead_id}?with=contacts"
         lead_status, lead_data = await AmoCRMClient._request(
@@ -276,9 +312,18 @@ class AmoCRMClient:
                 if f.get("field_code") == "PHONE":
                     values = f.get("values", [])
                     if values:
-                        return values[0].get("value")
+                        return contact_id, values[0].get("value")
         return None
 
+    async def get_contact_phone_by_lead(self, lead_id: int) -> Optional[str]:
+        """
+        Получение телефона контакта лида
+        :param lead_id: id существующего лида
+        :return: в случае успешного запроса возвращает телефон контакта
+        """
+        contact = await self.get_lead_contact(lead_id)
+        return contact[1] if contact else None
+
     async def create_chat(self, user_phone: str, operator_phone: str) -> Optional[str]:
         """
         Создаёт чат между пользователем и оператором в AmoCRM.
@@ -364,32 +409,29 @@ class AmoCRMClient:
             #     return
 
             msg_id = f"client_{phone}_{timestamp}"
-            redis_msg_key = f"msg_sent:{msg_id}"
+            conversation = await redis_client.get_conversation(phone)
 
             # Защита от повторной обработки одного и того же сообщения
-            if await redis_client.get(redis_msg_key):
+            if not await redis_client.mark_inbound(phone, timestamp, conversation):
                 log.warning(
                     f"[AmoCRM] Повторное сообщение msg_id={msg_id}, обработка прервана."
                 )
                 return
-            await redis_client.set(redis_msg_key, "1", ex=300)
 
             chat_id = await self.create_chat(phone, operator_phone)
             if not chat_id:
                 log.error("[AmoCRM] Не удалось создать чат, пропускаем сделку.")
                 return
 
-            key = f"client_operator:{phone}"
-            stored_operator = await redis_client.get(key)
-            if isinstance(stored_operator, bytes):
-                stored_operator = stored_operator.decode()
+            stored_operator = conversation.get("operator")
 
             if stored_operator != operator_phone:
-                await redis_client.set_chat_id(phone, operator_phone, chat_id)
-                await redis_client.set(key, operator_phone)
+                await redis_client.update_conversation(
+                    phone, {"operator": operator_phone, chat_field(operator_phone): chat_id}
+                )
                 self.real_conversation_id = chat_id
             else:
-                chat_id = await redis_client.get_chat_id(phone, operator_phone)
+                chat_id = conversation.get(chat_field(operator_phone))
                 if chat_id:
                     self.real_conversation_id = chat_id
                 else:
@@ -398,8 +440,9 @@ class AmoCRMClient:
                     if not chat_id:
                         log.error("[AmoCRM] Повторное создание чата не удалось")
                         return
-                    await redis_client.set_chat_id(phone, operator_phone, chat_id)
-                    await redis_client.set(key, operator_phone)
+                    await redis_client.update_conversation(
+                        phone, {"operator": operator_phone, chat_field(operator_phone): chat_id}
+                    )
                     self.real_conversation_id = chat_id
 
             if not self.real_conversation_id:
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+import traceback
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import zstandard
+from sqlalchemy import text
+
+from src.database.DAO.crud import MessagesDAO
+from src.settings.conf import dbsettings, log
+from src.settings.engine import conn
+from src.settings.lazy import LazyObject
+from src.utils.admission import admission
+
+ARCHIVE_SUFFIX = ".jsonl.zst"
+# Рядом с каждым файлом архива: по строке на zstd-фрейм {"offset", "length", "deals"}
+INDEX_SUFFIX = ".idx.jsonl"
+# Ключ advisory-lock: при нескольких воркерах архивацию выполняет только один
+ARCHIVE_LOCK_KEY = 728402
+
+
+def _month_key(value: datetime) -> str:
+    return f"{value.year:04d}-{value.month:02d}"
+
+
+def _iter_months(date_from: date, date_to: date) -> Iterable[str]:
+    year, month = date_from.year, date_from.month
+    while (year, month) <= (date_to.year, date_to.month):
+        yield f"{year:04d}-{month:02d}"
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+class MessagesArchiver:
+    """
+    Выгружает сообщения старше ARCHIVE_AFTER_DAYS из Postgres в сжатые zstd JSONL-файлы
+    {ARCHIVE_DIR}/operator={phone}/month={YYYY-MM}/*.jsonl.zst и удаляет выгруженные строки.
+    Каждая пачка пишется отдельным zstd-фреймом и сбрасывается на диск до удаления
+    строк из БД, поэтому прерванный запуск ничего не теряет. Для каждого фрейма в индекс
+    рядом с файлом пишутся смещение и сделки, и чтение истории сделки распаковывает
+    только её фреймы. Строки читаются из primary
+    и удаляются, только если их статус не изменился после выгрузки; повторно выгруженное
+    сообщение при чтении архива берётся из самой поздней записи.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        after_days: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        messages_dao: MessagesDAO = MessagesDAO(),
+    ) -> None:
+        self.root = Path(root or dbsettings.ARCHIVE_DIR)
+        self.after_days = dbsettings.ARCHIVE_AFTER_DAYS if after_days is None else after_days
+        self.batch_size = batch_size or dbsettings.ARCHIVE_BATCH_SIZE
+        self._dao = messages_dao
+
+    @property
+    def enabled(self) -> bool:
+        return self.after_days > 0
+
+    def cutoff(self) -> datetime:
+        """Граница, старше которой сообщения лежат в архиве."""
+        return datetime.now() - timedelta(days=self.after_days)
+
+    def _partition_dir(self, operator_phone: str, month: str) -> Path:
+        return self.root / f"operator={operator_phone}" / f"month={month}"
+
+    @staticmethod
+    def _row_to_record(row: Any) -> Dict[str, Any]:
+        status = row.status.value if hasattr(row.status, "value") else row.status
+        return {
+            "id": row.id,
+            "sender": row.sender,
+            "text": row.text,
+            "media": row.media,
+            "timestamp": row.timestamp.isoformat(),
+            "status": status,
+            "template_id": row.template_id,
+            "deals_id": str(row.deals_id),
+            "client_phone": row.client_phone,
+            "operator_phone": row.operator_phone,
+        }
+
+    def _write_batch(self, run_id: str, rows: Sequence[Any]) -> None:
+        """Дописывает пачку строк в файлы архива (выполняется в потоке)."""
+        groups: Dict[Tuple[str, str], List[bytes]] = defaultdict(list)
+        deals: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        for row in rows:
+            record = self._row_to_record(row)
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+            group = (row.operator_phone, _month_key(row.timestamp))
+            groups[group].append(line.encode() + b"\n")
+            deals[group].add(record["deals_id"])
+
+        compressor = zstandard.ZstdCompressor(level=10)
+        for (operator_phone, month), lines in groups.items():
+            directory = self._partition_dir(operator_phone, month)
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"messages-{run_id}{ARCHIVE_SUFFIX}"
+            frame = compressor.compress(b"".join(lines))
+            with open(path, "ab") as file:
+                offset = file.tell()
+                file.write(frame)
+                file.flush()
+                os.fsync(file.fileno())
+            # Индекс пишется после данных: фрейм без строки индекса читается целиком
+            entry = {
+                "offset": offset,
+                "length": len(frame),
+                "deals": sorted(deals[(operator_phone, month)]),
+            }
+            with open(directory / f"messages-{run_id}{INDEX_SUFFIX}", "a") as index:
+                index.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    async def run_once(self) -> int:
+        """
+        Архивирует все сообщения старше окна.
+        :return: количество архивированных сообщений.
+        """
+        if not self.enabled:
+            return 0
+        cutoff = self.cutoff()
+        run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}"
+        archived = 0
+        async with conn.engine.connect() as lock_connection:
+            locked = await lock_connection.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}
+            )
+            if not locked:
+                log.info("[ARCHIVE] Архивация уже выполняется другим воркером")
+                return 0
+            try:
+                async for rows in self._dao.stream_older_than(cutoff, self.batch_size):
+                    await asyncio.to_thread(self._write_batch, run_id, rows)
+                    archived += await self._dao.delete_archived(
+                        [(row.id, row.timestamp, row.status) for row in rows]
+                    )
+            finally:
+                await lock_connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": ARCHIVE_LOCK_KEY}
+                )
+        if archived:
+            log.info(f"[ARCHIVE] Архивировано сообщений старше {cutoff}: {archived}")
+        return archived
+
+    async def run_forever(self, interval: Optional[int] = None) -> None:
+        """Фоновая задача архивации."""
+        interval = interval or dbsettings.ARCHIVE_INTERVAL
+        while True:
+            while admission.overloaded:
+                log.info(f"[ARCHIVE] Архивация отложена: {admission.overload_reason}")
+                await asyncio.sleep(admission.retry_after)
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[ARCHIVE] Ошибка архивации: {traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+    @staticmethod
+    def _deal_lines(path: Path, deal_id: str) -> Iterable[bytes]:
+        """
+        Строки сделки из файла архива. Фреймы без сделки по индексу пропускаются;
+        хвост файла, не покрытый индексом (старые файлы, прерванная запись),
+        распаковывается целиком.
+        """
+        frames: List[Tuple[int, int]] = []
+        covered = 0
+        index_path = path.with_name(path.name[: -len(ARCHIVE_SUFFIX)] + INDEX_SUFFIX)
+        if index_path.is_file():
+            with open(index_path) as index:
+                for raw in index:
+                    try:
+                        entry = json.loads(raw)
+                    except ValueError:
+                        break
+                    if entry["offset"] != covered:
+                        break
+                    if deal_id in entry["deals"]:
+                        frames.append((entry["offset"], entry["length"]))
+                    covered = entry["offset"] + entry["length"]
+
+        decompressor = zstandard.ZstdDecompressor()
+        marker = f'"deals_id":"{deal_id}"'.encode()
+        with open(path, "rb") as file:
+            chunks = []
+            for offset, length in frames:
+                file.seek(offset)
+                chunks.append(decompressor.decompress(file.read(length)))
+            if covered < os.fstat(file.fileno()).st_size:
+                file.seek(covered)
+                reader = decompressor.stream_reader(file, read_across_frames=True)
+                chunks.append(reader.read())
+        for chunk in chunks:
+            for line in chunk.splitlines():
+                if marker in line:
+                    yield line
+
+    def _read(
+        self, operator_phone: str, deal_id: str, date_from: datetime, date_to: datetime
+    ) -> List[Dict[str, Any]]:
+        records: Dict[str, Dict[str, Any]] = {}
+        for month in _iter_months(date_from.date(), date_to.date()):
+            directory = self._partition_dir(operator_phone, month)
+            if not directory.is_dir():
+                continue
+            for path in sorted(directory.glob(f"*{ARCHIVE_SUFFIX}")):
+                for line in self._deal_lines(path, deal_id):
+                    record = json.loads(line)
+                    if record["deals_id"] != deal_id:
+                        continue
+                    timestamp = datetime.fromisoformat(record["timestamp"])
+                    if date_from <= timestamp <= date_to:
+                        record["timestamp"] = timestamp
+                        # Файлы идут по времени запуска: более поздняя выгрузка
+                        # сообщения (с новым статусом) заменяет раннюю
+                        records[record["id"]] = record
+        return sorted(records.values(), key=lambda item: item["timestamp"])
+
+    async def read(
+        self,
+        operator_phone: str,
+        deal_id: str,
+        date_from: datetime,
+        date_to: Optional[datetime] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Читает архивные сообщения сделки за период (файлы разбираются в потоке).
+        :return: список сообщений в формате истории, по возрастанию времени.
+        """
+        if not self.enabled:
+            return []
+        date_to = min(date_to or datetime.now(), self.cutoff())
+        if date_from > date_to:
+            return []
+        return await asyncio.to_thread(
+            self._read, operator_phone, str(deal_id), date_from, date_to
+        )
+
+
+archiver: MessagesArchiver = LazyObject(MessagesArchiver)
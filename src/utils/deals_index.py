@@ -0,0 +1,153 @@
+import asyncio
+import sys
+import time
+import traceback
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+import asyncpg
+
+from src.database.DAO.crud import DEALS_CHANNEL, DealsDAO
+from src.settings.conf import dbsettings, log
+from src.settings.lazy import LazyObject
+
+
+class DealsIndex:
+    """
+    Индекс (клиент, оператор) → id сделки в памяти воркера.
+    Хранится компактно: словарь оператор → {клиент: 16 байт UUID}, номера
+    интернируются (номер оператора — одна строка на весь индекс).
+    Пара (клиент, оператор) у сделки не меняется и сделки не удаляются, поэтому
+    индекс не может устареть — только не знать о новой сделке; такой промах
+    DealsDAO.find_id дочитывает из БД. Новые сделки других воркеров и реплик
+    приходят через LISTEN/NOTIFY.
+    """
+
+    def __init__(self, deals_dao: DealsDAO = DealsDAO()) -> None:
+        self._dao = deals_dao
+        self._by_operator: Dict[str, Dict[str, bytes]] = {}
+        self._phones: Dict[str, str] = {}
+        self._phone_bytes = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.notifications = 0
+        self.loaded_at: Optional[float] = None
+
+    def _intern(self, phone: str) -> str:
+        interned = self._phones.get(phone)
+        if interned is None:
+            interned = self._phones[phone] = sys.intern(phone)
+            self._phone_bytes += sys.getsizeof(interned)
+        return interned
+
+    def put(self, client_phone: str, operator_phone: str, deal_id: Any) -> None:
+        if not isinstance(deal_id, UUID):
+            deal_id = UUID(str(deal_id))
+        clients = self._by_operator.get(operator_phone)
+        if clients is None:
+            clients = self._by_operator[self._intern(operator_phone)] = {}
+        client_phone = self._intern(client_phone)
+        if client_phone not in clients:
+            self.size += 1
+        clients[client_phone] = deal_id.bytes
+
+    def get(self, client_phone: str, operator_phone: str) -> Optional[UUID]:
+        clients = self._by_operator.get(operator_phone)
+        raw = clients.get(client_phone) if clients is not None else None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return UUID(bytes=raw)
+
+    async def load(self, batch_size: Optional[int] = None) -> int:
+        """
+        Потоково загружает все сделки и подключает индекс к DealsDAO.
+        :return: количество сделок в индексе.
+        """
+        batch_size = batch_size or dbsettings.DEALS_INDEX_BATCH_SIZE
+        started = time.perf_counter()
+        async for rows in self._dao.stream_keys(batch_size):
+            for deal_id, client_phone, operator_phone in rows:
+                self.put(client_phone, operator_phone, deal_id)
+            await asyncio.sleep(0)
+        self.loaded_at = time.time()
+        DealsDAO.index = self
+        log.info(
+            f"[DB] Индекс сделок: {self.size} за {(time.perf_counter() - started) * 1000:.0f} мс, "
+            f"{self.memory_bytes() / 1024 / 1024:.1f} МБ"
+        )
+        return self.size
+
+    def _on_notify(self, connection: Any, pid: int, channel: str, payload: str) -> None:
+        try:
+            deal_id, client_phone, operator_phone = payload.split(":", 2)
+            self.put(client_phone, operator_phone, deal_id)
+            self.notifications += 1
+        except ValueError:
+            log.warning(f"[DB] Некорректное уведомление {channel}: {payload}")
+
+    async def listen_forever(self) -> None:
+        """
+        Держит отдельное соединение asyncpg (мимо пула SQLAlchemy) с LISTEN на канал
+        новых сделок. После разрыва индекс дозагружается, чтобы не пропустить сделки.
+        За PgBouncer в режиме transaction LISTEN не работает — подписка не запускается,
+        новые сделки других воркеров дочитываются из БД при промахе индекса.
+        """
+        if dbsettings.DB_PGBOUNCER:
+            log.warning("[DB] DB_PGBOUNCER: подписка на новые сделки через LISTEN отключена")
+            return
+        while True:
+            lost = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(
+                    host=dbsettings.DB_HOST,
+                    port=dbsettings.DB_PORT,
+                    user=dbsettings.DB_USER,
+                    password=dbsettings.DB_PASSWORD,
+                    database=dbsettings.DB_NAME,
+                )
+                try:
+                    connection.add_termination_listener(lambda _: lost.set())
+                    await connection.add_listener(DEALS_CHANNEL, self._on_notify)
+                    await lost.wait()
+                finally:
+                    await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[DB] Подписка на новые сделки прервана: {traceback.format_exc()}")
+            log.warning("[DB] Соединение LISTEN потеряно, индекс сделок дозагружается")
+            await asyncio.sleep(1)
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[DB] Ошибка загрузки индекса сделок: {traceback.format_exc()}")
+
+    def memory_bytes(self) -> int:
+        """Оценка памяти индекса: словари, ключи-номера и значения UUID."""
+        total = sys.getsizeof(self._by_operator) + sys.getsizeof(self._phones) + self._phone_bytes
+        for clients in self._by_operator.values():
+            total += sys.getsizeof(clients)
+        return total + self.size * sys.getsizeof(b"\x00" * 16)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": DealsDAO.index is self,
+            "deals": self.size,
+            "operators": len(self._by_operator),
+            "phones": len(self._phones),
+            "memory_mb": round(self.memory_bytes() / 1024 / 1024, 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "notifications": self.notifications,
+            "loaded_at": self.loaded_at,
+        }
+
+
+deals_index: DealsIndex = LazyObject(DealsIndex)
@@ -0,0 +1,202 @@
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+import zstandard
+from fastapi import Request
+
+from src.settings.conf import appsettings, log
+from src.settings.lazy import LazyObject
+
+JOURNAL_SUFFIX = ".jrnl.zst"
+# Заголовок записи: время приёма, длина метаданных, длина тела
+RECORD_HEADER = struct.Struct("<dHI")
+REPLAY_HEADER = "X-Journal-Replay"
+# Заголовки, которые нужны обработчикам при повторной подаче
+JOURNAL_HEADERS = ("content-type", "x-signature", "x-hub-signature-256")
+_STOP = object()
+
+
+@dataclass
+class JournalRecord:
+    received_at: float
+    source: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+    def encode(self) -> bytes:
+        meta = json.dumps(
+            {"source": self.source, "path": self.path, "headers": self.headers},
+            separators=(",", ":"),
+        ).encode()
+        return RECORD_HEADER.pack(self.received_at, len(meta), len(self.body)) + meta + self.body
+
+
+class WebhookJournal:
+    """
+    Журнал сырых тел входящих webhook-ов: append-only сегменты
+    {JOURNAL_DIR}/{YYYY-MM-DD}/webhooks-{время}-{pid}.jrnl.zst.
+    Запросы только кладут запись в очередь; сжатие и запись на диск выполняет
+    отдельный поток, каждая пачка — отдельный zstd-фрейм. Сегмент закрывается
+    по размеру или возрасту; у каждого воркера свои сегменты.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = appsettings.JOURNAL_ENABLED
+        self.root = Path(appsettings.JOURNAL_DIR)
+        self.segment_bytes = appsettings.JOURNAL_SEGMENT_BYTES
+        self.segment_seconds = appsettings.JOURNAL_SEGMENT_SECONDS
+        self.flush_interval = appsettings.JOURNAL_FLUSH_INTERVAL
+        self._queue: queue.Queue = queue.Queue(maxsize=appsettings.JOURNAL_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[BinaryIO] = None
+        self._opened_at = 0.0
+        self.written = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="webhook-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, source: str, path: str, headers: Dict[str, str], body: bytes) -> None:
+        """Ставит тело запроса в очередь записи; при переполненной очереди запись теряется."""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait(JournalRecord(time.time(), source, path, headers, body))
+        except queue.Full:
+            self.dropped += 1
+
+    async def record_request(self, source: str, request: Request) -> None:
+        """Журналирует входящий запрос (кроме повторной подачи из журнала)."""
+        if self._thread is None or REPLAY_HEADER in request.headers:
+            return
+        headers = {
+            name: request.headers[name] for name in JOURNAL_HEADERS if name in request.headers
+        }
+        self.record(source, request.url.path, headers, await request.body())
+
+    def _open_segment(self) -> None:
+        now = datetime.now()
+        directory = self.root / f"{now:%Y-%m-%d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"webhooks-{now:%H%M%S}-{os.getpid()}{JOURNAL_SUFFIX}"
+        self._file = open(path, "ab")
+        self._opened_at = time.monotonic()
+
+    def _close_segment(self) -> None:
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+
+    def _write(self, batch: List[JournalRecord], compressor: zstandard.ZstdCompressor) -> None:
+        if self._file is not None and (
+            self._file.tell() >= self.segment_bytes
+            or time.monotonic() - self._opened_at >= self.segment_seconds
+        ):
+            self._close_segment()
+        if self._file is None:
+            self._open_segment()
+        self._file.write(compressor.compress(b"".join(record.encode() for record in batch)))
+        self._file.flush()
+        self.written += len(batch)
+
+    def _run(self) -> None:
+        compressor = zstandard.ZstdCompressor(level=3)
+        stopping = False
+        while not stopping:
+            batch: List[JournalRecord] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= 1000:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            if not batch:
+                continue
+            try:
+                self._write(batch, compressor)
+            except Exception:
+                log.error(f"[JOURNAL] Ошибка записи журнала: {traceback.format_exc()}")
+        self._close_segment()
+
+    def stop(self) -> None:
+        """Дописывает очередь на диск и закрывает сегмент."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+
+def _read_exact(reader: BinaryIO, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = reader.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def iter_segment(path: Path) -> Iterator[JournalRecord]:
+    """
+    Читает записи одного сегмента. Файл отображается в память (mmap) и распаковывается
+    потоково; оборванный последний фрейм (падение процесса) пропускается.
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, (
+            zstandard.ZstdDecompressor().stream_reader(mapped, read_across_frames=True)
+        ) as reader:
+            try:
+                while True:
+                    header = _read_exact(reader, RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        return
+                    received_at, meta_len, body_len = RECORD_HEADER.unpack(header)
+                    meta = _read_exact(reader, meta_len)
+                    body = _read_exact(reader, body_len)
+                    if len(meta) < meta_len or len(body) < body_len:
+                        return
+                    meta = json.loads(meta)
+                    yield JournalRecord(
+                        received_at, meta["source"], meta["path"], meta["headers"], body
+                    )
+            except zstandard.ZstdError:
+                log.warning(f"[JOURNAL] Сегмент {path} оборван, остаток пропущен")
+
+
+def list_segments(root: Path) -> List[Path]:
+    return sorted(root.glob(f"*/*{JOURNAL_SUFFIX}"))
+
+
+def iter_journal(paths: Iterable[Path]) -> Iterator[JournalRecord]:
+    for path in paths:
+        yield from iter_segment(path)
+
+
+webhook_journal: WebhookJournal = LazyObject(WebhookJournal)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from src.settings.conf import log
+
+
+class InflightTracker:
+    """
+    Считает обрабатываемые сейчас единицы работы (сообщения очереди и т.п.)
+    и позволяет дождаться, пока их не останется.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def __aenter__(self) -> None:
+        self.count += 1
+        self._idle.clear()
+
+    async def __aexit__(self, *exc) -> None:
+        self.count -= 1
+        if self.count == 0:
+            self._idle.set()
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """
+        Ждёт завершения текущей работы.
+        :return: False, если за timeout работа не завершилась.
+        """
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class WorkerLifecycle:
+    """
+    Фоновые задачи воркера и порядок его остановки.
+    Задачи с функцией stop останавливаются мягко (доделывают текущую пачку),
+    остальные отменяются сразу. Все ожидания при остановке укладываются
+    в общий бюджет времени SHUTDOWN_TIMEOUT.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[str, Tuple[asyncio.Task, Optional[Callable[[], None]]]] = {}
+        self._deadline: Optional[float] = None
+
+    @property
+    def draining(self) -> bool:
+        return self._deadline is not None
+
+    def spawn(
+        self,
+        name: str,
+        coro: Awaitable[None],
+        stop: Optional[Callable[[], None]] = None,
+    ) -> asyncio.Task:
+        """
+        Запускает фоновую задачу воркера.
+        :param stop: функция мягкой остановки; без неё задача при остановке отменяется.
+        """
+        task = asyncio.create_task(coro, name=name)
+        self._tasks[name] = (task, stop)
+        return task
+
+    def begin_shutdown(self, timeout: float) -> None:
+        self._deadline = time.monotonic() + timeout
+        log.info(f"[LIFECYCLE] Остановка воркера, ожидание текущей работы до {timeout:.0f} с")
+
+    def remaining(self) -> float:
+        """Сколько секунд осталось от бюджета остановки."""
+        if self._deadline is None:
+            return 0.0
+        return max(0.0, self._deadline - time.monotonic())
+
+    async def stop_tasks(self) -> None:
+        """Мягко останавливает задачи со stop, отменяет остальные и дожидается всех."""
+        graceful = []
+        for name, (task, stop) in self._tasks.items():
+            if stop is None:
+                task.cancel()
+            else:
+                stop()
+                graceful.append(task)
+
+        if graceful:
+            _, pending = await asyncio.wait(graceful, timeout=self.remaining())
+            for task in pending:
+                log.warning(f"[LIFECYCLE] Задача {task.get_name()} не завершилась вовремя, отмена")
+                task.cancel()
+
+        await asyncio.gather(
+            *(task for task, _ in self._tasks.values()), return_exceptions=True
+        )
+        self._tasks.clear()
+
+
+lifecycle = WorkerLifecycle()
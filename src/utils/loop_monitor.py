@@ -0,0 +1,104 @@
+import asyncio
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from src.settings.conf import appsettings, log
+from src.settings.lazy import LazyObject
+
+
+class LoopMonitor:
+    """
+    Замеряет задержку event loop и ловит блокирующие вызовы.
+    Корутина-пульс просыпается каждые tick секунд и считает опоздание;
+    сторожевой поток проверяет пульс и, если loop не отвечает дольше SLOW_CALLBACK_MS,
+    снимает стек потока loop — это и есть код, который его блокирует.
+    """
+
+    def __init__(self) -> None:
+        self.slow_ms = appsettings.SLOW_CALLBACK_MS
+        self.tick = appsettings.LOOP_LAG_TICK_MS / 1000
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self._samples: Deque[float] = deque(maxlen=appsettings.LOOP_LAG_WINDOW)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=appsettings.SLOW_CALLBACK_HISTORY)
+        self._heartbeat = time.monotonic()
+        self._pending: Optional[Dict[str, Any]] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+
+    def _watchdog(self) -> None:
+        """Сторожевой поток: снимает стек loop, пока тот заблокирован."""
+        threshold = self.slow_ms / 1000
+        while not self._stop.wait(self.tick):
+            heartbeat = self._heartbeat
+            if time.monotonic() - heartbeat < threshold or self._pending is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._pending = {
+                "at": datetime.now().isoformat(timespec="milliseconds"),
+                "heartbeat": heartbeat,
+                "duration_ms": None,
+                "stack": traceback.format_stack(frame),
+            }
+
+    def _record_lag(self, lag_ms: float, heartbeat: float) -> None:
+        self._samples.append(lag_ms)
+        self.lag_ms = lag_ms * 0.3 + self.lag_ms * 0.7
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+
+        stall, self._pending = self._pending, None
+        # Стек, снятый после того как loop уже проснулся, относится не к этой задержке
+        if stall is not None and stall.pop("heartbeat") != heartbeat:
+            stall = None
+        if stall is None:
+            if lag_ms >= self.slow_ms:
+                log.warning(f"[LOOP] Event loop заблокирован на {lag_ms:.0f}ms (стек не снят)")
+            return
+        stall["duration_ms"] = round(lag_ms, 1)
+        self.stalls.append(stall)
+        log.warning(
+            f"[LOOP] Event loop заблокирован на {lag_ms:.0f}ms, стек:\n"
+            + "".join(stall["stack"])
+        )
+
+    async def run_forever(self) -> None:
+        """Фоновая задача: пульс event loop и запуск сторожевого потока."""
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                started = time.perf_counter()
+                await asyncio.sleep(self.tick)
+                lag_ms = max(0.0, (time.perf_counter() - started - self.tick) * 1000)
+                heartbeat, self._heartbeat = self._heartbeat, time.monotonic()
+                self._record_lag(lag_ms, heartbeat)
+        finally:
+            self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        samples: List[float] = sorted(self._samples)
+        percentiles = (
+            statistics.quantiles(samples, n=100) if len(samples) >= 2 else [0.0] * 99
+        )
+        return {
+            "lag_ms": round(self.lag_ms, 1),
+            "lag_p50_ms": round(percentiles[49], 1),
+            "lag_p99_ms": round(percentiles[98], 1),
+            "lag_max_ms": round(self.max_lag_ms, 1),
+            "slow_callback_ms": self.slow_ms,
+            "stalls": list(self.stalls),
+        }
+
+
+loop_monitor: LoopMonitor = LazyObject(LoopMonitor)
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from src.database.DAO.crud import BroadcastDAO
+from src.database.models.Models import BroadcastJob, RecipientStatusEnum
+from src.settings.conf import log, metasettings
+from src.settings.lazy import LazyObject
+from src.utils.admission import admission
+from src.utils.meta.operators import operator_registry
+from src.utils.ratelimit import RateLimiter
+
+# Лимит уникальных получателей за 24 часа по tier номера; None — без ограничений
+TIER_LIMITS: Dict[str, Optional[int]] = {
+    "TIER_50": 50,
+    "TIER_250": 250,
+    "TIER_1K": 1_000,
+    "TIER_10K": 10_000,
+    "TIER_100K": 100_000,
+    "TIER_UNLIMITED": None,
+}
+TIER_CACHE_SECONDS = 3600
+
+
+class BroadcastEngine:
+    """
+    Фоновая отправка рассылок шаблонов.
+    Получатели забираются из БД пачками, отправляются с ограниченной параллельностью
+    и темпом BROADCAST_RATE на номер; суточный объём не превышает лимит tier номера.
+    Пауза и отмена применяются между пачками.
+    """
+
+    def __init__(
+        self,
+        dao: BroadcastDAO = BroadcastDAO(),
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ) -> None:
+        self._dao = dao
+        self.rate = metasettings.BROADCAST_RATE if rate is None else rate
+        self.batch_size = batch_size or metasettings.BROADCAST_BATCH_SIZE
+        self.poll_interval = poll_interval or metasettings.BROADCAST_POLL_INTERVAL
+        self._semaphore = asyncio.Semaphore(concurrency or metasettings.BROADCAST_CONCURRENCY)
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._tiers: Dict[str, Tuple[float, Optional[int]]] = {}
+        self._stopping = asyncio.Event()
+
+    def _limiter(self, operator_phone: Optional[str]) -> RateLimiter:
+        key = operator_phone or ""
+        if key not in self._limiters:
+            self._limiters[key] = RateLimiter(self.rate)
+        return self._limiters[key]
+
+    async def daily_limit(self, operator_phone: Optional[str]) -> Optional[int]:
+        """Суточный лимит номера по его messaging tier (кэшируется на час)."""
+        key = operator_phone or ""
+        cached = self._tiers.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        tier = await operator_registry.get_client(operator_phone).get_messaging_tier()
+        limit = TIER_LIMITS.get(tier, metasettings.BROADCAST_DAILY_LIMIT)
+        self._tiers[key] = (time.monotonic() + TIER_CACHE_SECONDS, limit)
+        return limit
+
+    async def _send_one(self, job: BroadcastJob, recipient_id: int, phone: str) -> Dict[str, Any]:
+        client = operator_registry.get_client(job.operator_phone)
+        async with self._semaphore:
+            await self._limiter(job.operator_phone).acquire()
+            status, data = await client.post_template(phone, job.template_name, job.language)
+
+        result = {"id": recipient_id, "sent_at": datetime.now()}
+        if status == 200 and data.get("messages"):
+            result.update(
+                status=RecipientStatusEnum.sent,
+                message_id=data["messages"][0].get("id"),
+                error=None,
+            )
+        else:
+            result.update(
+                status=RecipientStatusEnum.failed,
+                message_id=None,
+                error=str(data.get("error", data))[:1000],
+            )
+        return result
+
+    async def process_job(self, job: BroadcastJob) -> int:
+        """
+        Отправляет одну пачку рассылки.
+        :return: количество обработанных получателей.
+        """
+        batch_size = self.batch_size
+        limit = await self.daily_limit(job.operator_phone)
+        if limit is not None:
+            sent = await self._dao.sent_since(
+                job.operator_phone, datetime.now() - timedelta(days=1)
+            )
+            batch_size = min(batch_size, limit - sent)
+            if batch_size <= 0:
+                log.warning(
+                    f"[BROADCAST] Суточный лимит {limit} номера {job.operator_phone} исчерпан, "
+                    f"рассылка {job.id} ждёт"
+                )
+                return 0
+
+        recipients = await self._dao.claim_batch(job.id, batch_size)
+        if not recipients:
+            if await self._dao.complete_if_done(job.id):
+                log.info(f"[BROADCAST] Рассылка {job.id} завершена")
+            return 0
+
+        results = await asyncio.gather(
+            *(self._send_one(job, row.id, row.phone) for row in recipients)
+        )
+        await self._dao.save_results(job.id, results)
+        log.info(f"[BROADCAST] Рассылка {job.id}: отправлена пачка из {len(results)}")
+        return len(results)
+
+    def stop(self) -> None:
+        """Просит фоновую задачу завершиться после текущей пачки."""
+        self._stopping.set()
+
+    async def run_forever(self) -> None:
+        """Фоновая задача: обрабатывает запущенные рассылки по очереди, пачками."""
+        self._stopping.clear()
+        while not self._stopping.is_set():
+            processed = 0
+            try:
+                # При перегрузке воркера рассылка откладывается до следующего опроса
+                jobs = [] if admission.overloaded else await self._dao.get_running()
+                for job in jobs:
+                    if self._stopping.is_set():
+                        break
+                    processed += await self.process_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[BROADCAST] Ошибка рассылки: {traceback.format_exc()}")
+            if not processed:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+
+broadcast_engine: BroadcastEngine = LazyObject(BroadcastEngine)
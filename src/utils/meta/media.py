@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import traceback
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from src.database.DAO.crud import MessagesDAO
+from src.settings.conf import log, metasettings
+from src.settings.lazy import LazyObject
+from src.utils.meta.operators import operator_registry
+from src.utils.meta.previews import preview_service
+
+MEDIA_TYPES = ("image", "document", "audio", "voice", "video", "sticker")
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class MediaJob:
+    message_id: str
+    media_id: str
+    operator_phone: str
+    mime_type: Optional[str] = None
+
+
+class MediaStore:
+    """
+    Контентно-адресуемое хранилище: файл лежит по пути {sha[:2]}/{sha}{ext}.
+    Одинаковые файлы хранятся один раз.
+    """
+
+    def __init__(self, root: Optional[str] = None) -> None:
+        self.root = Path(root or metasettings.MEDIA_DIR)
+        self.tmp_dir = self.root / "tmp"
+
+    def path_for(self, relative: str) -> Path:
+        return self.root / relative
+
+    @staticmethod
+    def relative_path(sha256: str, mime_type: Optional[str]) -> str:
+        ext = mimetypes.guess_extension((mime_type or "").split(";")[0].strip()) or ""
+        return f"{sha256[:2]}/{sha256}{ext}"
+
+    async def save_stream(self, chunks, mime_type: Optional[str]) -> str:
+        """
+        Записывает поток байтов во временный файл, считая sha256 на лету,
+        затем переносит файл на его контентный адрес.
+        :return: относительный путь файла в хранилище.
+        """
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.tmp_dir / f"{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        file = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > metasettings.MEDIA_MAX_BYTES:
+                    raise MediaTooLarge(f"файл больше {metasettings.MEDIA_MAX_BYTES} байт")
+                digest.update(chunk)
+                await asyncio.to_thread(file.write, chunk)
+            await asyncio.to_thread(file.close)
+        except BaseException:
+            await asyncio.to_thread(file.close)
+            await asyncio.to_thread(tmp_path.unlink, True)
+            raise
+
+        relative = self.relative_path(digest.hexdigest(), mime_type)
+        target = self.path_for(relative)
+        await asyncio.to_thread(self._commit, tmp_path, target)
+        return relative
+
+    @staticmethod
+    def _commit(tmp_path: Path, target: Path) -> None:
+        if target.exists():
+            tmp_path.unlink(missing_ok=True)
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, target)
+
+
+class MediaDownloader:
+    """
+    Ограниченный пул фоновых загрузок входящих медиафайлов.
+    Webhook только ставит задачу в очередь; воркеры получают url через Graph API,
+    скачивают файл потоком в MediaStore и записывают путь в Messages.media.
+    """
+
+    def __init__(
+        self,
+        store: Optional[MediaStore] = None,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        messages_dao: MessagesDAO = MessagesDAO(),
+    ) -> None:
+        self.store = store or MediaStore()
+        self.workers = workers or metasettings.MEDIA_WORKERS
+        self.queue_size = queue_size or metasettings.MEDIA_QUEUE_SIZE
+        self._dao = messages_dao
+        self._queue: Optional[asyncio.Queue[MediaJob]] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._worker(index)) for index in range(self.workers)
+        ]
+
+    def submit(self, job: MediaJob) -> bool:
+        """
+        Ставит загрузку в очередь без ожидания.
+        :return: False, если очередь переполнена и задача отброшена.
+        """
+        if self._queue is None:
+            log.error("[MEDIA] Пул загрузок не запущен")
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            log.error(f"[MEDIA] Очередь загрузок переполнена, пропущено: {job}")
+            return False
+
+    async def _worker(self, index: int) -> None:
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            try:
+                await self.download(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[MEDIA] Ошибка загрузки {job}: {traceback.format_exc()}")
+            finally:
+                queue.task_done()
+
+    async def download(self, job: MediaJob) -> Optional[str]:
+        """Скачивает один медиафайл и сохраняет путь в сообщении."""
+        client = operator_registry.get_client(job.operator_phone)
+        status, data = await client.get_media(job.media_id)
+        if status != 200 or not data.get("url"):
+            log.error(f"[MEDIA] Не удалось получить url медиа {job.media_id}: {data}")
+            return None
+
+        mime_type = data.get("mime_type") or job.mime_type
+        relative = await self.store.save_stream(
+            client.stream_media(data["url"]), mime_type
+        )
+        await self._dao.update(job.message_id, media=relative)
+        log.info(f"[MEDIA] Сохранено медиа {job.media_id} → {relative}")
+        preview_service.submit(relative)
+        return relative
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Дожидается загрузок из очереди (не дольше timeout) и останавливает воркеры."""
+        queue, self._queue = self._queue, None
+        if queue is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"[MEDIA] Не загружено при остановке: {queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+media_store: MediaStore = LazyObject(MediaStore)
+media_downloader: MediaDownloader = LazyObject(
+    lambda: MediaDownloader(store=media_store), name="MediaDownloader"
+)
@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.database.DAO.crud import OperatorsDAO
+from src.settings.conf import log
+from src.settings.lazy import LazyObject
+from src.utils.meta.utils_message import MetaClient
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    """
+    Приводит номер телефона к виду "только цифры".
+    Meta присылает display_phone_number без "+", а в таблице номер может быть
+    сохранён в любом формате.
+    """
+    return "".join(ch for ch in str(phone or "") if ch.isdigit())
+
+
+@dataclass(frozen=True)
+class OperatorNumber:
+    display_number: str
+    phone_number_id: str
+    waba_id: str
+
+
+class OperatorRegistry:
+    """
+    Реестр номеров операторов из таблицы OperatorsData.
+    Держит в памяти индекс display_phone_number → (phone_number_id, waba_id)
+    и по одному MetaClient на каждый номер, чтобы ответы уходили с того номера,
+    на который написал клиент.
+    """
+
+    def __init__(self, operators_dao: OperatorsDAO = OperatorsDAO()) -> None:
+        self._dao = operators_dao
+        self._numbers: Dict[str, OperatorNumber] = {}
+        self._clients: Dict[str, MetaClient] = {}
+        self.default_client = MetaClient()
+
+    async def load(self) -> int:
+        """
+        Загружает номера операторов из БД и перестраивает индекс.
+        :return: количество загруженных номеров.
+        """
+        rows = await self._dao.get_all()
+        numbers: Dict[str, OperatorNumber] = {}
+        for row in rows:
+            display = normalize_phone(row.number)
+            if not display:
+                continue
+            numbers[display] = OperatorNumber(
+                display_number=display,
+                phone_number_id=str(row.number_id),
+                waba_id=str(row.account_id),
+            )
+
+        stale = [
+            display
+            for display, client in self._clients.items()
+            if display not in numbers
+            or client.operator_number != numbers[display].phone_number_id
+        ]
+        for display in stale:
+            await self._clients.pop(display).close()
+
+        self._numbers = numbers
+        log.info(f"[META] Загружено номеров операторов: {len(numbers)}")
+        return len(numbers)
+
+    def get(self, operator_phone: Optional[str]) -> Optional[OperatorNumber]:
+        """Возвращает данные номера оператора по display_phone_number."""
+        return self._numbers.get(normalize_phone(operator_phone))
+
+    def get_client(self, operator_phone: Optional[str]) -> MetaClient:
+        """
+        Возвращает MetaClient для номера оператора.
+        Если номер не зарегистрирован — клиент по умолчанию (PHONE_NUMBER_ID из настроек).
+        """
+        number = self.get(operator_phone)
+        if number is None:
+            if operator_phone:
+                log.warning(
+                    f"[META] Номер оператора {operator_phone} не найден в реестре, "
+                    f"используется номер по умолчанию"
+                )
+            return self.default_client
+
+        client = self._clients.get(number.display_number)
+        if client is None:
+            client = MetaClient(
+                operator_number=number.phone_number_id, waba_id=number.waba_id
+            )
+            self._clients[number.display_number] = client
+        return client
+
+    @property
+    def numbers(self) -> Dict[str, OperatorNumber]:
+        return dict(self._numbers)
+
+    async def close(self) -> None:
+        """Закрывает HTTP-клиенты всех номеров."""
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+        await self.default_client.close()
+
+
+operator_registry: OperatorRegistry = LazyObject(OperatorRegistry)
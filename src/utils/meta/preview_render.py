@@ -0,0 +1,49 @@
+"""
+Генерация превью в отдельном процессе.
+Модуль намеренно не импортирует ничего из проекта: он загружается в процессах
+ProcessPoolExecutor, где не нужны настройки, логгер и подключения.
+"""
+import os
+from typing import Optional
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp"}
+DOCUMENT_EXTENSIONS = {".pdf"}
+
+
+def can_render(source_path: str) -> bool:
+    ext = os.path.splitext(source_path)[1].lower()
+    return ext in IMAGE_EXTENSIONS or ext in DOCUMENT_EXTENSIONS
+
+
+def render_preview(source_path: str, target_path: str, size: int) -> Optional[str]:
+    """
+    Создаёт JPEG-превью не больше size×size: уменьшенную картинку
+    или первую страницу PDF.
+    :return: target_path или None, если формат не поддерживается.
+    """
+    from PIL import Image
+
+    ext = os.path.splitext(source_path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        with Image.open(source_path) as image:
+            image.seek(0)
+            preview = image.convert("RGB")
+    elif ext in DOCUMENT_EXTENSIONS:
+        import fitz
+
+        with fitz.open(source_path) as document:
+            if document.page_count == 0:
+                return None
+            page = document.load_page(0)
+            zoom = size / max(page.rect.width, page.rect.height, 1)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom * 2, zoom * 2))
+            preview = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        return None
+
+    preview.thumbnail((size, size))
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    tmp_path = f"{target_path}.{os.getpid()}.part"
+    preview.save(tmp_path, "JPEG", quality=80, optimize=True)
+    os.replace(tmp_path, target_path)
+    return target_path
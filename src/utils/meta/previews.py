@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from src.settings.conf import log, metasettings
+from src.settings.lazy import LazyObject
+from src.utils.meta.preview_render import can_render, render_preview
+
+
+class PreviewService:
+    """
+    Превью (миниатюры картинок и первые страницы PDF) для сохранённых медиафайлов.
+    Рендеринг идёт в ProcessPoolExecutor, чтобы не блокировать event loop.
+    Превью кэшируются на диске по хэшу содержимого: previews/{sha256}_{size}.jpg.
+    """
+
+    def __init__(
+        self,
+        media_root: Optional[str] = None,
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        self.media_root = Path(media_root or metasettings.MEDIA_DIR)
+        self.workers = workers or metasettings.PREVIEW_WORKERS
+        self.queue_size = queue_size or metasettings.PREVIEW_QUEUE_SIZE
+        self.size = size or metasettings.PREVIEW_SIZE
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def start(self) -> None:
+        # spawn: дочерние процессы не наследуют event loop, сокеты и пулы соединений
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    @staticmethod
+    def content_hash(media_path: str) -> str:
+        """sha256 из контентного адреса файла ({sha[:2]}/{sha}{ext})."""
+        return os.path.splitext(os.path.basename(media_path))[0]
+
+    def preview_path(self, media_path: str) -> str:
+        """Относительный путь превью для медиафайла."""
+        return f"previews/{self.content_hash(media_path)}_{self.size}.jpg"
+
+    def submit(self, media_path: str) -> Optional[asyncio.Future]:
+        """
+        Ставит генерацию превью без ожидания результата.
+        Повторные запросы для того же файла получают уже запущенную задачу.
+        :return: Future с относительным путём превью или None, если задача не принята.
+        """
+        if self._executor is None or not can_render(media_path):
+            return None
+        key = self.content_hash(media_path)
+        if key in self._inflight:
+            return self._inflight[key]
+        if len(self._inflight) >= self.queue_size:
+            log.warning(f"[PREVIEW] Очередь превью переполнена, пропущено: {media_path}")
+            return None
+
+        future = asyncio.ensure_future(self._generate(media_path))
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return future
+
+    async def _generate(self, media_path: str) -> Optional[str]:
+        relative = self.preview_path(media_path)
+        target = self.media_root / relative
+        if await asyncio.to_thread(target.exists):
+            return relative
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._executor,
+                render_preview,
+                str(self.media_root / media_path),
+                str(target),
+                self.size,
+            )
+        except Exception as e:
+            log.error(f"[PREVIEW] Ошибка генерации превью {media_path}: {e}")
+            return None
+        return relative if result else None
+
+    async def existing(self, media_paths: Iterable[str]) -> Dict[str, str]:
+        """
+        Возвращает готовые превью для набора медиафайлов (проверка в потоке).
+        :return: словарь media_path → путь превью.
+        """
+        paths = [path for path in set(media_paths) if path and can_render(path)]
+        if not paths:
+            return {}
+
+        def check() -> Dict[str, str]:
+            found = {}
+            for path in paths:
+                relative = self.preview_path(path)
+                if (self.media_root / relative).exists():
+                    found[path] = relative
+            return found
+
+        return await asyncio.to_thread(check)
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Дожидается начатых превью (не дольше timeout) и останавливает пул процессов."""
+        pending = list(self._inflight.values())
+        if pending and timeout > 0:
+            _, pending = await asyncio.wait(pending, timeout=timeout)
+        for future in pending:
+            future.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+preview_service: PreviewService = LazyObject(PreviewService)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
 
 import httpx
 
@@ -8,24 +8,65 @@ from src.settings.conf import log, metasettings
 class MetaClient:
     def __init__(
         self,
-        operator_number: str = metasettings.PHONE_NUMBER_ID,
-        waba_id: str = metasettings.ACCOUNT_ID,
+        operator_number: Optional[str] = None,
+        waba_id: Optional[str] = None,
     ) -> None:
-        self.base_url: str = metasettings.BASE_URL
-        self.verify_token: str = metasettings.VERIFY_TOKEN
-        self.token: str = metasettings.TOKEN
-        self.operator_number: Optional[str] = operator_number
-        self.headers: Dict[str, str] = metasettings.get_headers()
-        self.bus_id: str = metasettings.BUS_ID
-        self.waba_id: str = waba_id
+        """
+        Клиент Graph API для одного номера.
+        Без аргументов используются PHONE_NUMBER_ID и ACCOUNT_ID из настроек;
+        настройки читаются при первом запросе, а не при создании клиента.
+        """
+        self._operator_number = operator_number
+        self._waba_id = waba_id
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def base_url(self) -> str:
+        return metasettings.BASE_URL
+
+    @property
+    def verify_token(self) -> str:
+        return metasettings.VERIFY_TOKEN
+
+    @property
+    def token(self) -> str:
+        return metasettings.TOKEN
+
+    @property
+    def operator_number(self) -> str:
+        return self._operator_number or metasettings.PHONE_NUMBER_ID
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return metasettings.get_headers()
+
+    @property
+    def bus_id(self) -> str:
+        return metasettings.BUS_ID
+
+    @property
+    def waba_id(self) -> str:
+        return self._waba_id or metasettings.ACCOUNT_ID
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Возвращает переиспользуемый HTTP-клиент с пулом соединений.
+        Клиент создаётся лениво при первом запросе.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=5.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            )
+        return self._client
 
     async def _response(self, method: str, url: str, **kwargs) -> Tuple[int, Any]:
         """Универсальный HTTP-запрос."""
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                request_method = getattr(client, method.lower())
-                log.debug(f"[META] Sending {method} to {url} | Payload: {kwargs}")
-                response = await request_method(url, headers=self.headers, **kwargs)
+            client = self._get_client()
+            request_method = getattr(client, method.lower())
+            log.debug(f"[META] Sending {method} to {url} | Payload: {kwargs}")
+            response = await request_method(url, headers=self.headers, **kwargs)
 
             log.debug(f"[META] Response {response.status_code}: {response.text}")
             return response.status_code, response.json()
@@ -111,3 +152,39 @@ class MetaClient:
         url = f"{self.base_url}/v18.0/{phone_number_id}/verify"
         log.info(f"[META] Confirming number {phone_number_id} with code {confirm_code}")
         return await self._response("POST", url, json={"code": confirm_code})
+
+    async def get_messaging_tier(self) -> Optional[str]:
+        """Возвращает messaging_limit_tier номера (TIER_1K, TIER_10K, ...)."""
+        url = f"{self.base_url}/v19.0/{self.operator_number}?fields=messaging_limit_tier"
+        status, data = await self._response("GET", url)
+        if status != 200:
+            log.error(f"[META] Ошибка получения messaging tier: {data}")
+            return None
+        return data.get("messaging_limit_tier")
+
+    async def get_media(self, media_id: str) -> Tuple[int, Any]:
+        """Получает url, mime_type, sha256 и размер медиафайла по его id."""
+        url = f"{self.base_url}/v19.0/{media_id}"
+        return await self._response("GET", url)
+
+    async def stream_media(self, media_url: str) -> AsyncIterator[bytes]:
+        """
+        Потоково скачивает медиафайл по url из get_media, отдавая его частями.
+        Файл целиком в память не загружается.
+        """
+        client = self._get_client()
+        async with client.stream(
+            "GET",
+            media_url,
+            headers={"Authorization": f"Bearer {self.token}"},
+            timeout=metasettings.MEDIA_DOWNLOAD_TIMEOUT,
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(metasettings.MEDIA_CHUNK_SIZE):
+                yield chunk
+
+    async def close(self) -> None:
+        """Закрывает HTTP-клиент и освобождает соединения пула."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+
+from src.utils.redis_conn import chat_field, redis_client
+
+
+async def migrate_conversation_keys(batch_size: int = 500) -> int:
+    """
+    Переносит ключи старого формата в хэши диалогов conv:{телефон клиента}:
+    client_operator:{phone} → поле operator, chat:{phone}:{operator} → поле chat:{operator}.
+    Перенесённые ключи удаляются; повторный запуск безопасен.
+    :return: количество перенесённых ключей.
+    """
+    redis = redis_client._redis
+    migrated = 0
+
+    async for key in redis.scan_iter(match="client_operator:*", count=batch_size):
+        phone = key.split(":", 1)[1]
+        operator_phone = await redis.get(key)
+        if operator_phone:
+            await redis_client.update_conversation(phone, {"operator": operator_phone})
+        await redis.unlink(key)
+        migrated += 1
+
+    async for key in redis.scan_iter(match="chat:*", count=batch_size):
+        parts = key.split(":")
+        if len(parts) != 3:
+            continue
+        _, phone, operator_phone = parts
+        chat_id = await redis.get(key)
+        if chat_id:
+            await redis_client.update_conversation(phone, {chat_field(operator_phone): chat_id})
+        await redis.unlink(key)
+        migrated += 1
+
+    logging.info(f"Migrated {migrated} legacy conversation keys")
+    return migrated
+
+
+async def main() -> None:
+    try:
+        await migrate_conversation_keys()
+    finally:
+        await redis_client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,206 @@
+import asyncio
+import re
+import traceback
+from datetime import date, datetime, time
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from src.settings.conf import dbsettings, log
+from src.settings.engine import conn
+from src.settings.lazy import LazyObject
+
+PARTITION_NAME_RE = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+# Ключ advisory-lock, чтобы несколько воркеров не выполняли DDL одновременно
+PARTITION_LOCK_KEY = 728401
+DEFAULT_PARTITION = "messages_default"
+# search_vector вычисляется, при переносе строк его не копируют
+MESSAGES_COLUMNS = 'id, sender, text, media, "timestamp", status, template_id, deals_id'
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+
+def parse_partition_month(name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+class MessagesPartitionManager:
+    """
+    Обслуживает месячные секции таблицы messages:
+    заранее создаёт будущие секции и отсоединяет/удаляет секции старше окна хранения.
+    Отсоединённые секции остаются отдельными таблицами (их можно архивировать).
+    Строки, попавшие в messages_default до создания секции своего месяца, переносятся
+    в новую секцию: default отсоединяется, строки переезжают, default присоединяется обратно.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        months_ahead: Optional[int] = None,
+        retention_months: Optional[int] = None,
+        retention_mode: Optional[str] = None,
+    ) -> None:
+        self.engine = engine or conn.engine
+        self.months_ahead = (
+            dbsettings.MESSAGES_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+        )
+        self.retention_months = (
+            dbsettings.MESSAGES_RETENTION_MONTHS
+            if retention_months is None
+            else retention_months
+        )
+        self.retention_mode = retention_mode or dbsettings.MESSAGES_RETENTION_MODE
+
+    async def list_partitions(self) -> List[str]:
+        """Возвращает имена секций, присоединённых к messages."""
+        async with self.engine.connect() as connection:
+            result = await connection.execute(
+                text(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = 'messages' ORDER BY c.relname"
+                )
+            )
+            return [row[0] for row in result]
+
+    async def ensure_partitions(self, today: Optional[date] = None) -> List[str]:
+        """
+        Создаёт секции с текущего месяца на months_ahead месяцев вперёд.
+        :return: имена созданных секций.
+        """
+        current = month_start(today or datetime.now().date())
+        existing = set(await self.list_partitions())
+        created = []
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+            )
+            for offset in range(self.months_ahead + 1):
+                month = add_months(current, offset)
+                name = partition_name(month)
+                if name in existing:
+                    continue
+                if DEFAULT_PARTITION in existing:
+                    moved = await self._create_from_default(connection, name, month)
+                    if moved:
+                        log.warning(
+                            f"[DB] {moved} сообщений перенесено из {DEFAULT_PARTITION} в {name}"
+                        )
+                else:
+                    await connection.execute(text(self._create_sql(name, month)))
+                created.append(name)
+        if created:
+            log.info(f"[DB] Созданы секции messages: {created}")
+        return created
+
+    @staticmethod
+    def _create_sql(name: str, month: date) -> str:
+        return (
+            f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF messages '
+            f"FOR VALUES FROM ('{month.isoformat()}') "
+            f"TO ('{add_months(month, 1).isoformat()}')"
+        )
+
+    async def _create_from_default(self, connection: AsyncConnection, name: str, month: date) -> int:
+        """
+        Создаёт секцию месяца при существующей DEFAULT-секции. Если в default уже есть
+        строки этого месяца (CREATE ... PARTITION OF тогда падает), default на время
+        отсоединяется и строки переносятся в новую секцию.
+        :return: количество перенесённых строк.
+        """
+        bounds = {
+            "start": datetime.combine(month, time.min),
+            "end": datetime.combine(add_months(month, 1), time.min),
+        }
+        in_range = '"timestamp" >= :start AND "timestamp" < :end'
+        stray = await connection.scalar(
+            text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_range})"), bounds
+        )
+        if not stray:
+            await connection.execute(text(self._create_sql(name, month)))
+            return 0
+        await connection.execute(text(f"ALTER TABLE messages DETACH PARTITION {DEFAULT_PARTITION}"))
+        await connection.execute(text(self._create_sql(name, month)))
+        result = await connection.execute(
+            text(
+                f'INSERT INTO "{name}" ({MESSAGES_COLUMNS}) '
+                f"SELECT {MESSAGES_COLUMNS} FROM {DEFAULT_PARTITION} WHERE {in_range}"
+            ),
+            bounds,
+        )
+        await connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+        await connection.execute(
+            text(f"ALTER TABLE messages ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+        )
+        return result.rowcount
+
+    async def apply_retention(self, today: Optional[date] = None) -> List[str]:
+        """
+        Отсоединяет (detach) или удаляет (drop) секции старше retention_months.
+        :return: имена обработанных секций.
+        """
+        if self.retention_months <= 0:
+            return []
+        cutoff = add_months(month_start(today or datetime.now().date()), -self.retention_months)
+        expired = [
+            name
+            for name in await self.list_partitions()
+            if (month := parse_partition_month(name)) is not None and month < cutoff
+        ]
+        if not expired:
+            return []
+
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}
+            )
+            for name in expired:
+                await connection.execute(text(f'ALTER TABLE messages DETACH PARTITION "{name}"'))
+                if self.retention_mode == "drop":
+                    await connection.execute(text(f'DROP TABLE IF EXISTS "{name}"'))
+        log.info(f"[DB] Секции messages вне окна хранения ({self.retention_mode}): {expired}")
+        return expired
+
+    async def run_once(self) -> None:
+        """Создание секций и окно хранения независимы: ошибка одного шага не отменяет другой."""
+        for step in (self.ensure_partitions, self.apply_retention):
+            try:
+                await step()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(
+                    f"[DB] Ошибка обслуживания секций messages ({step.__name__}): "
+                    f"{traceback.format_exc()}"
+                )
+
+    async def run_forever(self, interval: Optional[int] = None) -> None:
+        """Фоновая задача обслуживания секций."""
+        interval = interval or dbsettings.MESSAGES_PARTITION_CHECK_INTERVAL
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[DB] Ошибка обслуживания секций messages: {traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+
+partition_manager: MessagesPartitionManager = LazyObject(MessagesPartitionManager)
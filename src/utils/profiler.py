@@ -0,0 +1,106 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import FrameType
+from typing import Iterator, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    path = Path(code.co_filename)
+    try:
+        filename = str(path.relative_to(PROJECT_ROOT))
+    except ValueError:
+        filename = "/".join(path.parts[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _coroutine_stack(coro) -> List[str]:
+    """Цепочка await приостановленной корутины, от внешней к внутренней."""
+    stack = []
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+class SamplingProfiler:
+    """
+    Статистический профилировщик: отдельный поток hz раз в секунду снимает стеки
+    всех потоков и всех незавершённых asyncio-задач и считает одинаковые стеки.
+    Результат — collapsed stacks (формат flamegraph.pl / speedscope).
+    Пока профилирование не запущено, накладных расходов нет.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, hz: int) -> None:
+        self.loop = loop
+        self.interval = 1.0 / hz
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+
+    def _sample_threads(self, own_ident: int) -> Iterator[str]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = _thread_stack(frame)
+            if stack:
+                yield ";".join([f"thread:{names.get(ident, ident)}", *stack])
+
+    def _sample_tasks(self) -> Iterator[str]:
+        try:
+            tasks = list(asyncio.all_tasks(self.loop))
+        except RuntimeError:
+            return
+        for task in tasks:
+            if task.done():
+                continue
+            coro = task.get_coro()
+            stack = _coroutine_stack(coro)
+            if stack:
+                root = getattr(coro, "__qualname__", type(coro).__name__)
+                yield ";".join([f"task:{root}", *stack])
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample_count += 1
+            self.samples.update(self._sample_threads(own_ident))
+            self.samples.update(self._sample_tasks())
+
+    async def profile(self, seconds: float) -> str:
+        """
+        Профилирует процесс seconds секунд.
+        :return: collapsed stacks: строка «кадр;кадр;... число» на каждый стек.
+        """
+        thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        started = time.perf_counter()
+        thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._stop.set()
+            await asyncio.to_thread(thread.join)
+        self.elapsed = time.perf_counter() - started
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.samples.most_common()
+        )
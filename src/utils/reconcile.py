@@ -0,0 +1,247 @@
+"""
+Сверка сделок: Postgres (Deals.conversation_id) ↔ Redis (conv:{клиент}, поле chat:{оператор})
+↔ amoCRM (chat_id чата whatsapp:{клиент}:{оператор}).
+
+    python -m src.utils.reconcile                 # продолжить с контрольной точки
+    python -m src.utils.reconcile --reset         # начать проход заново
+    python -m src.utils.reconcile --create-chats  # создавать недостающие чаты в amoCRM
+"""
+import argparse
+import asyncio
+import json
+import logging
+import traceback
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import text
+
+from src.database.DAO.crud import DealsDAO, DealSummaryDAO
+from src.database.models.Models import Deals
+from src.settings.conf import appsettings, log
+from src.settings.engine import conn
+from src.settings.lazy import LazyObject
+from src.utils.admission import admission
+from src.utils.amo.chat import AmoCRMClient
+from src.utils.ratelimit import RateLimiter
+from src.utils.redis_conn import chat_field, redis_client
+
+CHECKPOINT_KEY = "reconcile:checkpoint"
+REPORT_KEY = "reconcile:report"
+# Ключ advisory-lock: сверку выполняет только один воркер
+RECONCILE_LOCK_KEY = 728403
+MIN_AMO_RPS = 0.5
+
+
+class Reconciler:
+    """
+    Проходит Deals пачками по возрастанию id и сравнивает chat_id в Postgres и Redis.
+    Если значение есть только в одном месте — копирует его во второе. Если значения
+    расходятся или нет ни одного, сделка попадает в отчёт; только с create_chats
+    (RECONCILE_CREATE_CHATS) chat_id берётся из amoCRM через создание чата — для того же
+    conversation_id оно возвращает существующий chat_id, а если чата нет, создаёт его. Redis исправляется только
+    для живых диалогов: хэш conv:{клиент} ещё есть или по сделке были сообщения
+    в пределах его TTL — истёкшие хэши не воскрешаются. Запросы в amoCRM идут
+    с ограничением параллельности и темпа; при ошибках темп снижается вдвое.
+    После каждой пачки id последней сделки сохраняется в Redis, прерванный проход
+    продолжается с этого места.
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        amo_rps: Optional[float] = None,
+        create_chats: Optional[bool] = None,
+        deals_dao: DealsDAO = DealsDAO(),
+        summary_dao: DealSummaryDAO = DealSummaryDAO(),
+    ) -> None:
+        self.batch_size = batch_size or appsettings.RECONCILE_BATCH_SIZE
+        self.concurrency = concurrency or appsettings.RECONCILE_CONCURRENCY
+        self.amo_rps = amo_rps or appsettings.RECONCILE_AMO_RPS
+        self.create_chats = (
+            appsettings.RECONCILE_CREATE_CHATS if create_chats is None else create_chats
+        )
+        self._rps = self.amo_rps
+        self._limiter = RateLimiter(self._rps)
+        self._deals = deals_dao
+        self._summaries = summary_dao
+        self._amo = AmoCRMClient()
+
+    def _adjust_rate(self, failed: bool) -> None:
+        """Снижает темп запросов в amoCRM после ошибок и постепенно возвращает его."""
+        rps = max(self._rps / 2, MIN_AMO_RPS) if failed else min(self._rps * 1.5, self.amo_rps)
+        if rps != self._rps:
+            log.info(f"[RECONCILE] Темп запросов в amoCRM: {self._rps:.1f} → {rps:.1f} rps")
+            self._rps = rps
+            self._limiter = RateLimiter(rps)
+
+    async def _amo_chat_id(self, deal: Deals, semaphore: asyncio.Semaphore) -> Optional[str]:
+        async with semaphore:
+            await self._limiter.acquire()
+            try:
+                return await self._amo.create_chat(deal.client_phone, deal.operator_phone)
+            except Exception:
+                log.error(f"[RECONCILE] Ошибка запроса в amoCRM: {traceback.format_exc()}")
+                return None
+
+    async def reconcile_batch(self, deals: Sequence[Deals], report: Counter) -> None:
+        """Сверяет пачку сделок и исправляет расхождения массовыми записями."""
+        states = await redis_client.get_conversations(deal.client_phone for deal in deals)
+        active = await self._summaries.active_since(
+            [deal.id for deal in deals if not states[deal.client_phone]],
+            datetime.now() - timedelta(seconds=redis_client.conversation_ttl),
+        )
+        live = {deal.id for deal in deals if states[deal.client_phone]} | active
+        pg_fixes: Dict[UUID, str] = {}
+        redis_fixes: Dict[str, Dict[str, str]] = defaultdict(dict)
+        lookups: List[Deals] = []
+
+        for deal in deals:
+            stored = deal.conversation_id
+            cached = states[deal.client_phone].get(chat_field(deal.operator_phone))
+            report["scanned"] += 1
+            if stored and stored == cached:
+                report["ok"] += 1
+            elif stored and not cached:
+                if deal.id not in live:
+                    report["redis_expired"] += 1
+                    continue
+                report["redis_missing"] += 1
+                redis_fixes[deal.client_phone][deal.operator_phone] = stored
+            elif cached and not stored:
+                report["pg_missing"] += 1
+                pg_fixes[deal.id] = cached
+            else:
+                report["mismatch" if stored else "both_missing"] += 1
+                lookups.append(deal)
+
+        if lookups and not self.create_chats:
+            report["amo_skipped"] += len(lookups)
+        elif lookups:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            chat_ids = await asyncio.gather(
+                *(self._amo_chat_id(deal, semaphore) for deal in lookups)
+            )
+            report["amo_lookups"] += len(lookups)
+            failed = 0
+            for deal, chat_id in zip(lookups, chat_ids):
+                if not chat_id:
+                    failed += 1
+                    continue
+                if chat_id != deal.conversation_id:
+                    pg_fixes[deal.id] = chat_id
+                cached = states[deal.client_phone].get(chat_field(deal.operator_phone))
+                if deal.id in live and chat_id != cached:
+                    redis_fixes[deal.client_phone][deal.operator_phone] = chat_id
+            report["amo_errors"] += failed
+            self._adjust_rate(failed > 0)
+
+        report["pg_repaired"] += await self._deals.set_conversation_ids(pg_fixes)
+        await redis_client.restore_chat_ids(redis_fixes)
+        report["redis_repaired"] += sum(len(fixes) for fixes in redis_fixes.values())
+        report["summary_status_repaired"] += await self._summaries.sync_last_status(
+            [deal.id for deal in deals]
+        )
+
+    @staticmethod
+    async def load_report() -> Optional[Dict[str, Any]]:
+        """Отчёт последнего (или текущего) прохода из Redis."""
+        raw = await redis_client.get(REPORT_KEY)
+        return json.loads(raw) if raw else None
+
+    @staticmethod
+    async def _save_report(report: Counter, meta: Dict[str, Any]) -> None:
+        meta["updated_at"] = datetime.now().isoformat()
+        await redis_client.set(REPORT_KEY, json.dumps({**meta, "drift": dict(report)}))
+
+    async def _run_pass(self, reset: bool) -> Counter:
+        checkpoint = None if reset else await redis_client.get(CHECKPOINT_KEY)
+        previous = await self.load_report() if checkpoint else None
+        if previous:
+            report = Counter(previous.get("drift", {}))
+            meta = {"started_at": previous.get("started_at")}
+            log.info(f"[RECONCILE] Продолжаем сверку после сделки {checkpoint}")
+        else:
+            report = Counter()
+            meta = {"started_at": datetime.now().isoformat()}
+        meta["finished_at"] = None
+
+        after_id = UUID(checkpoint) if checkpoint else None
+        while True:
+            while admission.overloaded:
+                log.info(f"[RECONCILE] Сверка отложена: {admission.overload_reason}")
+                await asyncio.sleep(admission.retry_after)
+            deals = await self._deals.scan_after(after_id, self.batch_size)
+            if not deals:
+                break
+            await self.reconcile_batch(deals, report)
+            after_id = deals[-1].id
+            meta["checkpoint"] = str(after_id)
+            await redis_client.set(CHECKPOINT_KEY, str(after_id))
+            await self._save_report(report, meta)
+
+        meta["checkpoint"] = None
+        meta["finished_at"] = datetime.now().isoformat()
+        await self._save_report(report, meta)
+        await redis_client.delete(CHECKPOINT_KEY)
+        return report
+
+    async def run_once(self, reset: bool = False) -> Optional[Counter]:
+        """
+        Полный проход по Deals (с контрольной точки, если предыдущий был прерван).
+        :param reset: начать проход с начала, игнорируя контрольную точку.
+        :return: счётчики расхождений или None, если сверку уже выполняет другой воркер.
+        """
+        async with conn.engine.connect() as lock_connection:
+            locked = await lock_connection.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": RECONCILE_LOCK_KEY}
+            )
+            if not locked:
+                log.info("[RECONCILE] Сверка уже выполняется другим воркером")
+                return None
+            try:
+                report = await self._run_pass(reset)
+            finally:
+                await lock_connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": RECONCILE_LOCK_KEY}
+                )
+        drift = {key: value for key, value in report.items() if key not in ("scanned", "ok")}
+        log.info(f"[RECONCILE] Проверено сделок: {report['scanned']}, расхождения: {drift}")
+        return report
+
+    async def run_forever(self, interval: Optional[int] = None) -> None:
+        """Фоновая задача сверки."""
+        interval = interval or appsettings.RECONCILE_INTERVAL
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[RECONCILE] Ошибка сверки: {traceback.format_exc()}")
+            await asyncio.sleep(interval)
+
+
+reconciler: Reconciler = LazyObject(Reconciler)
+
+
+async def main(reset: bool, create_chats: bool) -> None:
+    try:
+        await Reconciler(create_chats=create_chats or None).run_once(reset=reset)
+    finally:
+        await redis_client.close()
+        await conn.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Сверка сделок Postgres, Redis и amoCRM")
+    parser.add_argument("--reset", action="store_true", help="Начать проход с начала")
+    parser.add_argument(
+        "--create-chats", action="store_true", help="Создавать недостающие чаты в amoCRM"
+    )
+    args = parser.parse_args()
+    asyncio.run(main(args.reset, args.create_chats))
@@ -1,8 +1,126 @@
-from typing import Optional
+import asyncio
+import time
+import traceback
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 from redis.asyncio import Redis
 
-from src.settings.conf import redissettings
+from src.settings.conf import log, redissettings
+from src.settings.lazy import LazyObject
+
+INVALIDATE_CHANNEL = "__redis__:invalidate"
+_MISSING = object()
+# Продление и снятие аренды только её владельцем
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def conversation_key(client_phone: str) -> str:
+    """
+    Хэш состояния диалога с клиентом. Поля:
+    operator — текущий номер оператора, chat:{operator} — chat_id amoCRM для номера,
+    last_inbound — время последнего входящего, seen:{timestamp} — метки дедупликации.
+    """
+    return f"conv:{client_phone}"
+
+
+def outbox_key(client_phone: str) -> str:
+    """Очередь текстов, отправленных клиенту, для сопоставления со статусами Meta."""
+    return f"outbox:{client_phone}"
+
+
+def chat_field(operator_phone: str) -> str:
+    return f"chat:{operator_phone}"
+
+
+def chat_stream_key(chat_id: str) -> str:
+    """Ограниченный Redis stream последних событий чата для повтора в WebSocket."""
+    return f"chat_events:{chat_id}"
+
+
+class ClientCache:
+    """
+    Ограниченный LRU-кэш значений Redis в памяти процесса.
+    Записи удаляются по сообщениям инвалидации от сервера; значение, прочитанное
+    во время инвалидации того же ключа, в кэш не попадает. Если инвалидация всё же
+    потеряна, запись живёт не дольше ttl секунд.
+    """
+
+    def __init__(self, max_size: int, prefixes: Iterable[str], ttl: float = 0.0) -> None:
+        self.max_size = max_size
+        self.prefixes = tuple(prefixes)
+        self.ttl = ttl
+        self.enabled = False
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._pending: Dict[str, object] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def cacheable(self, key: str) -> bool:
+        return self.enabled and key.startswith(self.prefixes)
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            del self._data[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        self.hits += 1
+        self._data.move_to_end(key)
+        return entry[0]
+
+    def begin_read(self, key: str) -> object:
+        token = object()
+        self._pending[key] = token
+        return token
+
+    def finish_read(self, key: str, token: object, value: Any) -> None:
+        if self._pending.get(key) is not token:
+            return
+        del self._pending[key]
+        self._data[key] = (value, time.monotonic() + self.ttl if self.ttl > 0 else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable[str]]) -> None:
+        """Удаляет ключи из кэша; None — сброс всего кэша (FLUSHDB, переподключение)."""
+        if keys is None:
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._pending.clear()
+            return
+        for key in keys:
+            self._pending.pop(key, None)
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+        }
 
 
 class RedisClient:
@@ -10,6 +128,80 @@ class RedisClient:
         if url is None:
             url = redissettings.redis_url
         self._redis = Redis.from_url(url, decode_responses=True)
+        self.cache = ClientCache(
+            redissettings.REDIS_CLIENT_CACHE_SIZE,
+            redissettings.REDIS_CLIENT_CACHE_PREFIXES,
+            redissettings.REDIS_CLIENT_CACHE_TTL,
+        )
+        self._tracking_task: Optional[asyncio.Task] = None
+        self.conversation_ttl = redissettings.REDIS_CONVERSATION_TTL
+        self.dedup_seconds = redissettings.REDIS_DEDUP_SECONDS
+        self.chat_stream_maxlen = redissettings.REDIS_CHAT_STREAM_MAXLEN
+        self.chat_stream_ttl = redissettings.REDIS_CHAT_STREAM_TTL
+        self._renew_lease = self._redis.register_script(RENEW_LEASE_SCRIPT)
+        self._release_lease = self._redis.register_script(RELEASE_LEASE_SCRIPT)
+
+    async def start_client_cache(self) -> None:
+        """Включает локальный кэш и подписку на инвалидации (если разрешено настройками)."""
+        if redissettings.REDIS_CLIENT_CACHE and self._tracking_task is None:
+            self._tracking_task = asyncio.create_task(self._track_invalidations())
+
+    async def _track_invalidations(self) -> None:
+        """
+        Держит два выделенных соединения: одно подписано на __redis__:invalidate,
+        на втором включён CLIENT TRACKING BCAST с перенаправлением инвалидаций в первое.
+        В паузах между инвалидациями оба соединения проверяются PING/CLIENT ID: если
+        ответа нет или трекер переподключился (и потерял TRACKING), кэш сбрасывается
+        и подписка создаётся заново. Пока подписка не работает, кэш выключен и чтения
+        идут в Redis.
+        """
+        pool = self._redis.connection_pool
+        health = redissettings.REDIS_CLIENT_CACHE_HEALTH_SECONDS
+        while True:
+            listener = pool.make_connection()
+            tracker = pool.make_connection()
+            try:
+                await listener.connect()
+                await listener.send_command("CLIENT", "ID")
+                listener_id = await listener.read_response()
+                await listener.send_command("SUBSCRIBE", INVALIDATE_CHANNEL)
+                await listener.read_response()
+
+                await tracker.connect()
+                await tracker.send_command("CLIENT", "ID")
+                tracker_id = await tracker.read_response()
+                prefixes = [arg for p in self.cache.prefixes for arg in ("PREFIX", p)]
+                await tracker.send_command(
+                    "CLIENT", "TRACKING", "ON", "REDIRECT", listener_id, "BCAST", *prefixes
+                )
+                await tracker.read_response()
+
+                self.cache.enabled = True
+                log.info(f"[REDIS] Локальный кэш включён для {', '.join(self.cache.prefixes)}")
+                last_seen = time.monotonic()
+                while True:
+                    message = await listener.read_response(timeout=health)
+                    if message is None:
+                        if time.monotonic() - last_seen > 2 * health:
+                            raise ConnectionError("соединение подписки не отвечает на PING")
+                        await listener.send_command("PING")
+                        await tracker.send_command("CLIENT", "ID")
+                        if await tracker.read_response(timeout=health) != tracker_id:
+                            raise ConnectionError("соединение CLIENT TRACKING потеряно")
+                        continue
+                    last_seen = time.monotonic()
+                    if isinstance(message, list) and len(message) == 3 and message[0] == "message":
+                        self.cache.invalidate(message[2])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[REDIS] Подписка на инвалидации прервана: {traceback.format_exc()}")
+            finally:
+                self.cache.enabled = False
+                self.cache.invalidate(None)
+                await listener.disconnect()
+                await tracker.disconnect()
+            await asyncio.sleep(1)
 
     async def rpush(self, key: str, value: str) -> int:
         """Добавляет value в конец списка под ключом key. Возвращает новую длину списка."""
@@ -20,26 +212,208 @@ class RedisClient:
         return await self._redis.lpop(key)
 
     async def set(self, key, value, ex=None):
+        self.cache.invalidate([key])
         await self._redis.set(key, value)
         if ex:
             await self._redis.expire(key, ex)
 
+    async def delete(self, *keys: str) -> int:
+        self.cache.invalidate(keys)
+        return await self._redis.delete(*keys)
+
+    async def _cached(self, key: str, load: Callable[[str], Awaitable[Any]]) -> Any:
+        """Читает ключ через локальный кэш, если ключ отслеживается."""
+        if not self.cache.cacheable(key):
+            return await load(key)
+        value = self.cache.get(key)
+        if value is not _MISSING:
+            return value
+        token = self.cache.begin_read(key)
+        value = await load(key)
+        self.cache.finish_read(key, token, value)
+        return value
+
     async def get(self, key: str) -> Optional[str]:
-        val = await self._redis.get(key)
-        return val
+        return await self._cached(key, self._redis.get)
+
+    async def get_conversation(self, client_phone: str) -> Dict[str, str]:
+        """Всё состояние диалога одним HGETALL (из локального кэша, если он включён)."""
+        state = await self._cached(conversation_key(client_phone), self._redis.hgetall)
+        if not state:
+            state = await self._migrate_conversation(client_phone)
+        return dict(state)
+
+    async def update_conversation(self, client_phone: str, fields: Dict[str, str]) -> None:
+        """Записывает поля диалога и продлевает TTL хэша одним pipeline."""
+        key = conversation_key(client_phone)
+        self.cache.invalidate([key])
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.expire(key, self.conversation_ttl)
+            await pipe.execute()
+
+    async def mark_inbound(
+        self, client_phone: str, timestamp: int, state: Dict[str, str]
+    ) -> bool:
+        """
+        Отмечает входящее сообщение клиента и чистит устаревшие метки дедупликации.
+        :param state: текущее состояние из get_conversation.
+        :return: False, если сообщение с этим timestamp уже обрабатывалось.
+        """
+        key = conversation_key(client_phone)
+        stale = [
+            field
+            for field in state
+            if field.startswith("seen:")
+            and field[5:].isdigit()
+            and int(field[5:]) < int(timestamp) - self.dedup_seconds
+        ]
+        self.cache.invalidate([key])
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hsetnx(key, f"seen:{timestamp}", "1")
+            pipe.hset(key, "last_inbound", str(timestamp))
+            if stale:
+                pipe.hdel(key, *stale)
+            pipe.expire(key, self.conversation_ttl)
+            result = await pipe.execute()
+        return bool(result[0])
+
+    async def _migrate_conversation(self, client_phone: str) -> Dict[str, str]:
+        """Переносит ключи старого формата client_operator:* и chat:* в хэш диалога."""
+        operator_key = f"client_operator:{client_phone}"
+        operator_phone = await self._redis.get(operator_key)
+        if not operator_phone:
+            return {}
+        chat_key = f"chat:{client_phone}:{operator_phone}"
+        fields = {"operator": operator_phone}
+        chat_id = await self._redis.get(chat_key)
+        if chat_id:
+            fields[chat_field(operator_phone)] = chat_id
+        await self.update_conversation(client_phone, fields)
+        await self._redis.unlink(operator_key, chat_key)
+        log.info(f"[REDIS] Состояние диалога {client_phone} перенесено в хэш")
+        return fields
+
+    async def get_conversations(self, client_phones: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Состояния нескольких диалогов одним pipeline HGETALL, минуя локальный кэш.
+        Для пустых хэшей, как и get_conversation, переносит ключи старого формата.
+        """
+        phones = list(dict.fromkeys(client_phones))
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for phone in phones:
+                pipe.hgetall(conversation_key(phone))
+            states = dict(zip(phones, await pipe.execute()))
+        for phone, state in states.items():
+            if not state:
+                states[phone] = await self._migrate_conversation(phone)
+        return states
+
+    async def restore_chat_ids(self, chat_ids: Dict[str, Dict[str, str]]) -> None:
+        """
+        Восстанавливает поля chat:{operator} одним pipeline.
+        Поле operator не трогает: какой оператор ведёт диалог сейчас, по chat_id не понять.
+        :param chat_ids: {телефон клиента: {телефон оператора: chat_id}}.
+        """
+        if not chat_ids:
+            return
+        self.cache.invalidate([conversation_key(phone) for phone in chat_ids])
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for phone, by_operator in chat_ids.items():
+                key = conversation_key(phone)
+                pipe.hset(
+                    key,
+                    mapping={chat_field(op): chat_id for op, chat_id in by_operator.items()},
+                )
+                pipe.expire(key, self.conversation_ttl)
+            await pipe.execute()
+
+    async def get_operator(self, client_phone: str) -> Optional[str]:
+        return (await self.get_conversation(client_phone)).get("operator")
 
     async def get_chat_id(self, user_phone: str, operator_phone: str) -> Optional[str]:
-        key = f"chat:{user_phone}:{operator_phone}"
-        return await self._redis.get(key)
+        state = await self.get_conversation(user_phone)
+        return state.get(chat_field(operator_phone))
+
+    async def set_chat_id(self, user_phone: str, operator_phone: str, chat_id: str):
+        await self.update_conversation(user_phone, {chat_field(operator_phone): chat_id})
+
+    async def push_outbox(self, client_phone: str, value: str) -> None:
+        key = outbox_key(client_phone)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, value)
+            pipe.expire(key, self.conversation_ttl)
+            await pipe.execute()
+
+    async def pop_outbox(self, client_phone: str) -> Optional[str]:
+        value = await self._redis.lpop(outbox_key(client_phone))
+        if value is None:
+            # Списки старого формата лежали под ключом-телефоном
+            value = await self._redis.lpop(client_phone)
+        return value
+
+    async def append_chat_event(self, chat_id: str, body: str) -> str:
+        """
+        Дописывает событие в stream чата (обрезается примерно до REDIS_CHAT_STREAM_MAXLEN).
+        :return: id события в stream.
+        """
+        key = chat_stream_key(chat_id)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.xadd(key, {"body": body}, maxlen=self.chat_stream_maxlen, approximate=True)
+            pipe.expire(key, self.chat_stream_ttl)
+            event_id, _ = await pipe.execute()
+        return event_id
+
+    async def read_chat_events(
+        self, chat_id: str, since: Optional[str] = None, last: Optional[int] = None
+    ) -> List[Tuple[str, str]]:
+        """
+        События чата по возрастанию id.
+        :param since: вернуть события строго после этого id.
+        :param last: без since — вернуть последние last событий.
+        """
+        key = chat_stream_key(chat_id)
+        if since is not None:
+            entries = await self._redis.xrange(key, min=f"({since}", max="+")
+        elif last:
+            entries = list(reversed(await self._redis.xrevrange(key, count=last)))
+        else:
+            return []
+        return [(event_id, fields.get("body", "")) for event_id, fields in entries]
+
+    async def acquire_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Захватывает аренду key на ttl секунд, если она свободна."""
+        return bool(await self._redis.set(key, owner, nx=True, px=int(ttl * 1000)))
+
+    async def renew_lease(self, key: str, owner: str, ttl: float) -> bool:
+        """Продлевает аренду; False — аренда истекла или принадлежит другому."""
+        return bool(await self._renew_lease(keys=[key], args=[owner, int(ttl * 1000)]))
+
+    async def release_lease(self, key: str, owner: str) -> bool:
+        return bool(await self._release_lease(keys=[key], args=[owner]))
+
+    async def heartbeat(self, members_key: str, member: str, ttl: float) -> List[str]:
+        """
+        Отмечает участника живым на ttl секунд и убирает просроченных.
+        :return: живые участники.
+        """
+        now = time.time()
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(members_key, {member: now + ttl})
+            pipe.zremrangebyscore(members_key, "-inf", now)
+            pipe.zrange(members_key, 0, -1)
+            result = await pipe.execute()
+        return result[-1]
 
-    async def set_chat_id(
-            self, user_phone: str, operator_phone: str, chat_id: str, ttl: int = 86400
-    ):
-        key = f"chat:{user_phone}:{operator_phone}"
-        await self._redis.set(key, chat_id, ex=ttl)
+    async def leave(self, members_key: str, member: str) -> None:
+        await self._redis.zrem(members_key, member)
 
     async def close(self):
+        if self._tracking_task is not None:
+            self._tracking_task.cancel()
+            await asyncio.gather(self._tracking_task, return_exceptions=True)
+            self._tracking_task = None
         await self._redis.close()
 
 
-redis_client = RedisClient()
+redis_client: RedisClient = LazyObject(RedisClient)
@@ -0,0 +1,140 @@
+"""
+Повторная подача журнала webhook-ов.
+
+    python -m src.utils.replay_journal --target http://localhost:8000 --rps 200
+    python -m src.utils.replay_journal --in-process --source meta --since 2026-10-01
+
+--target — нагрузочный прогон против запущенного сервиса с заданным темпом;
+--in-process — дообработка (backfill): записи проходят через обработчики приложения
+в этом процессе, с его подключениями к БД, Redis и RabbitMQ.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional
+
+import httpx
+
+from src.settings.conf import appsettings
+from src.utils.journal import REPLAY_HEADER, JournalRecord, iter_journal, list_segments
+from src.utils.ratelimit import RateLimiter
+
+
+@asynccontextmanager
+async def _client(target: Optional[str]) -> AsyncIterator[httpx.AsyncClient]:
+    if target:
+        async with httpx.AsyncClient(base_url=target, timeout=30.0) as client:
+            yield client
+        return
+
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://replay", timeout=None
+        ) as client:
+            yield client
+
+
+def _select(
+    paths: List[Path],
+    source: Optional[str],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> Iterator[JournalRecord]:
+    for record in iter_journal(paths):
+        if source and record.source != source:
+            continue
+        if since and record.received_at < since.timestamp():
+            continue
+        if until and record.received_at >= until.timestamp():
+            continue
+        yield record
+
+
+async def replay(
+    paths: List[Path],
+    target: Optional[str],
+    rps: float,
+    concurrency: int,
+    source: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> None:
+    limiter = RateLimiter(rps)
+    semaphore = asyncio.Semaphore(concurrency)
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    tasks = set()
+
+    async def send(client: httpx.AsyncClient, record: JournalRecord) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                record.path,
+                content=record.body,
+                headers={**record.headers, REPLAY_HEADER: "1"},
+            )
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+        finally:
+            latencies.append((time.perf_counter() - started) * 1000)
+            semaphore.release()
+
+    started = time.perf_counter()
+    async with _client(target) as client:
+        for record in _select(paths, source, since, until):
+            await semaphore.acquire()
+            await limiter.acquire()
+            task = asyncio.create_task(send(client, record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    sent = len(latencies)
+    logging.info(f"Replayed {sent} requests in {elapsed:.1f}s ({sent / elapsed:.0f} rps)")
+    logging.info(f"Statuses: {dict(statuses)}")
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        logging.info(f"Latency p50={cuts[49]:.1f}ms p99={cuts[98]:.1f}ms max={max(latencies):.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Повторная подача журнала webhook-ов")
+    parser.add_argument("segments", nargs="*", type=Path, help="Сегменты; по умолчанию весь JOURNAL_DIR")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--target", help="URL запущенного сервиса, например http://localhost:8000")
+    mode.add_argument("--in-process", action="store_true", help="Обработать в этом процессе")
+    parser.add_argument("--source", choices=["meta", "amo"], help="Только webhook-и этого источника")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Начало периода")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Конец периода")
+    parser.add_argument("--rps", type=float, default=0, help="Темп, запросов в секунду; 0 — без ограничения")
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных запросов")
+    args = parser.parse_args()
+
+    paths = args.segments or list_segments(Path(appsettings.JOURNAL_DIR))
+    asyncio.run(
+        replay(
+            paths,
+            target=args.target,
+            rps=args.rps,
+            concurrency=args.concurrency,
+            source=args.source,
+            since=args.since,
+            until=args.until,
+        )
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,6 +1,6 @@
 import traceback
 import json
-from typing import Callable, Optional
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from contextlib import asynccontextmanager
 
 import aio_pika
@@ -8,9 +8,21 @@ from aiormq import exceptions as aiormq_exceptions
 
 from src.settings.conf import rmqsetting
 from src.settings.logger_config import get_logger
+from src.utils.lifecycle import InflightTracker
+from src.utils.redis_conn import redis_client
 
 log = get_logger(__name__)
 
+# Шардирование чатов: exchange x-consistent-hash раскладывает события по очередям-секциям
+CHAT_SHARDS_EXCHANGE = "chat_shards"
+# События чатов для WebSocket-подписчиков; id события в Redis stream — в заголовке
+CHAT_EXCHANGE = "chat_exchange"
+CHAT_EVENT_ID_HEADER = "x-event-id"
+
+
+def chat_shard_queue(index: int) -> str:
+    return f"chat_shard.{index}"
+
 
 class AsyncRabbitMQRepository:
     def __init__(self, use_default_exchange: bool = True, exchange_name: str = None):
@@ -23,6 +35,11 @@ class AsyncRabbitMQRepository:
         self.use_default_exchange = use_default_exchange
         self.exchange = None
         self.exchange_name = exchange_name
+        self._consumers: Dict[str, Tuple[aio_pika.abc.AbstractQueue, str]] = {}
+        self._partitions: Dict[str, Tuple[aio_pika.abc.AbstractChannel, InflightTracker]] = {}
+        self._shards_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self._chat_exchange: Optional[aio_pika.abc.AbstractExchange] = None
+        self.inflight = InflightTracker()
 
     async def connect(self):
         """Устанавливает асинхронное соединение с RabbitMQ."""
@@ -76,19 +93,16 @@ class AsyncRabbitMQRepository:
                 routing_key=queue_name if self.use_default_exchange else "",
             )
 
-    async def consume_messages(self, queue_name: str, callback: Callable[[str, str], None]):
-        """Начинает прослушивание очереди с вызовом callback(chat_id, message_body)."""
-        if not self.channel or not self.connection:
-            await self.connect()
-        if not self.exchange:
-            await self.declare_exchange()
-        queue = await self.channel.declare_queue(queue_name, durable=True)
-        async with queue.iterator() as queue_iter:
-            async for message in queue_iter:
+    def _message_handler(
+        self, callback: Callable[[str, str], None], tracker: Optional[InflightTracker] = None
+    ) -> Callable[[aio_pika.abc.AbstractIncomingMessage], Awaitable[None]]:
+        tracker = tracker or InflightTracker()
+
+        async def on_message(message: aio_pika.abc.AbstractIncomingMessage) -> None:
+            async with self.inflight, tracker:
                 try:
                     async with message.process():
                         body = message.body.decode()
-                        import json
                         data = json.loads(body)
                         chat_id = str(data.get("chat_id"))
                         if chat_id:
@@ -96,6 +110,120 @@ class AsyncRabbitMQRepository:
                 except Exception:
                     log.error(f"[RMQ] {traceback.format_exc()}")
 
+        return on_message
+
+    async def consume_messages(
+        self, queue_name: str, callback: Callable[[str, str], None]
+    ) -> str:
+        """
+        Подписывается на очередь с вызовом callback(chat_id, message_body).
+        Сообщение подтверждается только после обработки, поэтому при остановке воркера
+        необработанные сообщения возвращаются в очередь и достаются другим воркерам.
+        До RABBITMQ_PREFETCH сообщений обрабатываются параллельно, да и воркеров на очереди
+        несколько — порядок событий одного чата здесь не гарантирован; он сохраняется
+        только в секциях (RABBITMQ_CHAT_PARTITIONS > 0, см. consume_partition).
+        :return: consumer tag.
+        """
+        if not self.channel or not self.connection:
+            await self.connect()
+        if not self.exchange:
+            await self.declare_exchange()
+        await self.channel.set_qos(prefetch_count=rmqsetting.RABBITMQ_PREFETCH)
+        queue = await self.channel.declare_queue(queue_name, durable=True)
+
+        consumer_tag = await queue.consume(self._message_handler(callback))
+        self._consumers[queue_name] = (queue, consumer_tag)
+        return consumer_tag
+
+    async def declare_chat_shards(self, partitions: int) -> None:
+        """
+        Объявляет exchange x-consistent-hash и очереди-секции chat_shard.{i}.
+        Нужен плагин rabbitmq_consistent_hash_exchange.
+        """
+        await self.connect()
+        exchange = await self.channel.declare_exchange(
+            CHAT_SHARDS_EXCHANGE, "x-consistent-hash", durable=True
+        )
+        for index in range(partitions):
+            queue = await self.channel.declare_queue(chat_shard_queue(index), durable=True)
+            await queue.bind(exchange, routing_key="1")
+        self._shards_exchange = exchange
+
+    async def publish_chat_event(self, chat_id: str, message: str) -> None:
+        """
+        Публикует событие чата. С шардированием — в секцию по хэшу chat_id
+        (все события одного чата попадают в одну очередь), без него — в queue_name.
+        """
+        partitions = rmqsetting.RABBITMQ_CHAT_PARTITIONS
+        if partitions <= 0:
+            await self.send_message("queue_name", message)
+            return
+        if self._shards_exchange is None:
+            await self.declare_chat_shards(partitions)
+        await self._shards_exchange.publish(
+            aio_pika.Message(body=message.encode()), routing_key=chat_id
+        )
+
+    async def consume_partition(
+        self, queue_name: str, callback: Callable[[str, str], None]
+    ) -> None:
+        """
+        Эксклюзивно подписывается на очередь-секцию на отдельном канале с prefetch 1:
+        сообщения секции обрабатываются строго по одному, порядок внутри чата сохраняется.
+        """
+        await self.connect()
+        channel = await self.connection.channel()
+        try:
+            await channel.set_qos(prefetch_count=1)
+            queue = await channel.declare_queue(queue_name, durable=True)
+            tracker = InflightTracker()
+            consumer_tag = await queue.consume(
+                self._message_handler(callback, tracker), exclusive=True
+            )
+        except Exception:
+            if not channel.is_closed:
+                await channel.close()
+            raise
+        self._consumers[queue_name] = (queue, consumer_tag)
+        self._partitions[queue_name] = (channel, tracker)
+
+    async def stop_partition(self, queue_name: str, timeout: float) -> None:
+        """Отписывается от секции, дожидается текущего сообщения и закрывает её канал."""
+        consumer = self._consumers.pop(queue_name, None)
+        partition = self._partitions.pop(queue_name, None)
+        if partition is None:
+            return
+        channel, tracker = partition
+        try:
+            if consumer is not None and not channel.is_closed:
+                queue, consumer_tag = consumer
+                await queue.cancel(consumer_tag)
+            if not await tracker.wait_idle(timeout):
+                log.warning(f"[RMQ] Секция {queue_name} освобождена с необработанным сообщением")
+            if not channel.is_closed:
+                await channel.close()
+        except Exception:
+            log.error(f"[RMQ] {traceback.format_exc()}")
+
+    async def stop_consuming(self) -> None:
+        """Отписывает все консьюмеры: новые сообщения воркер больше не получает."""
+        for queue_name, (queue, consumer_tag) in list(self._consumers.items()):
+            try:
+                await queue.cancel(consumer_tag)
+            except Exception:
+                log.error(f"[RMQ] {traceback.format_exc()}")
+        self._consumers.clear()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Ждёт обработки уже полученных сообщений.
+        :return: False, если за timeout обработка не завершилась.
+        """
+        if await self.inflight.wait_idle(timeout):
+            return True
+        log.warning(f"[RMQ] Не обработано сообщений при остановке: {self.inflight.count}")
+        return False
+
     async def delete_queue(self, queue_name: str):
         """Удаляет очередь с указанным именем."""
         if not self.channel or not self.connection:
@@ -139,17 +267,34 @@ class AsyncRabbitMQRepository:
         self.channel = await self.connection.channel()
         await self.channel.declare_exchange("chat_exchange", aio_pika.ExchangeType.DIRECT)
 
+    async def chat_exchange(self) -> aio_pika.abc.AbstractExchange:
+        """Direct exchange событий чатов (routing key — chat_id)."""
+        if self._chat_exchange is None:
+            await self.connect()
+            self._chat_exchange = await self.channel.declare_exchange(
+                CHAT_EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True, auto_delete=False
+            )
+        return self._chat_exchange
+
     async def publish_to_chat(self, chat_id: str, message: str):
-        """Отправляет сообщение в чат через exchange."""
-        if not self.exchange:
-            await self.declare_exchange("chat_exchange", aio_pika.ExchangeType.DIRECT)
+        """
+        Отправляет сообщение в чат через exchange и дописывает его в Redis stream чата,
+        откуда WebSocket при подключении повторяет последние события.
+        """
         if isinstance(message, dict):
-            body_bytes = json.dumps(message, ensure_ascii=False).encode()
+            body = json.dumps(message, ensure_ascii=False)
         else:
-            body_bytes = message.encode()
+            body = message
+
+        headers = {}
+        try:
+            headers[CHAT_EVENT_ID_HEADER] = await redis_client.append_chat_event(chat_id, body)
+        except Exception:
+            log.error(f"[RMQ] Событие чата {chat_id} не сохранено: {traceback.format_exc()}")
 
-        await self.exchange.publish(
-            aio_pika.Message(body=body_bytes),
+        exchange = await self.chat_exchange()
+        await exchange.publish(
+            aio_pika.Message(body=body.encode(), headers=headers),
             routing_key=chat_id,
         )
 
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+import socket
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from src.settings.conf import log, rmqsetting
+from src.settings.lazy import LazyObject
+from src.utils.lifecycle import lifecycle
+from src.utils.redis_conn import redis_client
+from src.utils.rmq.RabbitModel import (
+    AsyncRabbitMQRepository,
+    callback_wrapper,
+    chat_shard_queue,
+    get_rmq_instance,
+)
+
+MEMBERS_KEY = "chat_shards:members"
+
+
+def lease_key(index: int) -> str:
+    return f"chat_shards:lease:{index}"
+
+
+def partition_owner(index: int, members: List[str]) -> Optional[str]:
+    """
+    Владелец секции по rendezvous-хэшированию: при входе или выходе экземпляра
+    переезжают только секции, которые он получает или освобождает.
+    """
+    if not members:
+        return None
+    return max(
+        members,
+        key=lambda member: hashlib.blake2b(
+            f"{member}:{index}".encode(), digest_size=8
+        ).digest(),
+    )
+
+
+class ChatShardManager:
+    """
+    Распределяет очереди-секции chat_shard.{i} между экземплярами приложения.
+    Каждый экземпляр раз в треть срока аренды отмечается в Redis, вычисляет свои
+    секции по списку живых экземпляров и держит на них аренду chat_shards:lease:{i}.
+    Секцию, которая переходит другому экземпляру, он сначала отпускает (дожидаясь
+    текущего сообщения), и только потом новый владелец её забирает — так порядок
+    событий одного чата сохраняется и при перебалансировке.
+    """
+
+    def __init__(
+        self,
+        partitions: Optional[int] = None,
+        lease_seconds: Optional[float] = None,
+        callback: Callable[[str, str], Any] = callback_wrapper,
+        rmq: Optional[AsyncRabbitMQRepository] = None,
+    ) -> None:
+        self.partitions = rmqsetting.RABBITMQ_CHAT_PARTITIONS if partitions is None else partitions
+        self.lease_seconds = lease_seconds or rmqsetting.RABBITMQ_PARTITION_LEASE_SECONDS
+        self.instance_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.callback = callback
+        self._rmq = rmq
+        self._owned: Set[int] = set()
+        self._members: List[str] = []
+        self._stopping = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.partitions > 0
+
+    @property
+    def rmq(self) -> AsyncRabbitMQRepository:
+        return self._rmq or get_rmq_instance()
+
+    async def _release(self, index: int, reason: str) -> None:
+        await self.rmq.stop_partition(chat_shard_queue(index), self.lease_seconds / 2)
+        self._owned.discard(index)
+        await redis_client.release_lease(lease_key(index), self.instance_id)
+        log.info(f"[SHARDS] Секция {index} освобождена: {reason}")
+
+    async def _claim(self, index: int) -> None:
+        if not await redis_client.acquire_lease(lease_key(index), self.instance_id, self.lease_seconds):
+            return
+        try:
+            await self.rmq.consume_partition(chat_shard_queue(index), self.callback)
+        except Exception:
+            log.error(f"[SHARDS] Не удалось подписаться на секцию {index}: {traceback.format_exc()}")
+            await redis_client.release_lease(lease_key(index), self.instance_id)
+            return
+        self._owned.add(index)
+        log.info(f"[SHARDS] Секция {index} захвачена")
+
+    async def rebalance(self) -> None:
+        """Один шаг: heartbeat, продление своих аренд, передача и захват секций."""
+        self._members = await redis_client.heartbeat(
+            MEMBERS_KEY, self.instance_id, self.lease_seconds
+        )
+        desired = {
+            index
+            for index in range(self.partitions)
+            if partition_owner(index, self._members) == self.instance_id
+        }
+
+        for index in sorted(self._owned):
+            if index not in desired:
+                await self._release(index, "перебалансировка")
+            elif not await redis_client.renew_lease(
+                lease_key(index), self.instance_id, self.lease_seconds
+            ):
+                await self._release(index, "аренда потеряна")
+
+        if lifecycle.draining:
+            return
+        for index in sorted(desired - self._owned):
+            await self._claim(index)
+
+    async def run_forever(self) -> None:
+        """Фоновая задача; при остановке отпускает все секции и выходит из списка."""
+        await self.rmq.declare_chat_shards(self.partitions)
+        interval = self.lease_seconds / 3
+        while not self._stopping.is_set():
+            try:
+                await self.rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.error(f"[SHARDS] Ошибка перебалансировки: {traceback.format_exc()}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+        for index in sorted(self._owned):
+            await self._release(index, "остановка воркера")
+        await redis_client.leave(MEMBERS_KEY, self.instance_id)
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "instance_id": self.instance_id,
+            "partitions": self.partitions,
+            "owned": sorted(self._owned),
+            "members": self._members,
+        }
+
+
+chat_shards: ChatShardManager = LazyObject(ChatShardManager)
@@ -0,0 +1,105 @@
+"""
+MessagesDAO.apply_status на настоящем Postgres (нужны DB_* из окружения и
+применённые миграции): python -m pytest tests/test_apply_status.py
+"""
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, select
+
+from src.database.DAO.crud import DealsDAO, MessagesDAO
+from src.database.models.Models import Deals, DealSummary, Messages, StatusEnum
+from src.settings.engine import conn
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await conn.dispose()
+
+    return asyncio.run(wrapper())
+
+
+async def _create_deal():
+    deal_id = uuid4()
+    await DealsDAO.add(
+        id=deal_id,
+        conversation_id=f"test-{deal_id}",
+        client_phone=f"test-client-{deal_id.hex[:8]}",
+        operator_phone="test-operator",
+        created_at=datetime.now(),
+    )
+    return deal_id
+
+
+async def _cleanup(deal_id):
+    async with conn.session_maker() as session:
+        async with session.begin():
+            await session.execute(delete(Messages).where(Messages.deals_id == deal_id))
+            await session.execute(delete(DealSummary).where(DealSummary.deal_id == deal_id))
+            await session.execute(delete(Deals).where(Deals.id == deal_id))
+
+
+async def _statuses(message_id):
+    async with conn.session_maker() as session:
+        result = await session.execute(select(Messages.status).where(Messages.id == message_id))
+        return result.scalars().all()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    async def ping():
+        async with conn.engine.connect() as connection:
+            await connection.exec_driver_sql("SELECT 1")
+
+    try:
+        run(ping())
+    except Exception as e:
+        pytest.skip(f"Postgres недоступен: {e}")
+
+
+def test_status_only_moves_forward():
+    async def scenario():
+        deal_id = await _create_deal()
+        message_id = f"wamid.{uuid4().hex}"
+        try:
+            apply = lambda status: MessagesDAO.apply_status(
+                message_id, status, datetime.now(), deal_id, "test-operator", "hi"
+            )
+            assert await apply(StatusEnum.delivered)
+            assert not await apply(StatusEnum.sent)
+            assert not await apply(StatusEnum.delivered)
+            assert await apply(StatusEnum.read)
+            assert await apply(StatusEnum.failed)
+            assert not await apply(StatusEnum.read)
+            return await _statuses(message_id)
+        finally:
+            await _cleanup(deal_id)
+
+    assert run(scenario()) == [StatusEnum.failed]
+
+
+def test_concurrent_first_status_creates_one_message():
+    async def scenario():
+        deal_id = await _create_deal()
+        message_id = f"wamid.{uuid4().hex}"
+        try:
+            written = await asyncio.gather(
+                *(
+                    MessagesDAO.apply_status(
+                        message_id, StatusEnum.delivered, datetime.now(), deal_id, "test-operator"
+                    )
+                    for _ in range(5)
+                )
+            )
+            return written, await _statuses(message_id)
+        finally:
+            await _cleanup(deal_id)
+
+    written, statuses = run(scenario())
+    assert written.count(True) == 1
+    assert statuses == [StatusEnum.delivered]